@@ -0,0 +1,177 @@
+"""Trading Journal API client used by the Streamlit dashboard.
+
+All HTTP goes through one pooled keep-alive session with timeouts and GET
+retries. Reads are memoized with ``st.cache_data`` keyed on their query
+parameters and revalidated with the API's ETag once the cache expires;
+every successful write clears the read caches.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+API_URL = os.getenv("API_URL", "http://127.0.0.1:8002")
+TIMEOUT = (3.05, 60)  # (connect, read) seconds
+CACHE_TTL = 30  # seconds a read is served from cache without asking the API
+JOB_TIMEOUT = 120  # seconds to wait for an analytics job
+JOB_POLL_INTERVAL = 0.25
+VALIDATED_SIZE = 256  # GET bodies kept for ETag revalidation, least recently used dropped first
+
+
+class ApiError(Exception):
+    """Raised when the API is unreachable or answers with an error status."""
+
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.3, status_forcelist=(502, 503, 504),
+                  allowed_methods=frozenset({"GET"}))
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _request(method: str, path: str, **kwargs) -> requests.Response:
+    try:
+        response = get_session().request(method, f"{API_URL}{path}", timeout=TIMEOUT, **kwargs)
+    except requests.RequestException as e:
+        raise ApiError(f"API unreachable: {e}") from e
+    if response.status_code >= 400:
+        try:
+            detail = response.json().get("detail", response.text)
+        except ValueError:
+            detail = response.text
+        raise ApiError(str(detail))
+    return response
+
+
+# Last validated (ETag, body, headers) per GET, shared by all dashboard sessions
+_validated: "OrderedDict[tuple, tuple]" = OrderedDict()
+_validated_lock = threading.Lock()
+
+
+def _get(path: str, params=None):
+    """Conditional GET: returns ``(json_body, headers)``, reusing the last body on 304."""
+    key = (path, tuple(sorted((params or {}).items())))
+    with _validated_lock:
+        cached = _validated.get(key)
+        if cached:
+            _validated.move_to_end(key)
+    headers = {"If-None-Match": cached[0]} if cached else None
+
+    response = _request("GET", path, params=params, headers=headers)
+    if response.status_code == 304 and cached:
+        return cached[1], cached[2]
+
+    body = response.json()
+    if "ETag" in response.headers:
+        with _validated_lock:
+            _validated[key] = (response.headers["ETag"], body, dict(response.headers))
+            _validated.move_to_end(key)
+            while len(_validated) > VALIDATED_SIZE:
+                _validated.popitem(last=False)
+    return body, response.headers
+
+
+def run_job(kind: str, params: dict = None) -> list:
+    """Result of an analytics job: ``POST /jobs``, then poll ``GET /jobs/{id}`` unless
+    the API answered from its memo."""
+    job = _request("POST", "/jobs", json={"kind": kind, "params": params or {}}).json()
+    deadline = time.monotonic() + JOB_TIMEOUT
+    while job["status"] in ("pending", "running"):
+        if time.monotonic() > deadline:
+            raise ApiError(f"Job {kind} did not finish within {JOB_TIMEOUT} s")
+        time.sleep(JOB_POLL_INTERVAL)
+        job = _request("GET", f"/jobs/{job['id']}").json()
+    if job["status"] == "failed":
+        raise ApiError(job["error"])
+    return job["result"]
+
+
+# ========== Reads ==========
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def fetch_entries(params: dict) -> dict:
+    """One page of ``GET /entries``: ``{"items": [...], "next_cursor": str | None}``."""
+    items, headers = _get("/entries", params)
+    return {"items": items, "next_cursor": headers.get("X-Next-Cursor")}
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def fetch_monthly_summary(market: str = None) -> list:
+    """Monthly summary computed as a job, off the API's request workers."""
+    return run_job("monthly_summary", {"market": market} if market else None)
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def fetch_equity_curve(granularity: str = "day", market: str = None) -> dict:
+    params = {"granularity": granularity, **({"market": market} if market else {})}
+    return _get("/analytics/equity-curve", params)[0]
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def fetch_performance_breakdown(by: str = "symbol", market: str = None, sort_by: str = "total_pnl",
+                                order: str = "desc", limit: int = 20) -> list:
+    """``GET /analytics/by-symbol`` (``by="symbol"``) or ``/analytics/by-market``."""
+    params = {"sort_by": sort_by, "order": order, "limit": limit}
+    if market and by == "symbol":
+        params["market"] = market
+    return _get(f"/analytics/by-{by}", params)[0]
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def fetch_simulation(market: str = None, fractions: tuple = (0.005, 0.01, 0.02), paths: int = 10_000,
+                     trades: int = None, seed: int = None) -> dict:
+    """``GET /analytics/simulation`` on the closed trades' R-multiples."""
+    params = {"fractions": fractions, "paths": paths}
+    for name, value in (("market", market), ("trades", trades), ("seed", seed)):
+        if value is not None:
+            params[name] = value
+    return _get("/analytics/simulation", params)[0]
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def fetch_positions_mtm(market: str = None, ids: tuple = None) -> dict:
+    """``GET /positions/mtm``, optionally for just the entries in ``ids``."""
+    params = {}
+    if market:
+        params["market"] = market
+    if ids:
+        params["ids"] = tuple(ids)  # repeated ?ids= parameters
+    return _get("/positions/mtm", params or None)[0]
+
+
+def clear_cache():
+    fetch_entries.clear()
+    fetch_monthly_summary.clear()
+    fetch_equity_curve.clear()
+    fetch_performance_breakdown.clear()
+    fetch_simulation.clear()
+    fetch_positions_mtm.clear()
+
+
+# ========== Writes ==========
+
+def create_entry(entry: dict) -> dict:
+    result = _request("POST", "/entries", json=entry).json()
+    clear_cache()
+    return result
+
+
+def create_exit(exit: dict) -> dict:
+    result = _request("POST", "/exits", json=exit).json()
+    clear_cache()
+    return result
+
+
+def import_trades_csv(body: bytes) -> dict:
+    result = _request("POST", "/entries/bulk", data=body, headers={"Content-Type": "text/csv"}).json()
+    clear_cache()
+    return result
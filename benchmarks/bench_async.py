@@ -0,0 +1,116 @@
+"""Sync vs async API throughput at 1, 16 and 64 concurrent clients.
+
+Run from the repo root:
+    python -m benchmarks.bench_async [--database-url URL] [--entries 2000] [--requests 2000]
+
+Starts one uvicorn server per mode (``DB_ASYNC=0`` / ``DB_ASYNC=1``) against the
+same database, then drives ``GET /entries`` and ``GET /summary/monthly`` with an
+httpx ``AsyncClient``. Defaults to a throwaway SQLite file; pass a MySQL URL
+(``mysql+pymysql://...``) to measure the deployment driver pair. Failed requests
+(e.g. connection pool timeouts once the threadpool is saturated) are counted,
+not raised, so every cell of the table is filled.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import httpx
+
+PORT = 8765
+ROUTES = ["/entries?page_size=50", "/summary/monthly"]
+CONCURRENCY = [1, 16, 64]
+
+
+def seed(database_url: str, n: int):
+    os.environ["DATABASE_URL"] = database_url
+    from benchmarks.bench_derived_fields import make_entries
+    import crud, database, migrations
+    from database import Base, SessionLocal
+
+    engine = database.init_engines()
+    Base.metadata.drop_all(bind=engine)
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    try:
+        for entry in make_entries(n):
+            db.add(entry)
+        crud.bump_journal_version(db)
+        db.commit()
+    finally:
+        db.close()
+
+
+def start_server(database_url: str, async_mode: bool):
+    env = dict(os.environ, DATABASE_URL=database_url, DB_ASYNC="1" if async_mode else "0")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(PORT), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/", timeout=1)
+            return server
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("uvicorn did not start")
+
+
+async def drive(route: str, concurrency: int, total: int):
+    """``(requests per second, failed requests)`` for ``total`` GETs over ``concurrency`` workers."""
+    remaining, failed = total, 0
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", limits=limits, timeout=60) as client:
+        async def worker():
+            nonlocal remaining, failed
+            while remaining > 0:
+                remaining -= 1
+                try:
+                    response = await client.get(route)
+                    failed += response.is_error
+                except httpx.TransportError:
+                    failed += 1
+
+        await client.get(route)  # warm up
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return total / (time.perf_counter() - start), failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url")
+    parser.add_argument("--entries", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/bench_async.db"
+    seed(database_url, args.entries)
+
+    results = {}
+    for async_mode in (False, True):
+        server = start_server(database_url, async_mode)
+        try:
+            for route in ROUTES:
+                for concurrency in CONCURRENCY:
+                    results[route, concurrency, async_mode] = asyncio.run(drive(route, concurrency, args.requests))
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"{'route':<24}{'clients':>8}{'sync req/s':>12}{'errors':>8}{'async req/s':>13}{'errors':>8}")
+    for route in ROUTES:
+        for concurrency in CONCURRENCY:
+            sync_rps, sync_failed = results[route, concurrency, False]
+            async_rps, async_failed = results[route, concurrency, True]
+            print(f"{route:<24}{concurrency:>8}{sync_rps:>12.0f}{sync_failed:>8}{async_rps:>13.0f}{async_failed:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Per-entry cost of derived-field computation.
+
+Run from the repo root:
+    python -m benchmarks.bench_derived_fields [--sizes 100 10000 100000]
+
+Entries are transient ORM objects (no database), so the numbers isolate the
+derivation + response-model construction cost.
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+import crud
+import models
+import derived
+
+
+def make_entries(n: int, seed: int = 42):
+    rng = random.Random(seed)
+    entries = []
+    for i in range(n):
+        entry_price = Decimal(rng.randint(1_000, 50_000)) / 100
+        qty = rng.choice([100, 200, 500, 1000])
+        position = rng.choice(["Long", "Short"])
+        entry_date = date(2020, 1, 1) + timedelta(days=rng.randint(0, 1500))
+        entry = models.TradeEntry(
+            id=i + 1,
+            stock=f"S{rng.randint(1, 500)}",
+            market=rng.choice(["HK", "US"]),
+            position=position,
+            entry_date=entry_date,
+            entry_price=entry_price,
+            qty=qty,
+            remaining_qty=qty,
+            stop_loss_price=(entry_price * Decimal("0.9")).quantize(Decimal("0.01")),
+            target_price=(entry_price * Decimal("1.2")).quantize(Decimal("0.01")),
+            is_open=True,
+            exited_qty=0,
+            realized_pnl=Decimal(0),
+            realized_pnl_hkd=Decimal(0),
+            updated_at=models.utcnow(),
+        )
+        remaining = qty
+        for j in range(rng.randint(0, 3)):
+            exit_qty = remaining if j == 2 else rng.randint(1, remaining)
+            exit = models.TradeExit(
+                id=i * 10 + j,
+                entry_id=i + 1,
+                exit_date=entry_date + timedelta(days=rng.randint(1, 60)),
+                exit_price=(entry_price * Decimal(rng.uniform(0.8, 1.3))).quantize(Decimal("0.01")),
+                exit_qty=exit_qty,
+                fx_rate=Decimal(1) if entry.market == "HK" else Decimal("7.78"),
+            )
+            entry.exits.append(exit)
+            crud.apply_exit(entry, exit.exit_price, exit.exit_qty, exit.exit_date)
+            remaining -= exit_qty
+            if remaining == 0:
+                break
+        entries.append(entry)
+    return entries
+
+
+def _time(fn, entries):
+    start = time.perf_counter()
+    fn(entries)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 100_000])
+    args = parser.parse_args()
+
+    runners = {"per-entry": lambda entries: [derived.compute_derived_fields(e) for e in entries]}
+    if hasattr(derived, "compute_derived_fields_batch"):
+        runners["batch"] = derived.compute_derived_fields_batch
+
+    print(f"{'entries':>10} {'mode':>10} {'total (s)':>10} {'per entry (us)':>15}")
+    for n in args.sizes:
+        entries = make_entries(n)
+        for name, fn in runners.items():
+            elapsed = _time(fn, entries)
+            print(f"{n:>10} {name:>10} {elapsed:>10.3f} {elapsed / n * 1e6:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Interactive latency while heavy analytics run inline vs as process-pool jobs.
+
+Run from the repo root:
+    python -m benchmarks.bench_jobs [--database-url URL] [--entries 100000] [--heavy 8]
+
+Starts one uvicorn worker and fires ``--heavy`` distinct monthly summaries (one
+per year and market) at once: "inline" through ``GET /summary/monthly``, "jobs"
+through ``POST /jobs``, polling ``GET /jobs/{id}`` until all are done. Meanwhile
+a probe client requests ``GET /entries?page_size=20`` back to back; its latency
+is what an interactive user would see. "jobs (memo)" repeats the submissions
+against the unchanged journal, which the memo answers inline. Defaults to a
+throwaway SQLite file seeded with ``benchmarks.journal``.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.bench_async import PORT, start_server
+
+PROBE = "/entries?page_size=20"
+
+
+def seed(database_url: str, n: int):
+    os.environ["DATABASE_URL"] = database_url
+    import database, migrations
+    from benchmarks.journal import write_journal
+
+    engine = database.init_engines()
+    migrations.upgrade(engine)
+    db = database.SessionLocal()
+    try:
+        write_journal(db, n)
+    finally:
+        db.close()
+
+
+def heavy_params(n: int):
+    return [{"year": 2019 + i // 2 % 6, "market": ("HK", "US")[i % 2]} for i in range(n)]
+
+
+async def inline(client, params):
+    await asyncio.gather(*(client.get("/summary/monthly", params=p) for p in params))
+
+
+async def as_jobs(client, params):
+    submitted = await asyncio.gather(*(client.post("/jobs", json={"kind": "monthly_summary", "params": p})
+                                       for p in params))
+    pending = [r.json()["id"] for r in submitted if r.json()["status"] != "done"]
+    while pending:
+        await asyncio.sleep(0.05)
+        statuses = await asyncio.gather(*(client.get(f"/jobs/{job_id}") for job_id in pending))
+        pending = [s.json()["id"] for s in statuses if s.json()["status"] in ("pending", "running")]
+
+
+async def measure(run, params):
+    """``(heavy wall time, probe latencies)`` while ``run`` works through ``params``."""
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", timeout=300) as client:
+        await client.get(PROBE)  # warm up
+        latencies, done = [], False
+
+        async def probe():
+            while not done:
+                start = time.perf_counter()
+                await client.get(PROBE)
+                latencies.append(time.perf_counter() - start)
+
+        prober = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await run(client, params)
+        elapsed = time.perf_counter() - start
+        done = True
+        await prober
+        return elapsed, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url")
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--heavy", type=int, default=8, help="concurrent heavy analytics requests")
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/bench_jobs.db"
+    if not args.database_url:
+        seed(database_url, args.entries)
+    params = heavy_params(args.heavy)
+
+    server = start_server(database_url, async_mode=False)
+    try:
+        results = {
+            "inline": asyncio.run(measure(inline, params)),
+            "jobs": asyncio.run(measure(as_jobs, params)),
+            "jobs (memo)": asyncio.run(measure(as_jobs, params)),
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"{'mode':<14}{'heavy (s)':>10}{'probes':>8}{'probe p50 (ms)':>16}{'probe max (ms)':>16}")
+    for mode, (elapsed, latencies) in results.items():
+        p50 = statistics.median(latencies) * 1000 if latencies else float("nan")
+        worst = max(latencies) * 1000 if latencies else float("nan")
+        print(f"{mode:<14}{elapsed:>10.2f}{len(latencies):>8}{p50:>16.1f}{worst:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
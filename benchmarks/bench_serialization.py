@@ -0,0 +1,62 @@
+"""Cost of turning entries into a JSON response body.
+
+Run from the repo root:
+    python -m benchmarks.bench_serialization [--sizes 1000 10000 100000]
+
+"response_model" is the path the entry routes used to take: derived fields
+validated into ``TradeEntryResponse`` models, re-validated against the route's
+``response_model`` and dumped by FastAPI. "fast" is the current path: rows from
+``derived.derived_rows`` encoded by ``responses.dumps``. Entries are transient ORM
+objects, as in ``bench_derived_fields``.
+"""
+import argparse
+import time
+from typing import List
+
+from pydantic import TypeAdapter
+
+import derived
+import responses
+import schemas
+from benchmarks.bench_derived_fields import make_entries
+
+_response_model = TypeAdapter(List[schemas.TradeEntryResponse])
+
+
+def _response_model_path(entries) -> bytes:
+    models = derived.compute_derived_fields_batch(entries)
+    return _response_model.dump_json(_response_model.validate_python(models, from_attributes=True))
+
+
+def _fast_path(entries) -> bytes:
+    return responses.dumps(derived.derived_rows(entries))
+
+
+def _time(fn, entries, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(entries)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3, help="best of N runs")
+    args = parser.parse_args()
+
+    runners = {"response_model": _response_model_path, "fast": _fast_path}
+    encoder = "orjson" if responses.orjson is not None else "json"
+    print(f"encoder: {encoder}")
+    print(f"{'entries':>10} {'mode':>15} {'total (s)':>10} {'per 10k (ms)':>13}")
+    for n in args.sizes:
+        entries = make_entries(n)
+        for name, fn in runners.items():
+            elapsed = _time(fn, entries, args.repeat)
+            print(f"{n:>10} {name:>15} {elapsed:>10.3f} {elapsed / n * 1e7:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
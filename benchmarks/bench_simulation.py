@@ -0,0 +1,63 @@
+"""Monte Carlo simulation throughput, in one process and spread over a process pool.
+
+Run from the repo root:
+    python -m benchmarks.bench_simulation [--paths 100000] [--trades 5000] [--workers N]
+
+Resamples ``--history`` synthetic R-multiples (a 40% win rate at 2.5R) into
+``--paths`` paths of ``--trades`` trades at three sizing fractions, the
+``GET /analytics/simulation`` defaults. "inline" runs every chunk in this process;
+"pool" spreads them over ``--workers`` spawned processes (default one per CPU),
+timed once the pool is warm. Both give the same result for the same seed.
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import simulation
+
+FRACTIONS = [0.005, 0.01, 0.02]
+
+
+def history(n: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    wins = rng.random(n) < 0.4
+    return np.where(wins, rng.normal(2.5, 0.8, n), rng.normal(-0.9, 0.2, n))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--paths", type=int, default=100_000)
+    parser.add_argument("--trades", type=int, default=5_000)
+    parser.add_argument("--history", type=int, default=2_000, help="historical trades resampled")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--skip-inline", action="store_true")
+    args = parser.parse_args()
+
+    returns = history(args.history)
+    run = dict(paths=args.paths, trades=args.trades, seed=42)
+    print(f"{args.paths} paths x {args.trades} trades, {len(FRACTIONS)} fractions, {args.workers} workers")
+
+    if not args.skip_inline:
+        start = time.perf_counter()
+        inline = simulation.simulate(returns, FRACTIONS, **run)
+        print(f"inline: {time.perf_counter() - start:>7.2f} s")
+
+    with ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        simulation.simulate(returns, FRACTIONS, paths=args.workers, trades=1, executor=pool, workers=args.workers)
+        start = time.perf_counter()
+        pooled = simulation.simulate(returns, FRACTIONS, **run, executor=pool, workers=args.workers)
+        print(f"pool:   {time.perf_counter() - start:>7.2f} s")
+
+    if not args.skip_inline:
+        assert pooled == inline
+    for outcome in pooled["outcomes"]:
+        print(f"fraction {outcome['fraction']:<6} median final PnL {outcome['final_pnl']['p50']:>14,.0f}  "
+              f"median max drawdown {outcome['max_drawdown']['p50']:.1%}  risk of ruin {outcome['risk_of_ruin']:.2%}")
+
+
+if __name__ == "__main__":
+    main()
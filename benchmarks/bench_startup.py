@@ -0,0 +1,77 @@
+"""API import time and worker cold start.
+
+Run from the repo root:
+    python -m benchmarks.bench_startup [--runs 5] [--database-url URL]
+
+"import" is the wall time of ``import main`` in a fresh interpreter; "cold
+start" runs ``uvicorn main:app`` and times until the first ``GET /`` answers
+(interpreter start, imports and the lifespan startup). Also lists which heavy
+modules ``import main`` loads. Medians over ``--runs`` fresh processes.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+PORT = 8766
+HEAVY_MODULES = ["pandas", "pyarrow", "matplotlib"]
+
+_IMPORT_PROBE = """
+import sys, time
+start = time.perf_counter()
+import main
+print(time.perf_counter() - start)
+print(",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def measure_import(env):
+    out = subprocess.run([sys.executable, "-c", _IMPORT_PROBE.format(heavy=HEAVY_MODULES)], env=env,
+                         capture_output=True, text=True, check=True).stdout.split("\n")
+    return float(out[0]), out[1]
+
+
+def measure_cold_start(env):
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(PORT), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < 30:
+            try:
+                httpx.get(f"http://127.0.0.1:{PORT}/", timeout=1)
+                return time.perf_counter() - start
+            except httpx.TransportError:
+                time.sleep(0.01)
+        raise RuntimeError("uvicorn did not start")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--database-url", help="default: a throwaway SQLite file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        url = args.database_url or f"sqlite:///{workdir}/startup.db"
+        env = dict(os.environ, DATABASE_URL=url, PYTHONWARNINGS="ignore")
+
+        imports = [measure_import(env) for _ in range(args.runs)]
+        cold = [measure_cold_start(env) for _ in range(args.runs)]
+
+    print(f"import main:  {statistics.median(t for t, _ in imports) * 1000:>7.0f} ms")
+    print(f"cold start:   {statistics.median(cold) * 1000:>7.0f} ms")
+    print(f"heavy modules loaded by import main: {imports[0][1] or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
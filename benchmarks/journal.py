@@ -0,0 +1,92 @@
+"""Seeded synthetic trading journals for benchmarks.
+
+``generate_journal(n, seed)`` yields realistic rows: HK and US stocks, mostly
+Long with some Short, stop/target levels, and 0-5 partial exits per entry, most
+of them fully closed. Position aggregates are maintained with ``crud.apply_exit``
+exactly as the API would. ``write_journal`` bulk-inserts a journal into any
+database (SQLite for the benchmark suite) in a few executemany statements.
+"""
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+import crud
+import models
+import schemas
+
+START_DATE = date(2019, 1, 2)
+DAYS = 6 * 365
+US_TICKERS = ["AAPL", "MSFT", "NVDA", "AMZN", "META", "TSLA", "GOOGL", "AMD", "NFLX", "JPM", "V", "COST"]
+HK_LOTS = [100, 200, 500, 1000, 2000]
+EXIT_COUNT_WEIGHTS = [15, 30, 25, 15, 10, 5]  # probability weights for 0..5 exits
+CLOSE_PROBABILITY = 0.8  # chance the last exit closes what remains
+
+_ENTRY_COLUMNS = [c.key for c in models.TradeEntry.__table__.columns if c.key != "updated_at"]  # column default
+
+
+def _price(value: float) -> Decimal:
+    return Decimal(str(round(max(value, 0.01), 2)))
+
+
+def generate_journal(n: int, seed: int = 42):
+    """``(entry_rows, exit_rows)`` as column dicts, with ids assigned from 1."""
+    rng = random.Random(seed)
+    entry_rows, exit_rows = [], []
+    exit_id = 0
+
+    for entry_id in range(1, n + 1):
+        market = "US" if rng.random() < 0.4 else "HK"
+        if market == "US":
+            stock = rng.choice(US_TICKERS)
+            qty = rng.randint(1, 50) * 10
+            entry_price = _price(rng.lognormvariate(4.8, 0.8))
+        else:
+            stock = f"{rng.randint(1, 9999):04d}"
+            qty = rng.choice(HK_LOTS) * rng.randint(1, 5)
+            entry_price = _price(rng.lognormvariate(2.5, 1.2))
+        position = "Long" if rng.random() < 0.8 else "Short"
+        sign = 1 if position == "Long" else -1
+        risk = rng.uniform(0.03, 0.12)
+        entry_date = START_DATE + timedelta(days=rng.randrange(DAYS))
+
+        target = float(entry_price) * (1 + sign * risk * rng.uniform(1.5, 3.0))
+        entry = crud._new_entry(schemas.TradeEntryCreate(
+            stock=stock, market=market, position=position,
+            entry_date=entry_date, entry_price=entry_price, qty=qty,
+            stop_loss_price=_price(float(entry_price) * (1 - sign * risk)),
+            target_price=_price(target) if rng.random() < 0.7 else None,
+        ))
+        entry.id = entry_id
+
+        n_exits = rng.choices(range(len(EXIT_COUNT_WEIGHTS)), EXIT_COUNT_WEIGHTS)[0]
+        closes = rng.random() < CLOSE_PROBABILITY
+        exit_date = entry_date
+        for i in range(n_exits):
+            if entry.remaining_qty == 0:
+                break
+            last = i == n_exits - 1
+            exit_qty = entry.remaining_qty if last and closes else rng.randint(1, entry.remaining_qty)
+            exit_date += timedelta(days=rng.randint(1, 30))
+            exit_price = _price(float(entry_price) * (1 + rng.gauss(0.01, 0.08)))
+            crud.apply_exit(entry, exit_price, exit_qty, exit_date)
+            exit_id += 1
+            exit_rows.append({"id": exit_id, "entry_id": entry_id, "exit_date": exit_date,
+                              "exit_price": exit_price, "exit_qty": exit_qty})
+
+        entry_rows.append({column: getattr(entry, column) for column in _ENTRY_COLUMNS})
+
+    return entry_rows, exit_rows
+
+
+def write_journal(db: Session, n: int, seed: int = 42):
+    """Insert a generated journal and bump the journal version; returns ``(entries, exits)``."""
+    entry_rows, exit_rows = generate_journal(n, seed)
+    db.execute(insert(models.TradeEntry), entry_rows)
+    if exit_rows:
+        db.execute(insert(models.TradeExit), exit_rows)
+    crud.bump_journal_version(db)
+    db.commit()
+    return len(entry_rows), len(exit_rows)
@@ -0,0 +1,174 @@
+"""Benchmark suite for the API and analytics hot paths.
+
+Run from the repo root:
+    python -m benchmarks.suite [--sizes 1000 10000 100000] [--repeat 5] [--output bench.json]
+    python -m benchmarks.suite --compare baseline.json [--threshold 0.2]
+
+For each size a seeded synthetic journal (``benchmarks.journal``) is written into
+a fresh SQLite file and the app is driven in-process through ``TestClient``:
+``GET /entries``, ``GET /entries/closed``, ``GET /entries/{id}``, ``POST /exits``,
+plus ``compute_derived_fields_batch`` over every entry and
+``generate_monthly_summary`` over the closed trades. Each case reports the median
+and minimum of ``--repeat`` runs after one warm-up.
+
+Results are written as JSON. With ``--compare`` every case whose median is more
+than ``--threshold`` slower than the baseline (and at least ``--min-delta``
+seconds slower) is flagged, and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Each journal gets its tables from create_all in bench_size (the app's schema comes
+# from `manage.py migrate`); point the app's own engines away from the configured database
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_app.db")
+
+import crud  # noqa: E402
+from benchmarks.journal import write_journal  # noqa: E402
+from database import Base  # noqa: E402
+from derived import compute_derived_fields_batch  # noqa: E402
+from utils import generate_monthly_summary  # noqa: E402
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+
+
+def measure(fn, repeat: int) -> dict:
+    fn()  # warm-up
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return {"median_s": statistics.median(runs), "min_s": min(runs), "runs": repeat}
+
+
+def _get(client, url):
+    def call():
+        response = client.get(url)
+        response.raise_for_status()
+    return call
+
+
+def bench_size(n: int, repeat: int, seed: int, workdir: str) -> dict:
+    from fastapi.testclient import TestClient
+    from main import app, get_db
+
+    engine = create_engine(f"sqlite:///{workdir}/journal_{n}.db")
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    db = SessionLocal()
+    try:
+        n_entries, n_exits = write_journal(db, n, seed)
+        entries = crud.get_entries(db, limit=n)
+        closed_trades = [r.model_dump(mode="json") for r in compute_derived_fields_batch(
+            crud.get_closed_entries(db))]
+        open_ids = [e.id for e in entries if e.is_open][: repeat + 1]
+    finally:
+        db.close()
+    print(f"  {n_entries} entries, {n_exits} exits, {len(closed_trades)} closed", file=sys.stderr)
+
+    def override_get_db():
+        session = SessionLocal()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    client = TestClient(app)
+    results = {}
+    try:
+        results["GET /entries"] = measure(_get(client, "/entries"), repeat)
+        results["GET /entries/closed"] = measure(_get(client, "/entries/closed"), repeat)
+        results["GET /entries/{id}"] = measure(_get(client, f"/entries/{entries[n // 2].id}"), repeat)
+        results["compute_derived_fields"] = measure(lambda: compute_derived_fields_batch(entries), repeat)
+        results["generate_monthly_summary"] = measure(lambda: generate_monthly_summary(closed_trades), repeat)
+
+        # Last: it writes. One unit off a different open entry per call.
+        pending = iter(open_ids)
+
+        def post_exit():
+            response = client.post("/exits", json={
+                "entry_id": next(pending), "exit_date": "2025-06-02", "exit_price": 10.0, "exit_qty": 1})
+            response.raise_for_status()
+        if len(open_ids) > repeat:
+            results["POST /exits"] = measure(post_exit, repeat)
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        engine.dispose()
+    return results
+
+
+def compare(current: dict, baseline: dict, threshold: float, min_delta: float) -> list:
+    """Print current vs baseline medians; returns the regressed ``(size, case)`` pairs."""
+    regressions = []
+    print(f"{'size':>8}  {'case':<26}{'baseline (s)':>13}{'current (s)':>13}{'ratio':>8}")
+    for size, cases in current["results"].items():
+        for case, result in cases.items():
+            base = baseline.get("results", {}).get(size, {}).get(case)
+            if base is None:
+                print(f"{size:>8}  {case:<26}{'-':>13}{result['median_s']:>13.4f}{'new':>8}")
+                continue
+            ratio = result["median_s"] / base["median_s"] if base["median_s"] else float("inf")
+            regressed = ratio > 1 + threshold and result["median_s"] - base["median_s"] > min_delta
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{size:>8}  {case:<26}{base['median_s']:>13.4f}{result['median_s']:>13.4f}{ratio:>8.2f}{flag}")
+            if regressed:
+                regressions.append((size, case))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    parser.add_argument("--compare", metavar="BASELINE", help="baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown ratio (0.2 = 20%%)")
+    parser.add_argument("--min-delta", type=float, default=0.005, help="ignore slowdowns under this many seconds")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    results = {}
+    for n in args.sizes:
+        print(f"benchmarking {n} entries", file=sys.stderr)
+        results[str(n)] = bench_size(n, args.repeat, args.seed, workdir)
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    elif not args.compare:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold, args.min_delta):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,195 @@
-from sqlalchemy import desc
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, case, desc, extract, func, insert, or_, select, update
+from sqlalchemy.orm import Session, joinedload, raiseload, selectinload
+from datetime import date, datetime
+from types import SimpleNamespace
+from typing import List
 from decimal import Decimal
-import models, schemas
+import base64
+import json
+import random
+import time
+import equity, fx, models, schemas
 
 
-# ========== Entry Operations ==========
+# Eager-loading strategies for TradeEntry.exits. "selectin" issues one extra
+# IN (...) query per page of entries; "joined" folds exits into the entry query;
+# "none" skips them entirely (the persisted aggregates cover derived fields) and
+# raises if they are touched anyway; render such entries with include_exits=False.
+EXIT_LOADERS = {
+    "selectin": selectinload,
+    "joined": joinedload,
+    "none": raiseload,
+}
 
-def create_entry(db: Session, entry: schemas.TradeEntryCreate):
-    db_entry = models.TradeEntry(
+
+def _load_exits(query, load_exits: str):
+    return query.options(EXIT_LOADERS[load_exits](models.TradeEntry.exits))
+
+
+# ========== Journal Version ==========
+
+JOURNAL_STATE_ID = 1
+
+
+def bump_journal_version(db: Session) -> int:
+    """Advance the journal write version inside the caller's transaction; returns
+    the new version (the UPDATE holds the row lock, so it is this write's own)."""
+    now = models.utcnow()
+    state = models.JournalState
+    result = db.execute(
+        update(state)
+        .where(state.id == JOURNAL_STATE_ID)
+        .values(version=state.version + 1, updated_at=now)
+    )
+    if result.rowcount == 0:
+        db.add(state(id=JOURNAL_STATE_ID, version=1, updated_at=now))
+        return 1
+    return db.execute(select(state.version).where(state.id == JOURNAL_STATE_ID)).scalar_one()
+
+
+def get_journal_version(db: Session):
+    """``(version, updated_at)`` of the journal; ``(0, None)`` before the first write."""
+    state = models.JournalState
+    row = db.execute(
+        select(state.version, state.updated_at).where(state.id == JOURNAL_STATE_ID)
+    ).first()
+    return (row.version, row.updated_at) if row else (0, None)
+
+
+# ========== Position Aggregates ==========
+
+def _new_entry(entry: schemas.TradeEntryCreate) -> models.TradeEntry:
+    return models.TradeEntry(
         **entry.model_dump(),
         remaining_qty=entry.qty,
         is_open=True,
+        exited_qty=0,
+        realized_pnl=Decimal(0),
+        realized_pnl_hkd=Decimal(0),
+    )
+
+
+def _avg_exit_price(entry_price, position, realized_pnl, exited_qty):
+    # realized = sign * (exit notional - entry_price * exited_qty), so the VWAP
+    # falls out of the exact realized PnL without storing the notional.
+    if not exited_qty:
+        return None
+    sign = 1 if position == "Long" else -1
+    return (entry_price + sign * Decimal(realized_pnl) / exited_qty).quantize(Decimal("0.0001"))
+
+
+def apply_exit(entry: models.TradeEntry, exit_price: Decimal, exit_qty: int, exit_date, fx_rate: Decimal = None):
+    """Fold one exit into the entry's remaining qty and persisted aggregates.
+
+    ``fx_rate`` converts the exit's PnL into the reporting currency; without it
+    the market's configured fallback rate is used. Returns that converted PnL.
+    """
+    if fx_rate is None:
+        fx_rate = fx.fallback_rate(entry.market)
+    if entry.position == "Long":
+        pnl = (exit_price - entry.entry_price) * exit_qty
+    else:
+        pnl = (entry.entry_price - exit_price) * exit_qty
+
+    entry.remaining_qty -= exit_qty
+    if entry.remaining_qty == 0:
+        entry.is_open = False
+    entry.exited_qty += exit_qty
+    entry.realized_pnl += pnl
+    pnl_reporting = pnl * fx_rate
+    entry.realized_pnl_hkd += pnl_reporting
+    entry.avg_exit_price = _avg_exit_price(entry.entry_price, entry.position, entry.realized_pnl, entry.exited_qty)
+    if entry.last_exit_date is None or exit_date > entry.last_exit_date:
+        entry.last_exit_date = exit_date
+    return pnl_reporting
+
+
+def rebuild_position_aggregates(db: Session) -> int:
+    """Recompute remaining qty, open state and exit aggregates of every entry from trade_exits."""
+    exit, entry = models.TradeExit, models.TradeEntry
+    rate = func.coalesce(exit.fx_rate, fx.fallback_rate_expr(entry.market))
+    exit_totals = (
+        db.query(
+            exit.entry_id.label("entry_id"),
+            func.sum(exit.exit_qty).label("exited_qty"),
+            func.sum(exit.exit_price * exit.exit_qty).label("notional"),
+            # Reporting-currency PnL at each exit's own rate
+            func.sum((exit.exit_price - entry.entry_price) * exit.exit_qty * rate).label("delta_reporting"),
+            func.max(exit.exit_date).label("last_exit_date"),
+        )
+        .join(entry, entry.id == exit.entry_id)
+        .group_by(exit.entry_id)
+        .subquery()
+    )
+    rows = (
+        db.query(
+            models.TradeEntry.id, models.TradeEntry.version, models.TradeEntry.position,
+            models.TradeEntry.entry_price, models.TradeEntry.qty,
+            exit_totals.c.exited_qty, exit_totals.c.notional, exit_totals.c.delta_reporting,
+            exit_totals.c.last_exit_date,
+        )
+        .outerjoin(exit_totals, exit_totals.c.entry_id == models.TradeEntry.id)
+        .all()
     )
+
+    updates = []
+    for id, version, position, entry_price, qty, exited_qty, notional, delta_reporting, last_exit_date in rows:
+        exited_qty = int(exited_qty or 0)
+        sign = 1 if position == "Long" else -1
+        realized = sign * (Decimal(notional or 0) - entry_price * exited_qty)
+        realized = realized.quantize(Decimal("0.01"))
+        updates.append({
+            "id": id,
+            "version": version + 1,  # exits racing the rebuild fail their compare-and-swap and retry
+            "remaining_qty": qty - exited_qty,
+            "is_open": qty - exited_qty > 0,
+            "exited_qty": exited_qty,
+            "realized_pnl": realized,
+            "realized_pnl_hkd": (sign * Decimal(delta_reporting or 0)).quantize(Decimal("0.0001")),
+            "avg_exit_price": _avg_exit_price(entry_price, position, realized, exited_qty),
+            "last_exit_date": last_exit_date,
+        })
+
+    try:
+        if updates:
+            db.execute(update(models.TradeEntry), updates)
+        bump_journal_version(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(updates)
+
+
+
+def reprice_exits(db: Session, only_missing: bool = False) -> int:
+    """Re-resolve every exit's ``fx_rate`` from ``fx_rates`` (only NULL ones with
+    ``only_missing``) and rebuild the aggregates that depend on it; returns exits updated."""
+    exit, entry = models.TradeExit, models.TradeEntry
+    query = select(exit.id, entry.market, exit.exit_date).join(entry, entry.id == exit.entry_id)
+    if only_missing:
+        query = query.where(exit.fx_rate.is_(None))
+    rows = db.execute(query).all()
+
+    rates = fx.get_rates(db).for_markets([r.market for r in rows], [r.exit_date for r in rows], as_decimal=True)
+    try:
+        if rows:
+            db.execute(update(exit), [{"id": r.id, "fx_rate": rate} for r, rate in zip(rows, rates)])
+    except Exception:
+        db.rollback()
+        raise
+    rebuild_position_aggregates(db)  # commits the new rates with the aggregates
+    return len(rows)
+
+
+# ========== Entry Operations ==========
+
+def create_entry(db: Session, entry: schemas.TradeEntryCreate):
+    db_entry = _new_entry(entry)
     db.add(db_entry)
+    version = bump_journal_version(db)
     db.commit()
+    _record_equity_write(version)
     db.refresh(db_entry)
     return db_entry
 
@@ -22,45 +198,555 @@ def get_entry(db: Session, entry_id: int):
     return db.query(models.TradeEntry).filter(models.TradeEntry.id == entry_id).first()
 
 
-def get_entries(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.TradeEntry).order_by(desc(models.TradeEntry.entry_date)).offset(
-        skip).limit(limit).all()
+def get_entry_with_exits(db: Session, entry_id: int, load_exits: str = "joined"):
+    query = db.query(models.TradeEntry).filter(models.TradeEntry.id == entry_id)
+    return _load_exits(query, load_exits).first()
+
+
+# Sort keys of GET /entries, each with the parser of its cursor value. Pages are
+# keyset-paginated on (column, id); the columns are NOT NULL so the seek is exact.
+SORT_COLUMNS = {
+    "entry_date": date.fromisoformat,
+    "stock": str,
+    "market": str,
+    "entry_price": Decimal,
+    "qty": int,
+    "remaining_qty": int,
+    "realized_pnl_hkd": Decimal,
+}
+
+
+def encode_cursor(entry: models.TradeEntry, sort_by: str = "entry_date") -> str:
+    """Opaque keyset cursor: base64url of JSON ``[sort value, id]`` (header-safe
+    ASCII whatever the value, e.g. a non-Latin stock name)."""
+    value = getattr(entry, sort_by)
+    value = value.isoformat() if isinstance(value, date) else str(value) if isinstance(value, Decimal) else value
+    payload = json.dumps([value, entry.id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str, sort_by: str = "entry_date"):
+    """Parse an ``encode_cursor`` cursor into ``(sort value, id)``; raises ValueError if malformed."""
+    try:
+        value, entry_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(entry_id, int):
+            raise TypeError(entry_id)
+        return SORT_COLUMNS[sort_by](value), entry_id
+    except (ValueError, TypeError, ArithmeticError) as e:  # decimal.InvalidOperation is an ArithmeticError
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def filter_entries(query, filters: schemas.EntryFilter):
+    if filters.stock:
+        query = query.filter(models.TradeEntry.stock.startswith(filters.stock, autoescape=True))
+    if filters.market:
+        query = query.filter(models.TradeEntry.market == filters.market)
+    if filters.is_open is not None:
+        query = query.filter(models.TradeEntry.is_open == filters.is_open)
+    if filters.entry_date_from:
+        query = query.filter(models.TradeEntry.entry_date >= filters.entry_date_from)
+    if filters.entry_date_to:
+        query = query.filter(models.TradeEntry.entry_date <= filters.entry_date_to)
+    return query
+
+
+def get_entries(db: Session, filters: schemas.EntryFilter = None, after=None, limit: int = 100,
+                load_exits: str = "selectin", sort_by: str = "entry_date", descending: bool = True):
+    """Page of entries matching ``filters``, ordered by ``sort_by`` then id (newest first by default).
+
+    ``after`` is the ``(sort value, id)`` of the last row of the previous page;
+    seeking past it keeps every page a range scan, however deep.
+    """
+    column, id_column = getattr(models.TradeEntry, sort_by), models.TradeEntry.id
+    query = filter_entries(db.query(models.TradeEntry), filters or schemas.EntryFilter())
+    if after is not None:
+        after_value, after_id = after
+        if descending:
+            query = query.filter(or_(column < after_value, and_(column == after_value, id_column < after_id)))
+        else:
+            query = query.filter(or_(column > after_value, and_(column == after_value, id_column > after_id)))
+    query = query.order_by(desc(column), desc(id_column)) if descending else query.order_by(column, id_column)
+    return _load_exits(query, load_exits).limit(limit).all()
+
+def get_closed_entries(db: Session, load_exits: str = "selectin"):
+    query = db.query(models.TradeEntry).filter(models.TradeEntry.is_open == False)
+    return _load_exits(query, load_exits).all()
+
+
+def bulk_create_entries(db: Session, rows):
+    """Insert validated (entry, exit-or-None) pairs in one transaction.
+
+    Entries are flushed together so SQLAlchemy can batch the INSERTs and hand
+    back primary keys; exits are then written with a single executemany.
+    Returns ``(entries_created, exits_created)``.
+    """
+    with_exit = [(entry, exit) for entry, exit in rows if exit is not None]
+    rates = iter(fx.get_rates(db).for_markets(
+        [entry.market for entry, _ in with_exit], [exit.exit_date for _, exit in with_exit], as_decimal=True))
+
+    db_entries, exits = [], []
+    for entry, exit in rows:
+        db_entry = _new_entry(entry)
+        if exit is not None:
+            fx_rate = next(rates)
+            apply_exit(db_entry, exit.exit_price, exit.exit_qty, exit.exit_date, fx_rate)
+            exits.append((db_entry, exit, fx_rate))
+        db_entries.append(db_entry)
+
+    try:
+        db.add_all(db_entries)
+        db.flush()
+
+        exit_rows = [
+            {"entry_id": db_entry.id, **exit.model_dump(), "fx_rate": fx_rate}
+            for db_entry, exit, fx_rate in exits
+        ]
+        if exit_rows:
+            db.execute(insert(models.TradeExit), exit_rows)
+        bump_journal_version(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return len(db_entries), len(exit_rows)
+
+
+# ========== Export ==========
+
+EXPORT_BATCH_SIZE = 1000  # rows per server-side cursor fetch
+
+_ENTRY_TABLE = models.TradeEntry.__table__
+_EXIT_TABLE = models.TradeExit.__table__
+
+
+def export_statement(filters: schemas.EntryFilter = None, since: datetime = None):
+    """Entries left-joined to their exits in ``(updated_at, id)`` order, streamed with ``yield_per``.
+
+    Exits ride along in the same query rather than a selectin load: MySQL cannot
+    run a second statement on a connection while a server-side cursor is open.
+    """
+    exit_columns = [column.label(f"exit_{column.key}") for column in _EXIT_TABLE.c if column.key != "entry_id"]
+    stmt = filter_entries(
+        select(_ENTRY_TABLE, *exit_columns).outerjoin(_EXIT_TABLE, _EXIT_TABLE.c.entry_id == _ENTRY_TABLE.c.id),
+        filters or schemas.EntryFilter(),
+    )
+    if since is not None:
+        stmt = stmt.filter(_ENTRY_TABLE.c.updated_at >= since)
+    stmt = stmt.order_by(_ENTRY_TABLE.c.updated_at, _ENTRY_TABLE.c.id, _EXIT_TABLE.c.id)
+    return stmt.execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+
+class ExportGrouper:
+    """Folds joined export rows back into entries with ``exits`` lists.
+
+    ``feed`` takes one fetched partition and returns the entries completed so
+    far; the last entry is held back because its exits may continue in the next
+    partition. ``finish`` returns it.
+    """
+
+    def __init__(self):
+        self._current = None
+
+    def feed(self, rows) -> list:
+        done = []
+        for row in rows:
+            values = row._mapping
+            if self._current is None or values["id"] != self._current.id:
+                if self._current is not None:
+                    done.append(self._current)
+                self._current = SimpleNamespace(**{c.key: values[c.key] for c in _ENTRY_TABLE.c}, exits=[])
+            if values["exit_id"] is not None:
+                self._current.exits.append(SimpleNamespace(
+                    id=values["exit_id"], entry_id=values["id"], exit_date=values["exit_exit_date"],
+                    exit_price=values["exit_exit_price"], exit_qty=values["exit_exit_qty"],
+                    fx_rate=values["exit_fx_rate"],
+                ))
+        return done
 
-def get_closed_entries(db: Session):
-    return db.query(models.TradeEntry).filter(models.TradeEntry.is_open == False).all()
+    def finish(self) -> list:
+        current, self._current = self._current, None
+        return [current] if current is not None else []
+
+
+def iter_export_batches(db: Session, filters: schemas.EntryFilter = None, since: datetime = None):
+    """Yield lists of entries (with exits) for export, a cursor partition at a time."""
+    grouper = ExportGrouper()
+    for rows in db.execute(export_statement(filters, since)).partitions():
+        batch = grouper.feed(rows)
+        if batch:
+            yield batch
+    last = grouper.finish()
+    if last:
+        yield last
 
 
 # ========== Exit Operations ==========
 
-def create_exit(db: Session, exit: schemas.TradeExitCreate):
-    parent_entry = get_entry(db, exit.entry_id)
-    if not parent_entry or not parent_entry.is_open:
-        raise ValueError("Entry not found or already closed")
+EXIT_CAS_RETRIES = 5  # attempts before an exit that keeps losing its entry's version gives up
+
+
+class ExitConflict(Exception):
+    """An exit lost the compare-and-swap on its entry's version on every attempt."""
+
+
+_ENTRY_STATE_FIELDS = ("market", "position", "entry_price", "version")
+_AGGREGATE_FIELDS = ("remaining_qty", "is_open", "exited_qty", "realized_pnl", "realized_pnl_hkd",
+                     "avg_exit_price", "last_exit_date")
+
 
-    if parent_entry.remaining_qty < exit.exit_qty:
+def _try_apply_exit(db: Session, exit: schemas.TradeExitCreate, for_update: bool = False):
+    """One optimistic attempt at ``exit``: ``(db_exit, pnl, market)``, or None when
+    the entry changed after it was read (nothing is written then).
+
+    The entry is read as plain values, the new aggregates computed from them,
+    and the UPDATE only applies if ``version`` still matches (and the quantity
+    is still available), so concurrent exits can never both spend the same
+    remaining quantity.
+    """
+    entry = models.TradeEntry
+    query = select(*(getattr(entry, f) for f in _ENTRY_STATE_FIELDS + _AGGREGATE_FIELDS)).where(entry.id == exit.entry_id)
+    row = db.execute(query.with_for_update() if for_update else query).first()
+    if row is None or not row.is_open:
+        raise ValueError("Entry not found or already closed")
+    if row.remaining_qty < exit.exit_qty:
         raise ValueError("Exit quantity exceeds remaining position")
 
+    state = SimpleNamespace(**row._mapping)
+    fx_rate = fx.rate_for(db, state.market, exit.exit_date)
+    pnl = apply_exit(state, exit.exit_price, exit.exit_qty, exit.exit_date, fx_rate)
+
+    result = db.execute(
+        update(entry)
+        .where(entry.id == exit.entry_id, entry.version == row.version, entry.remaining_qty >= exit.exit_qty)
+        .values(version=row.version + 1, **{f: getattr(state, f) for f in _AGGREGATE_FIELDS})
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return None
+
     db_exit = models.TradeExit(
         entry_id=exit.entry_id,
         exit_date=exit.exit_date,
         exit_price=exit.exit_price,
-        exit_qty=exit.exit_qty
+        exit_qty=exit.exit_qty,
+        fx_rate=fx_rate,
     )
     db.add(db_exit)
+    db.flush()
+    return db_exit, pnl, state.market
+
+
+def exit_backoff(attempt: int) -> float:
+    """Seconds to wait after losing compare-and-swap ``attempt`` (jittered, growing)."""
+    return random.uniform(0, 0.002 * (attempt + 1))
+
 
-    # Update entry state
-    parent_entry.remaining_qty -= exit.exit_qty
-    if parent_entry.remaining_qty == 0:
-        parent_entry.is_open = False
+def try_create_exit(db: Session, exit: schemas.TradeExitCreate):
+    """One attempt at ``create_exit``: the committed exit, or None (rolled back)
+    when the entry changed after it was read."""
+    applied = _try_apply_exit(db, exit)
+    if applied is None:
+        db.rollback()  # end the transaction so the next attempt reads the committed state
+        return None
 
+    db_exit, pnl, market = applied
+    version = bump_journal_version(db)
     db.commit()
+    _record_equity_write(version, market, exit.exit_date, pnl)
     db.refresh(db_exit)
     return db_exit
 
 
+def create_exit(db: Session, exit: schemas.TradeExitCreate):
+    """Record an exit and fold it into its entry's aggregates in one transaction.
+
+    Lost compare-and-swaps are retried (after ``exit_backoff``) up to
+    ``EXIT_CAS_RETRIES`` times before raising ``ExitConflict``. The backoff
+    blocks the calling thread; ``crud_async.create_exit`` awaits it instead.
+    """
+    for attempt in range(EXIT_CAS_RETRIES):
+        db_exit = try_create_exit(db, exit)
+        if db_exit is not None:
+            return db_exit
+        time.sleep(exit_backoff(attempt))
+    raise ExitConflict(f"Entry {exit.entry_id} is being updated concurrently; retry the exit")
+
+
+def create_exits_batch(db: Session, exits: List[schemas.TradeExitCreate]) -> schemas.ExitBatchResult:
+    """Apply exits across any number of entries in one transaction, with a result per item.
+
+    Each exit runs in its own SAVEPOINT, so an invalid one is rolled back alone.
+    Entries are read ``FOR UPDATE``: the batch locks every entry it updates
+    anyway, and a locking read sees the latest committed version even late in
+    the batch's transaction, so the compare-and-swap only fails on engines
+    that ignore the lock hint.
+    """
+    result = schemas.ExitBatchResult()
+    try:
+        for index, exit in enumerate(exits):
+            try:
+                with db.begin_nested():
+                    applied = _try_apply_exit(db, exit, for_update=True)
+                    if applied is None:
+                        raise ExitConflict(f"Entry {exit.entry_id} is being updated concurrently")
+            except (ValueError, ExitConflict) as e:
+                result.results.append(schemas.ExitBatchItem(index=index, error=str(e)))
+                continue
+            result.results.append(schemas.ExitBatchItem(
+                index=index, exit=schemas.TradeExitResponse.model_validate(applied[0], from_attributes=True)))
+            result.exits_created += 1
+
+        if result.exits_created:
+            bump_journal_version(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return result
+
+
 def get_exit(db: Session, exit_id: int):
     return db.query(models.TradeExit).filter(models.TradeExit.id == exit_id).first()
 
 
 def get_exits_for_entry(db: Session, entry_id: int):
     return db.query(models.TradeExit).filter(models.TradeExit.entry_id == entry_id).all()
+
+
+# ========== Summary Operations ==========
+
+def _day_number(db: Session, column):
+    """Dialect-specific day count, so date differences can be averaged in SQL."""
+    if db.get_bind().dialect.name == "sqlite":
+        return func.julianday(column)
+    return func.to_days(column)
+
+
+def _to_float(value):
+    return None if value is None else float(value)
+
+
+def get_monthly_summary(db: Session, year: int = None, market: str = None):
+    """Per exit-month performance of closed trades, aggregated in the database.
+
+    Each exit is attributed its own realized PnL (``exit_qty x price delta x fx``),
+    return on the exited capital and holding days, so a trade closed in several
+    partial exits contributes to each exit's month exactly once.
+    """
+    entry, exit = models.TradeEntry, models.TradeExit
+    sign = case((entry.position == "Long", 1), else_=-1)
+    rate = func.coalesce(exit.fx_rate, fx.fallback_rate_expr(entry.market))
+    delta = (exit.exit_price - entry.entry_price) * sign
+
+    per_exit = (
+        db.query(
+            extract("year", exit.exit_date).label("year"),
+            extract("month", exit.exit_date).label("month"),
+            (delta * exit.exit_qty * rate).label("pnl"),
+            (delta / entry.entry_price).label("pnl_pct"),
+            (_day_number(db, exit.exit_date) - _day_number(db, entry.entry_date)).label("days"),
+        )
+        .join(entry, entry.id == exit.entry_id)
+        .filter(entry.is_open == False)
+    )
+    if year is not None:
+        per_exit = per_exit.filter(exit.exit_date >= date(year, 1, 1), exit.exit_date < date(year + 1, 1, 1))
+    if market:
+        per_exit = per_exit.filter(entry.market == market)
+    per_exit = per_exit.subquery()
+
+    win, loss = per_exit.c.pnl > 0, per_exit.c.pnl < 0
+    rows = (
+        db.query(
+            per_exit.c.year,
+            per_exit.c.month,
+            func.sum(case((win, 1), else_=0)).label("wins"),
+            func.sum(case((loss, 1), else_=0)).label("losses"),
+            func.sum(case((win, per_exit.c.pnl))).label("total_gain"),
+            func.sum(case((loss, per_exit.c.pnl))).label("total_loss"),
+            func.avg(case((win, per_exit.c.pnl_pct))).label("avg_gain_pct"),
+            func.avg(case((loss, per_exit.c.pnl_pct))).label("avg_loss_pct"),
+            func.max(per_exit.c.pnl).label("largest_gain"),
+            func.min(per_exit.c.pnl).label("largest_loss"),
+            func.avg(case((win, per_exit.c.days))).label("avg_days_win"),
+            func.avg(case((loss, per_exit.c.days))).label("avg_days_loss"),
+        )
+        .group_by(per_exit.c.year, per_exit.c.month)
+        .order_by(per_exit.c.year, per_exit.c.month)
+        .all()
+    )
+
+    summary = []
+    for row in rows:
+        wins, losses = int(row.wins or 0), int(row.losses or 0)
+        total_gain, total_loss = _to_float(row.total_gain), _to_float(row.total_loss)
+        summary.append(schemas.MonthlySummary(
+            month=f"{int(row.year):04d}-{int(row.month):02d}",
+            winning_trades=wins,
+            losing_trades=losses,
+            win_rate=wins / (wins + losses) if wins + losses else None,
+            avg_gain=total_gain / wins if wins else None,
+            avg_loss=total_loss / losses if losses else None,
+            avg_gain_pct=_to_float(row.avg_gain_pct),
+            avg_loss_pct=_to_float(row.avg_loss_pct),
+            actual_rr_ratio=abs(total_gain / total_loss) if wins and losses else None,
+            largest_gain=_to_float(row.largest_gain),
+            largest_loss=_to_float(row.largest_loss),
+            avg_holding_days_win=_to_float(row.avg_days_win),
+            avg_holding_days_loss=_to_float(row.avg_days_loss),
+        ))
+    return summary
+
+
+# ========== Performance Breakdown ==========
+
+def get_performance_breakdown(db: Session, by: str = "symbol", market: str = None, sort_by: str = "total_pnl",
+                              descending: bool = True, limit: int = 20, min_trades: int = 1):
+    """Closed-trade performance per (market, stock) (``by="symbol"``) or per market,
+    aggregated, sorted and limited in the database.
+
+    A trade is a closed entry and its PnL the entry's ``realized_pnl_hkd``
+    aggregate, so no exits are read. The R-multiple is the realized PnL (market
+    currency) over the initial risk, ``|entry_price - stop_loss_price| x qty``;
+    trades without a stop are left out of its average.
+    """
+    entry = models.TradeEntry
+    pnl = entry.realized_pnl_hkd
+    risk = func.abs(entry.entry_price - entry.stop_loss_price) * entry.qty
+    keys = [entry.market, entry.stock] if by == "symbol" else [entry.market]
+
+    trades = func.count()
+    wins = func.sum(case((pnl > 0, 1), else_=0))
+    losses = func.sum(case((pnl < 0, 1), else_=0))
+    gross_loss = -func.sum(case((pnl < 0, pnl), else_=0))
+    # "* 1.0" keeps SQLite from integer division when the sums hold whole numbers
+    aggregates = {
+        "trades": trades,
+        "winning_trades": wins,
+        "losing_trades": losses,
+        "win_rate": wins * 1.0 / func.nullif(wins + losses, 0),
+        "total_pnl": func.sum(pnl),
+        "expectancy": func.avg(pnl),
+        "profit_factor": func.sum(case((pnl > 0, pnl), else_=0)) * 1.0 / func.nullif(gross_loss, 0),
+        "avg_r_multiple": func.avg(case((risk > 0, entry.realized_pnl * 1.0 / risk))),
+        "best_trade": func.max(pnl),
+        "worst_trade": func.min(pnl),
+    }
+    columns = {name: column.label(name) for name, column in aggregates.items()}
+
+    sort = columns[sort_by]
+    query = (
+        select(*keys, *columns.values())
+        .where(entry.is_open == False)
+        .group_by(*keys)
+        .having(trades >= min_trades)
+        # NULLs (no losses / no stops) last either way; MySQL has no NULLS LAST
+        .order_by(sort.is_(None), sort.desc() if descending else sort, *keys)
+        .limit(limit)
+    )
+    if market:
+        query = query.where(entry.market == market)
+
+    results = []
+    for row in db.execute(query).mappings():
+        results.append(schemas.PerformanceBreakdown(
+            market=row["market"],
+            stock=row["stock"] if by == "symbol" else None,
+            trades=row["trades"],
+            winning_trades=int(row["winning_trades"] or 0),
+            losing_trades=int(row["losing_trades"] or 0),
+            **{name: _to_float(row[name]) for name in (
+                "win_rate", "total_pnl", "expectancy", "profit_factor", "avg_r_multiple", "best_trade", "worst_trade")},
+        ))
+    return results
+
+
+# ========== Simulation ==========
+
+def get_trade_returns(db: Session, basis: str = "r_multiple", market: str = None, position: str = None) -> List[float]:
+    """Per closed trade (in id order): its R-multiple (``basis="r_multiple"``, trades
+    with a stop only) or its return on the capital invested (``basis="return"``)."""
+    entry = models.TradeEntry
+    if basis == "r_multiple":
+        risk = func.abs(entry.entry_price - entry.stop_loss_price) * entry.qty
+        value, condition = entry.realized_pnl * 1.0 / risk, risk > 0
+    else:
+        capital = entry.entry_price * entry.qty
+        value, condition = entry.realized_pnl * 1.0 / capital, capital > 0
+    query = select(value).where(entry.is_open == False, condition).order_by(entry.id)
+    if market:
+        query = query.where(entry.market == market)
+    if position:
+        query = query.where(entry.position == position)
+    return [float(v) for v in db.execute(query).scalars()]
+
+
+# ========== Equity Curve ==========
+
+def _record_equity_write(version: int, market: str = None, exit_date=None, pnl=None):
+    """Let a committed single write (at journal ``version``, as returned by its own
+    ``bump_journal_version``) extend the cached equity series instead of invalidating it."""
+    if equity.active():
+        equity.record_write(version, market, exit_date, None if pnl is None else float(pnl))
+
+
+def get_daily_realized_pnl(db: Session, market: str = None):
+    """``(days, pnl)``: realized PnL of every exit (reporting currency) summed per exit date."""
+    entry, exit = models.TradeEntry, models.TradeExit
+    sign = case((entry.position == "Long", 1), else_=-1)
+    rate = func.coalesce(exit.fx_rate, fx.fallback_rate_expr(entry.market))
+    pnl = func.sum((exit.exit_price - entry.entry_price) * sign * exit.exit_qty * rate)
+
+    query = select(exit.exit_date, pnl).join(entry, entry.id == exit.entry_id)
+    if market:
+        query = query.where(entry.market == market)
+    rows = db.execute(query.group_by(exit.exit_date).order_by(exit.exit_date)).all()
+    return [row[0] for row in rows], [float(row[1]) for row in rows]
+
+
+def get_equity_curve(db: Session, granularity: str = "day", market: str = None) -> schemas.EquityCurve:
+    version, _ = get_journal_version(db)
+    series = equity.cached(version, market)
+    if series is None:
+        days, pnl = get_daily_realized_pnl(db, market)
+        equity.store(version, market, days, pnl)
+        series = equity.cached(version, market) or (days, pnl, None)
+    return schemas.EquityCurve.model_validate(equity.equity_curve(*series, granularity=granularity))
+
+
+# ========== Mark-to-market ==========
+
+_POSITION_COLUMNS = ["entry_id", "stock", "market", "position", "entry_date", "entry_price", "remaining_qty",
+                     "stop_loss_price", "target_price"]
+
+
+def get_positions_mtm(db: Session, market: str = None, ids=None) -> schemas.MarkToMarket:
+    """Open positions (only ``ids`` when given) valued at their latest close (``prices.mark_to_market``)."""
+    import pandas as pd
+    import prices  # pandas-backed; loaded on first use so the API starts without pandas
+
+    entry = models.TradeEntry
+    query = (
+        select(entry.id, entry.stock, entry.market, entry.position, entry.entry_date, entry.entry_price,
+               entry.remaining_qty, entry.stop_loss_price, entry.target_price)
+        .where(entry.is_open == True, entry.remaining_qty > 0)
+        .order_by(entry.id)
+    )
+    if market:
+        query = query.where(entry.market == market)
+    if ids:
+        query = query.where(entry.id.in_(ids))
+    positions = pd.DataFrame.from_records(db.execute(query).all(), columns=_POSITION_COLUMNS)
+
+    valued = prices.mark_to_market(positions, prices.get_latest(db), fx.get_rates(db))
+    # Column-wise NaN -> None, then zip into records: far cheaper than DataFrame.to_dict("records")
+    columns = _POSITION_COLUMNS + prices.MTM_COLUMNS
+    values = [valued[c].astype(object).where(valued[c].notna(), None).tolist() for c in columns]
+    records = [dict(zip(columns, row)) for row in zip(*values)]
+    return schemas.MarkToMarket(
+        as_of=max((r["price_date"] for r in records if r["price_date"] is not None), default=None),
+        unrealized_pnl_hkd=float(valued["unrealized_pnl_hkd"].dropna().sum()),
+        unpriced=int(valued["last_price"].isna().sum()),
+        positions=records,
+    )
@@ -0,0 +1,112 @@
+"""Awaitable versions of the ``crud`` operations used by the API routes.
+
+Each operation runs the existing sync ``crud`` function against the request's
+session: on the event loop through ``AsyncSession.run_sync`` when the API is
+served from the async engine (``DB_ASYNC=1``), otherwise on the threadpool.
+Query logic therefore lives in one place for both modes.
+
+Results are returned fully loaded (relationships eagerly fetched or converted
+to response models inside the session call), so nothing lazy-loads once control
+is back on the event loop.
+"""
+import asyncio
+
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud, importer, schemas
+
+
+async def run(db, fn, *args, **kwargs):
+    """Call ``fn(session, *args, **kwargs)`` without blocking the event loop."""
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+# ========== Journal Version ==========
+
+async def get_journal_version(db):
+    return await run(db, crud.get_journal_version)
+
+
+# ========== Entry Operations ==========
+
+def _create_entry(db, entry: schemas.TradeEntryCreate) -> schemas.TradeEntryResponse:
+    return schemas.TradeEntryResponse.model_validate(crud.create_entry(db, entry), from_attributes=True)
+
+async def create_entry(db, entry: schemas.TradeEntryCreate) -> schemas.TradeEntryResponse:
+    return await run(db, _create_entry, entry)
+
+async def get_entry_with_exits(db, entry_id: int, load_exits: str = "joined"):
+    return await run(db, crud.get_entry_with_exits, entry_id, load_exits=load_exits)
+
+async def get_entries(db, filters: schemas.EntryFilter = None, after=None, limit: int = 100,
+                      load_exits: str = "selectin", sort_by: str = "entry_date", descending: bool = True):
+    return await run(db, crud.get_entries, filters, after=after, limit=limit, load_exits=load_exits,
+                     sort_by=sort_by, descending=descending)
+
+async def get_closed_entries(db, load_exits: str = "selectin"):
+    return await run(db, crud.get_closed_entries, load_exits=load_exits)
+
+async def import_chunk(db, chunk) -> schemas.BulkImportResult:
+    return await run(db, importer.import_chunk, chunk)
+
+async def iter_export_batches(db, filters: schemas.EntryFilter = None, since=None):
+    """Async iterator over ``crud.iter_export_batches``; streams from a server-side cursor in both modes."""
+    if not isinstance(db, AsyncSession):
+        async for batch in iterate_in_threadpool(crud.iter_export_batches(db, filters, since)):
+            yield batch
+        return
+
+    grouper = crud.ExportGrouper()
+    result = await db.stream(crud.export_statement(filters, since))
+    async for rows in result.partitions():
+        batch = grouper.feed(rows)
+        if batch:
+            yield batch
+    last = grouper.finish()
+    if last:
+        yield last
+
+
+# ========== Exit Operations ==========
+
+async def create_exit(db, exit: schemas.TradeExitCreate):
+    """``crud.create_exit`` with the compare-and-swap backoff awaited, so a retry
+    never blocks the event loop (or holds a threadpool worker) while it waits."""
+    for attempt in range(crud.EXIT_CAS_RETRIES):
+        db_exit = await run(db, crud.try_create_exit, exit)
+        if db_exit is not None:
+            return db_exit
+        await asyncio.sleep(crud.exit_backoff(attempt))
+    raise crud.ExitConflict(f"Entry {exit.entry_id} is being updated concurrently; retry the exit")
+
+async def create_exits_batch(db, exits):
+    return await run(db, crud.create_exits_batch, exits)
+
+async def get_exit(db, exit_id: int):
+    return await run(db, crud.get_exit, exit_id)
+
+
+# ========== Summary Operations ==========
+
+async def get_monthly_summary(db, year: int = None, market: str = None):
+    return await run(db, crud.get_monthly_summary, year=year, market=market)
+
+
+# ========== Analytics Operations ==========
+
+async def get_equity_curve(db, granularity: str = "day", market: str = None):
+    return await run(db, crud.get_equity_curve, granularity=granularity, market=market)
+
+async def get_performance_breakdown(db, by: str = "symbol", market: str = None, sort_by: str = "total_pnl",
+                                    descending: bool = True, limit: int = 20, min_trades: int = 1):
+    return await run(db, crud.get_performance_breakdown, by=by, market=market, sort_by=sort_by,
+                     descending=descending, limit=limit, min_trades=min_trades)
+
+async def get_trade_returns(db, basis: str = "r_multiple", market: str = None, position: str = None):
+    return await run(db, crud.get_trade_returns, basis=basis, market=market, position=position)
+
+async def get_positions_mtm(db, market: str = None, ids=None):
+    return await run(db, crud.get_positions_mtm, market=market, ids=ids)
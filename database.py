@@ -1,22 +1,83 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-import os
-from dotenv import load_dotenv
 
-load_dotenv()  # Load .env variables
+import instrumentation
+from settings import settings
 
-# Get DB credentials from environment
-DB_HOST = os.getenv("DB_HOST")
-DB_PORT = os.getenv("DB_PORT")
-DB_NAME = os.getenv("DB_NAME")
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
+# Connection URL and engine/pool profile come from the settings object (.env based)
+DATABASE_URL = settings.url
 
-DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# DB_ASYNC=1 serves the API from an AsyncEngine with async route handlers
+DB_ASYNC = settings.db_async
 
-engine = create_engine(DATABASE_URL, echo=True)
+# Sync driver -> asyncio driver used when DB_ASYNC is enabled
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+# ... and back, for processes that take the URL of an async session (jobs.py)
+SYNC_DRIVERS = {"mysql+aiomysql": "mysql+pymysql", "sqlite+aiosqlite": "sqlite"}
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
\ No newline at end of file
+def to_async_url(url):
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+
+
+def to_sync_url(url):
+    url = make_url(url)
+    return url.set(drivername=SYNC_DRIVERS.get(url.drivername, url.drivername))
+
+
+def engine_kwargs(pool_class):
+    kwargs = settings.engine_kwargs()
+    if "pool_size" in kwargs:
+        kwargs["poolclass"] = pool_class  # times checkout waits, see instrumentation.py
+    return kwargs
+
+
+# Engines are created by init_engines() (the API's lifespan, manage.py) rather
+# than at import; the session factories are bound to them there.
+engine = None
+async_engine = None
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    # expire_on_commit=False: attributes must stay readable after commit without lazy IO
+    AsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False)
+else:
+    AsyncSessionLocal = None
+
+
+def init_engines():
+    """Create the engine(s) for ``DATABASE_URL`` once and bind the session factories."""
+    global engine, async_engine
+    if engine is not None:
+        return engine
+    engine = create_engine(DATABASE_URL, **engine_kwargs(instrumentation.InstrumentedQueuePool))
+    instrumentation.instrument_engine(engine, "sync")
+    SessionLocal.configure(bind=engine)
+    if DB_ASYNC:
+        async_engine = create_async_engine(
+            to_async_url(DATABASE_URL), **engine_kwargs(instrumentation.InstrumentedAsyncAdaptedQueuePool))
+        instrumentation.instrument_engine(async_engine.sync_engine, "async")
+        AsyncSessionLocal.configure(bind=async_engine)
+    return engine
+
+
+async def dispose_engines():
+    global engine, async_engine
+    if async_engine is not None:
+        await async_engine.dispose()
+    if engine is not None:
+        engine.dispose()
+    engine = async_engine = None
+
+
+Base = declarative_base()
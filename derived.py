@@ -0,0 +1,111 @@
+"""Per-entry derived fields (PnL %, RR, holding days) for the API responses.
+
+Kept apart from ``utils`` (pandas analytics) so the API process only needs NumPy
+to serve entries.
+"""
+from typing import List, Sequence
+
+import numpy as np
+
+import metrics, models, schemas
+
+# Response fields in schema order; derived ones are computed below, exits are
+# nested rows and the rest are read straight off the ORM row
+_RESPONSE_FIELDS = tuple(schemas.TradeEntryResponse.model_fields)
+_EXIT_FIELDS = tuple(schemas.TradeExitResponse.model_fields)
+_DERIVED_FIELDS = (
+    "expected_loss_pct", "expected_gain_pct", "rr_ratio",
+    "actual_gain_loss_pct", "actual_gain_loss", "holding_days", "total_cost",
+)
+
+
+def _cents(values) -> np.ndarray:
+    """Prices (Decimal or None) as float64 holding exact integer cents, NaN when missing."""
+    return np.rint(np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64) * 100)
+
+
+def _optional(values: np.ndarray) -> list:
+    return [None if np.isnan(v) else v for v in values.tolist()]
+
+
+def _attributes(obj, fields, computed: dict = None) -> dict:
+    """``fields`` of an ORM row in order, taking ``computed`` values first.
+
+    Loaded values are read from the instance ``__dict__``: going through the
+    instrumented attributes costs more than the whole derivation. Anything not
+    loaded (expired, or unset on a transient row) falls back to ``getattr``.
+    """
+    computed = computed or {}
+    loaded = vars(obj)
+    return {
+        field: computed[field] if field in computed else loaded[field] if field in loaded else getattr(obj, field)
+        for field in fields
+    }
+
+
+@metrics.timed("compute_derived_fields")
+def derived_rows(entries: Sequence[models.TradeEntry], include_exits: bool = True) -> List[dict]:
+    """Derive PnL / RR / holding-period fields for many entries in one vectorized pass.
+
+    Returns plain dicts shaped like ``TradeEntryResponse`` (same keys, same
+    order, exits as nested dicts), ready for ``responses.dumps`` without a
+    round trip through the model. ``include_exits=False`` leaves ``exits``
+    empty without touching the relationship (entries loaded with
+    ``load_exits="none"``).
+
+    Prices are carried as integer cents so the arithmetic is exact; each derived
+    float comes from a single division at the end, matching the rounding of
+    the previous ``float(Decimal(...))`` arithmetic.
+    """
+    n = len(entries)
+    if n == 0:
+        return []
+
+    entry_c = _cents(e.entry_price for e in entries)
+    stop_c = _cents(e.stop_loss_price for e in entries)
+    target_c = _cents(e.target_price for e in entries)
+    qty = np.array([e.qty for e in entries], dtype=np.int64)
+    entry_day = np.array([e.entry_date.toordinal() for e in entries], dtype=np.int64)
+
+    # Realized figures come from the aggregates crud.create_exit keeps on the
+    # entry, so no exit rows are walked (or even loaded) here.
+    realized_c = _cents(e.realized_pnl for e in entries)
+    actual_gain_loss = np.array([e.realized_pnl_hkd for e in entries], dtype=np.float64)
+    last_exit_day = np.array([e.last_exit_date.toordinal() if e.last_exit_date else -1 for e in entries],
+                             dtype=np.int64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Expected P&L % (only when the price level is set and non-zero)
+        loss_pct = np.where((entry_c != 0) & (stop_c != 0), np.abs(entry_c - stop_c) / entry_c, np.nan)
+        gain_pct = np.where((entry_c != 0) & (target_c != 0), np.abs(target_c - entry_c) / entry_c, np.nan)
+        rr_ratio = np.where((loss_pct > 0) & (gain_pct > 0),
+                            np.abs(target_c - entry_c) / np.abs(entry_c - stop_c), np.nan)
+
+        cost_c = qty * entry_c
+        actual_gain_loss_pct = np.where(qty > 0, np.where(cost_c != 0, realized_c / cost_c, np.nan), 0.0)
+
+    # Holding days: latest exit date - entry date (0 while nothing has been exited)
+    holding_days = np.where(last_exit_day >= 0, last_exit_day - entry_day, 0)
+
+    total_cost = cost_c / 100
+
+    derived = zip(
+        _optional(loss_pct), _optional(gain_pct), _optional(rr_ratio),
+        _optional(actual_gain_loss_pct), actual_gain_loss.tolist(),
+        holding_days.tolist(), total_cost.tolist(),
+    )
+    rows = []
+    for entry, values in zip(entries, derived):
+        computed = dict(zip(_DERIVED_FIELDS, values))
+        computed["exits"] = [_attributes(exit, _EXIT_FIELDS) for exit in entry.exits] if include_exits else []
+        rows.append(_attributes(entry, _RESPONSE_FIELDS, computed))
+    return rows
+
+
+def compute_derived_fields_batch(entries: Sequence[models.TradeEntry]) -> List[schemas.TradeEntryResponse]:
+    """``derived_rows`` validated into response models."""
+    return [schemas.TradeEntryResponse.model_validate(row) for row in derived_rows(entries)]
+
+
+def compute_derived_fields(entry: models.TradeEntry) -> schemas.TradeEntryResponse:
+    return compute_derived_fields_batch([entry])[0]
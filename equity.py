@@ -0,0 +1,152 @@
+"""Equity curve: cumulative realized PnL, running peak and drawdown over time.
+
+``crud.get_equity_curve`` aggregates realized PnL (reporting currency) per exit
+day in SQL. The daily series is cached in-process per market filter together
+with the journal version it reflects:
+
+- ``record_write`` is called by ``crud.create_entry`` / ``crud.create_exit``
+  after they commit, with the journal version their own transaction set. An
+  exit dated on or after the cached last day is folded
+  into the series (appending a day or adding to the last one); an entry moves
+  the series to the new version unchanged.
+- Anything else that moves the journal version past the cache (a back-dated
+  exit, a bulk import, a rebuild, another process writing) drops the series,
+  and the next read rebuilds it from ``trade_exits``.
+
+Peaks, drawdowns and durations are computed on read with NumPy cumulative
+operations over the (day or week) points, which stays linear in the number of
+days however many exits there are.
+"""
+import threading
+from datetime import date
+from typing import Dict, List, Optional
+
+import numpy as np
+
+GRANULARITIES = ("day", "week")
+
+
+class _Series:
+    __slots__ = ("version", "days", "pnl", "equity")
+
+    def __init__(self, version: int, days: List[date], pnl: List[float]):
+        self.version = version
+        self.days = list(days)
+        self.pnl = list(pnl)
+        self.equity = np.cumsum(pnl).tolist()
+
+    def extend(self, day: date, pnl: float) -> bool:
+        """Fold in a new exit's PnL; False when it is back-dated (needs a rebuild)."""
+        if self.days and day < self.days[-1]:
+            return False
+        last_equity = self.equity[-1] if self.equity else 0.0
+        if self.days and day == self.days[-1]:
+            self.pnl[-1] += pnl
+            self.equity[-1] += pnl
+        else:
+            self.days.append(day)
+            self.pnl.append(pnl)
+            self.equity.append(last_equity + pnl)
+        return True
+
+
+# ========== Cache ==========
+
+_lock = threading.Lock()
+_cache: Dict[Optional[str], _Series] = {}
+
+
+def active() -> bool:
+    """Whether any series is cached (writers skip ``record_write`` otherwise)."""
+    return bool(_cache)
+
+
+def cached(version: int, market: str = None):
+    """``(days, pnl, equity)`` lists for ``market`` if cached at ``version``, else None."""
+    with _lock:
+        series = _cache.get(market)
+        if series is None or series.version != version:
+            return None
+        return list(series.days), list(series.pnl), list(series.equity)
+
+
+def store(version: int, market: str, days: List[date], pnl: List[float]):
+    with _lock:
+        _cache[market] = _Series(version, days, pnl)
+
+
+def record_write(version: int, market: str = None, exit_date: date = None, pnl: float = None):
+    """Advance cached series from ``version - 1`` to ``version`` after a single write.
+
+    ``version`` must be the one the write's own transaction set: ``exit_date``/``pnl``
+    describe the exit it added (None for an entry). Series cached at that version
+    or later already include the write; series cached before ``version - 1``
+    missed another write and are dropped.
+    """
+    with _lock:
+        for key, series in list(_cache.items()):
+            if series.version >= version:
+                continue  # read after this write committed: already includes it
+            if series.version != version - 1:
+                del _cache[key]
+                continue
+            if exit_date is not None and key in (None, market) and not series.extend(exit_date, pnl):
+                del _cache[key]
+                continue
+            series.version = version
+
+
+def invalidate():
+    with _lock:
+        _cache.clear()
+
+
+# ========== Curve ==========
+
+def _weekly(days: np.ndarray, pnl: np.ndarray, equity: np.ndarray):
+    """Collapse daily points into weeks ending Sunday (equity as of the week's last exit day)."""
+    weekday = (days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday; Monday == 0
+    week_end = days + (6 - weekday).astype("timedelta64[D]")
+    starts = np.flatnonzero(np.r_[True, week_end[1:] != week_end[:-1]])
+    ends = np.r_[starts[1:], len(days)] - 1
+    return week_end[starts], np.add.reduceat(pnl, starts), equity[ends]
+
+
+def equity_curve(days: List[date], pnl: List[float], equity: List[float] = None, granularity: str = "day") -> dict:
+    """Curve points and drawdown statistics (``schemas.EquityCurve``) from daily realized PnL.
+
+    Drawdown is measured from the running peak of cumulative PnL, starting at
+    zero; its duration runs from the peak's date until equity recovers to it
+    (or to the last point while still under water).
+    """
+    days = np.asarray(days, dtype="datetime64[D]")
+    pnl = np.asarray(pnl, dtype=np.float64)
+    equity = np.cumsum(pnl) if equity is None else np.asarray(equity, dtype=np.float64)
+    if not len(days):
+        return {"granularity": granularity, "total_pnl": 0.0, "max_drawdown": 0.0,
+                "max_drawdown_duration_days": 0, "points": []}
+    if granularity == "week":
+        days, pnl, equity = _weekly(days, pnl, equity)
+
+    peak = np.maximum.accumulate(np.maximum(equity, 0.0))
+    drawdown = equity - peak
+
+    # Index of the latest peak at or before each point (-1: the zero starting equity)
+    index = np.arange(len(equity))
+    peak_index = np.maximum.accumulate(np.where(drawdown >= 0, index, -1))
+    previous_peak = np.r_[-1, peak_index[:-1]]
+    peak_days = days[np.maximum(previous_peak, 0)]
+    under_water = (drawdown < 0) | np.r_[False, drawdown[:-1] < 0]
+    durations = (days - peak_days).astype(np.int64)[under_water]
+
+    return {
+        "granularity": granularity,
+        "total_pnl": float(equity[-1]),
+        "max_drawdown": float(drawdown.min()),
+        "max_drawdown_duration_days": int(durations.max()) if len(durations) else 0,
+        "points": [
+            {"date": d, "pnl": p, "equity": e, "peak": k, "drawdown": w}
+            for d, p, e, k, w in zip(days.tolist(), pnl.tolist(), equity.tolist(), peak.tolist(),
+                                     drawdown.tolist())
+        ],
+    }
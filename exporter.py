@@ -0,0 +1,43 @@
+"""Formatting for ``GET /export``: NDJSON or CSV chunks, one per streamed batch.
+
+Each batch of entries from ``crud.iter_export_batches`` gets its derived fields
+in one ``derived_rows`` call and is rendered to a single chunk, so the response
+holds at most one batch in memory at a time.
+"""
+import csv
+import io
+from typing import List, Union
+
+import schemas
+from derived import derived_rows
+from responses import dumps
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# One CSV row per entry; its exits are a JSON array in the last column
+CSV_COLUMNS = [field for field in schemas.TradeEntryResponse.model_fields if field != "exits"] + ["exits"]
+
+
+def csv_header() -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(CSV_COLUMNS)
+    return buffer.getvalue()
+
+
+def _csv_value(value):
+    if value is None:
+        return None
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def format_batch(entries: List, format: str) -> Union[bytes, str]:
+    rows = derived_rows(entries)
+    if format == "ndjson":
+        return b"".join(dumps(row) + b"\n" for row in rows)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        row["exits"] = dumps(row["exits"]).decode("utf-8")
+        writer.writerow([_csv_value(row[column]) for column in CSV_COLUMNS])
+    return buffer.getvalue()
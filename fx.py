@@ -0,0 +1,176 @@
+"""FX rates into the reporting currency, cached in-process.
+
+``fx_rates`` holds daily ``base -> quote`` rates. ``FxRates`` keeps one sorted
+array of days and rates per pair and answers "rate on or before day D" with a
+binary search (``np.searchsorted``); ``FxRates.rates`` does the same for a whole
+batch of (currency, day) pairs at once. Which currency a market trades in, and
+the fallback rate used before a pair's first rate, come from settings, so a new
+market is a settings + data change.
+"""
+import csv
+import io
+import threading
+import time
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from typing import Sequence
+
+import numpy as np
+from sqlalchemy import case, delete, func, insert, select
+
+import models
+from settings import settings
+
+CACHE_TTL = 300  # seconds before rates ingested by another process are picked up
+
+
+def currency_for_market(market: str) -> str:
+    """Currency a market trades in; markets without a mapping trade in the reporting currency."""
+    return settings.market_currencies.get(market.upper(), settings.reporting_currency)
+
+
+def fallback_rate(market: str) -> Decimal:
+    """Configured rate for the market's currency (1 for the reporting currency), ignoring ``fx_rates``."""
+    currency = currency_for_market(market)
+    if currency == settings.reporting_currency:
+        return Decimal(1)
+    return settings.fx_fallback_rates.get(currency, Decimal(1))
+
+
+def fallback_rate_expr(market_column):
+    """SQL for ``fallback_rate``, for exits written before their rate was stored."""
+    whens = [
+        (func.upper(market_column) == market, fallback_rate(market))
+        for market, currency in settings.market_currencies.items()
+        if currency != settings.reporting_currency
+    ]
+    return case(*whens, else_=Decimal(1)) if whens else Decimal(1)
+
+
+class FxRates:
+    def __init__(self, rows=()):
+        """``rows``: ``(base_currency, rate_date, rate)`` quoted in the reporting currency."""
+        by_currency = {}
+        for base, rate_date, rate in sorted(rows, key=lambda row: (row[0], row[1])):
+            by_currency.setdefault(base, []).append((rate_date.toordinal(), Decimal(rate)))
+        self._days = {c: np.array([d for d, _ in series], dtype=np.int64) for c, series in by_currency.items()}
+        self._decimals = {c: [r for _, r in series] for c, series in by_currency.items()}
+        self._floats = {c: np.array(rates, dtype=np.float64) for c, rates in self._decimals.items()}
+
+    def _fallback(self, currency: str, day_ordinal) -> Decimal:
+        if currency in settings.fx_fallback_rates:
+            return settings.fx_fallback_rates[currency]
+        if currency in self._decimals:
+            return self._decimals[currency][0]  # before the first rate: the earliest one we have
+        raise ValueError(f"No FX rate for {currency}/{settings.reporting_currency} "
+                         f"on or before {date.fromordinal(int(day_ordinal))}")
+
+    def rate(self, currency: str, day: date) -> Decimal:
+        """Rate on or before ``day``."""
+        if currency == settings.reporting_currency:
+            return Decimal(1)
+        days = self._days.get(currency)
+        i = int(np.searchsorted(days, day.toordinal(), side="right")) - 1 if days is not None else -1
+        return self._decimals[currency][i] if i >= 0 else self._fallback(currency, day.toordinal())
+
+    def rates(self, currencies: Sequence[str], days: Sequence[date], as_decimal: bool = False):
+        """Vectorized ``rate`` over parallel sequences: a float64 array, or a list of Decimals."""
+        currencies = np.asarray(currencies, dtype=object)
+        ordinals = np.fromiter((d.toordinal() for d in days), dtype=np.int64, count=len(currencies))
+        out = np.ones(len(currencies)) if not as_decimal else np.full(len(currencies), Decimal(1), dtype=object)
+
+        for currency in set(currencies.tolist()) - {settings.reporting_currency}:
+            mask = currencies == currency
+            wanted = ordinals[mask]
+            if currency in self._days:
+                idx = np.searchsorted(self._days[currency], wanted, side="right") - 1
+            else:
+                idx = np.full(len(wanted), -1)
+            table = self._decimals.get(currency, []) if as_decimal else self._floats.get(currency)
+            values = [table[i] if i >= 0 else None for i in idx.tolist()]
+            if any(v is None for v in values):
+                fallback = self._fallback(currency, wanted[idx < 0][0])
+                values = [fallback if v is None else v for v in values]
+            out[mask] = values if as_decimal else np.array(values, dtype=np.float64)
+        return out.tolist() if as_decimal else out
+
+    def for_markets(self, markets: Sequence[str], days: Sequence[date], as_decimal: bool = False):
+        return self.rates([currency_for_market(m) for m in markets], days, as_decimal=as_decimal)
+
+
+# ========== Cache ==========
+
+_lock = threading.Lock()
+_cache = None
+_loaded_at = 0.0
+
+
+def load(db) -> FxRates:
+    rate = models.FxRate
+    rows = db.execute(
+        select(rate.base_currency, rate.rate_date, rate.rate)
+        .where(rate.quote_currency == settings.reporting_currency)
+    ).all()
+    return FxRates(rows)
+
+
+def get_rates(db) -> FxRates:
+    """The cached rates, reloaded from ``db`` when missing or older than ``CACHE_TTL``."""
+    global _cache, _loaded_at
+    with _lock:
+        if _cache is not None and time.monotonic() - _loaded_at < CACHE_TTL:
+            return _cache
+    rates = load(db)
+    with _lock:
+        _cache, _loaded_at = rates, time.monotonic()
+    return rates
+
+
+def invalidate():
+    global _cache
+    with _lock:
+        _cache = None
+
+
+def rate_for(db, market: str, day: date) -> Decimal:
+    return get_rates(db).rate(currency_for_market(market), day)
+
+
+# ========== Ingest ==========
+
+def parse_csv(text: str) -> list:
+    """Rows of ``base,quote,date,rate`` (header required) as ``fx_rates`` dicts."""
+    rows = []
+    for line_number, record in enumerate(csv.DictReader(io.StringIO(text)), start=2):
+        try:
+            rows.append({
+                "base_currency": record["base"].strip().upper(),
+                "quote_currency": record["quote"].strip().upper(),
+                "rate_date": date.fromisoformat(record["date"].strip()),
+                "rate": Decimal(record["rate"].strip()),
+            })
+        except (KeyError, AttributeError, ValueError, InvalidOperation) as e:
+            raise ValueError(f"Line {line_number}: invalid FX row {record!r} ({e})") from e
+    return rows
+
+
+def ingest(db, rows: list) -> int:
+    """Insert rates, replacing each pair's existing rates over the dates it covers."""
+    rate = models.FxRate
+    pairs = {}
+    for row in rows:
+        pairs.setdefault((row["base_currency"], row["quote_currency"]), []).append(row["rate_date"])
+    try:
+        for (base, quote), days in pairs.items():
+            db.execute(delete(rate).where(
+                rate.base_currency == base, rate.quote_currency == quote,
+                rate.rate_date >= min(days), rate.rate_date <= max(days),
+            ))
+        if rows:
+            db.execute(insert(rate), rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    invalidate()
+    return len(rows)
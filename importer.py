@@ -0,0 +1,185 @@
+import csv
+import json
+from collections import deque
+from typing import AsyncIterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+
+import crud, schemas
+
+ENTRY_FIELDS = tuple(schemas.TradeEntryCreate.model_fields)
+EXIT_FIELDS = tuple(schemas.TradeExitBase.model_fields)
+
+
+# ========== Parsing ==========
+
+async def iter_lines(stream: AsyncIterator[bytes]):
+    """Split a streamed request body into decoded lines (ending included, like a
+    file) without buffering it whole."""
+    pending = b""
+    async for chunk in stream:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line.decode("utf-8-sig") + "\n"
+    if pending:
+        yield pending.decode("utf-8-sig")
+
+
+class _Lines:
+    """Lines handed to ``csv.reader`` as the stream delivers them."""
+
+    def __init__(self):
+        self.pending = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.pending:
+            raise StopIteration
+        return self.pending.popleft()
+
+
+def _read_buffered(reader, lines: _Lines):
+    while lines.pending:
+        line_number = reader.line_num + 1
+        try:
+            yield line_number, next(reader)
+        except csv.Error as e:
+            yield line_number, f"Invalid CSV: {e}"
+
+
+async def iter_csv_rows(stream: AsyncIterator[bytes]):
+    """Yield ``(line_number, values)`` per CSV record, numbered by its first line
+    (``values`` is an error message when the record could not be parsed).
+
+    One ``csv.reader`` reads the whole body, so quoted fields may contain
+    newlines. It is only advanced once the buffered lines close every quote,
+    so it never runs out of input mid-record.
+    """
+    lines = _Lines()
+    reader = csv.reader(lines)
+    in_quotes = False
+    async for line in iter_lines(stream):
+        lines.pending.append(line)
+        in_quotes ^= line.count('"') % 2 == 1
+        if not in_quotes:
+            for row in _read_buffered(reader, lines):
+                yield row
+    for row in _read_buffered(reader, lines):  # an unterminated quoted field runs to the end
+        yield row
+
+
+async def iter_records(stream: AsyncIterator[bytes], fmt: str):
+    """Yield ``(line_number, record)`` pairs from a CSV or NDJSON body.
+
+    ``record`` is a dict of column -> value (empty cells become ``None``), or
+    an error message when the line itself could not be parsed.
+    """
+    if fmt == "ndjson":
+        line_number = 0
+        async for line in iter_lines(stream):
+            line_number += 1
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, f"Invalid JSON: {e.msg}"
+                continue
+            if not isinstance(record, dict):
+                yield line_number, "Each line must be a JSON object"
+                continue
+            yield line_number, record
+        return
+
+    header = None
+    async for line_number, values in iter_csv_rows(stream):
+        if isinstance(values, str):
+            yield line_number, values
+            continue
+        if len(values) <= 1 and not any(v.strip() for v in values):
+            continue  # blank line
+        if header is None:
+            header = [h.strip() for h in values]
+            continue
+        if len(values) > len(header):
+            yield line_number, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        yield line_number, {k: (v.strip() or None) for k, v in zip(header, values)}
+
+
+async def iter_chunks(records, chunk_size: int):
+    chunk = []
+    async for item in records:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ========== Validation ==========
+
+def _format_validation_error(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()
+    )
+
+
+def validate_record(record: dict) -> Tuple[schemas.TradeEntryCreate, Optional[schemas.TradeExitBase]]:
+    """Validate one import row into an entry and an optional (full or partial) exit."""
+    entry = schemas.TradeEntryCreate.model_validate(
+        {k: record[k] for k in ENTRY_FIELDS if record.get(k) is not None}
+    )
+
+    exit_values = {k: record[k] for k in EXIT_FIELDS if record.get(k) is not None}
+    if not exit_values:
+        return entry, None
+
+    # An exit without a quantity closes the whole position
+    exit_values.setdefault("exit_qty", entry.qty)
+    exit = schemas.TradeExitBase.model_validate(exit_values)
+
+    if exit.exit_qty <= 0:
+        raise ValueError("Exit quantity must be positive")
+    if exit.exit_qty > entry.qty:
+        raise ValueError("Exit quantity exceeds remaining position")
+    if exit.exit_date < entry.entry_date:
+        raise ValueError("Exit date cannot be before entry date")
+    return entry, exit
+
+
+# ========== Import ==========
+
+def import_chunk(db: Session, chunk: List[tuple]) -> schemas.BulkImportResult:
+    """Validate a chunk of parsed rows and insert the valid ones in one transaction."""
+    result = schemas.BulkImportResult()
+    valid_rows, valid_lines = [], []
+
+    for line_number, record in chunk:
+        if isinstance(record, str):
+            result.errors.append(schemas.ImportRowError(row=line_number, detail=record))
+            continue
+        try:
+            valid_rows.append(validate_record(record))
+            valid_lines.append(line_number)
+        except ValidationError as e:
+            result.errors.append(schemas.ImportRowError(row=line_number, detail=_format_validation_error(e)))
+        except ValueError as e:
+            result.errors.append(schemas.ImportRowError(row=line_number, detail=str(e)))
+
+    if valid_rows:
+        try:
+            result.entries_created, result.exits_created = crud.bulk_create_entries(db, valid_rows)
+        except Exception as e:
+            reason = getattr(e, "orig", None) or e  # prefer the driver message over the SQL dump
+            result.errors.extend(
+                schemas.ImportRowError(row=line_number, detail=f"Chunk rolled back: {reason}")
+                for line_number in valid_lines
+            )
+
+    return result
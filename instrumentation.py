@@ -0,0 +1,178 @@
+"""Connection pool and SQL statement metrics.
+
+``instrument_engine`` attaches SQLAlchemy ``pool``/``engine`` event listeners that
+count checkouts, overflow checkouts and the connections currently checked out,
+and time every statement. Checkout wait time has no event hook (the pool only
+fires ``checkout`` once a connection has been obtained), so engines built by
+``database.py`` use the ``Instrumented*QueuePool`` classes below, which time
+``_do_get``. ``snapshot()`` returns everything as plain JSON-able data.
+"""
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+STATEMENT_KEY_LENGTH = 200  # statements are grouped by their first characters
+MAX_STATEMENTS = 500  # distinct statements tracked per engine; further ones are folded into "<other>"
+
+
+class PoolStats:
+    def __init__(self):
+        self.checkouts = 0
+        self.overflow_checkouts = 0  # checkouts that needed a connection beyond pool_size
+        self.timeouts = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.connects = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+
+class StatementStats:
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+
+class SqlUsage:
+    """SQL statements and time accumulated by one unit of work (e.g. an HTTP request)."""
+
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+
+
+# Set per request by metrics.MetricsMiddleware; context copies share the same object
+current_sql_usage: ContextVar = ContextVar("current_sql_usage", default=None)
+
+
+_lock = threading.Lock()
+_pools = defaultdict(PoolStats)
+_statements = defaultdict(lambda: defaultdict(StatementStats))
+_engines = {}
+
+
+# ========== Pool classes ==========
+
+class _TimedGetMixin:
+    """Times how long each checkout waits for a connection from the pool."""
+    stats_name = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except sa_exc.TimeoutError:
+            with _lock:
+                _pools[self.stats_name].timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with _lock:
+                stats = _pools[self.stats_name]
+                stats.wait_seconds_total += waited
+                stats.wait_seconds_max = max(stats.wait_seconds_max, waited)
+
+
+class InstrumentedQueuePool(_TimedGetMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncAdaptedQueuePool(_TimedGetMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+# ========== Event listeners ==========
+
+def instrument_engine(engine, name: str):
+    """Record pool and statement metrics for ``engine`` (a sync ``Engine``;
+    pass ``async_engine.sync_engine`` for an ``AsyncEngine``) under ``name``."""
+    pool = engine.pool
+    if isinstance(pool, _TimedGetMixin):
+        pool.stats_name = name
+    _engines[name] = engine
+
+    @event.listens_for(pool, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        with _lock:
+            _pools[name].connects += 1
+
+    @event.listens_for(pool, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        with _lock:
+            stats = _pools[name]
+            stats.checkouts += 1
+            stats.checked_out += 1
+            stats.peak_checked_out = max(stats.peak_checked_out, stats.checked_out)
+            size = getattr(pool, "size", None)
+            if size is not None and stats.checked_out > size():
+                stats.overflow_checkouts += 1
+
+    @event.listens_for(pool, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        with _lock:
+            stats = _pools[name]
+            stats.checked_out = max(stats.checked_out - 1, 0)
+
+    # The start time lives on the statement's execution context, so a statement
+    # that raises (no after_cursor_execute) leaves nothing behind on the connection
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._query_start
+        record_statement(name, statement, elapsed)
+
+
+def record_statement(name: str, statement: str, elapsed: float):
+    usage = current_sql_usage.get()
+    if usage is not None:
+        usage.statements += 1
+        usage.seconds += elapsed
+    key = " ".join(statement.split())[:STATEMENT_KEY_LENGTH]
+    with _lock:
+        statements = _statements[name]
+        if key not in statements and len(statements) >= MAX_STATEMENTS:
+            key = "<other>"
+        stats = statements[key]
+        stats.count += 1
+        stats.total_seconds += elapsed
+        stats.max_seconds = max(stats.max_seconds, elapsed)
+
+
+# ========== Reporting ==========
+
+def snapshot(top: int = 20) -> dict:
+    """Pool metrics per engine and the ``top`` statements by total time."""
+    with _lock:
+        pools = {}
+        for name, stats in _pools.items():
+            pool = _engines[name].pool if name in _engines else None
+            pools[name] = {
+                **vars(stats),
+                "wait_seconds_avg": stats.wait_seconds_total / stats.checkouts if stats.checkouts else 0.0,
+                "pool_size": pool.size() if hasattr(pool, "size") else None,
+                "status": pool.status() if pool is not None else None,
+            }
+        statements = {
+            name: [
+                {"statement": key, "count": s.count, "total_seconds": s.total_seconds,
+                 "avg_seconds": s.total_seconds / s.count, "max_seconds": s.max_seconds}
+                for key, s in sorted(by_key.items(), key=lambda item: item[1].total_seconds, reverse=True)[:top]
+            ]
+            for name, by_key in _statements.items()
+        }
+    return {"pools": pools, "statements": statements}
+
+
+def reset():
+    with _lock:
+        _pools.clear()
+        _statements.clear()
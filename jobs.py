@@ -0,0 +1,197 @@
+"""Heavy analytics run as jobs in a process pool, memoized per journal version.
+
+``POST /jobs`` validates the kind's parameters and looks the result up by
+``(kind, journal version, parameters)``. A hit is answered inline (the
+synchronous fast path); otherwise the job is submitted to a
+``ProcessPoolExecutor`` and polled with ``GET /jobs/{id}``. Requests for the same
+key while one is running share its job instead of queueing another.
+
+Workers run the same ``crud`` function as the analytics route against their own
+engine (one per database URL and process) and read the journal version in the
+same session, so the result is stored under the version it actually reflects.
+Any write moves the journal version on, so stale results are never served;
+they simply fall out of the bounded LRU memo.
+
+The pool is created on first use (``JOB_WORKERS`` processes, default one per
+CPU) with the ``spawn`` start method: forking a process with a running event
+loop and open connections is not safe. ``shutdown`` is called by the API's
+lifespan.
+"""
+import multiprocessing
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+
+from pydantic_core import to_jsonable_python
+
+import crud, schemas
+from database import to_sync_url
+from settings import settings
+
+MEMO_SIZE = 256  # results kept across all kinds, versions and parameters
+MAX_JOBS = 1000  # finished jobs kept for GET /jobs/{id}, oldest dropped first
+
+# kind -> (parameter model, crud function, fixed keyword arguments)
+JOB_KINDS = {
+    "monthly_summary": (schemas.MonthlySummaryParams, crud.get_monthly_summary, {}),
+    "equity_curve": (schemas.EquityCurveParams, crud.get_equity_curve, {}),
+    "by_symbol": (schemas.BreakdownParams, crud.get_performance_breakdown, {"by": "symbol"}),
+    "by_market": (schemas.BreakdownParams, crud.get_performance_breakdown, {"by": "market"}),
+}
+
+
+def validate_params(kind: str, params: dict) -> dict:
+    """The kind's parameters with defaults filled in (raises ``pydantic.ValidationError``)."""
+    model = JOB_KINDS[kind][0]
+    return model.model_validate(params).model_dump()
+
+
+def database_url(db) -> str:
+    """Sync URL of the session's database, for the worker processes to connect to."""
+    return to_sync_url(db.get_bind().url).render_as_string(hide_password=False)
+
+
+# ========== Worker ==========
+
+_engines = {}  # per worker process: database URL -> Engine
+
+
+def _run(url: str, kind: str, params: dict) -> Tuple[int, object]:
+    """Runs in a worker: ``(journal version, JSON-ready result)``."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    if url not in _engines:
+        _engines[url] = create_engine(url, pool_pre_ping=settings.pool_pre_ping)
+    _, fn, fixed = JOB_KINDS[kind]
+    with Session(_engines[url]) as db, db.begin():
+        version, _ = crud.get_journal_version(db)
+        result = fn(db, **fixed, **params)
+    return version, to_jsonable_python(result)
+
+
+# ========== Registry ==========
+
+def _key(kind: str, version: int, params: dict):
+    return kind, version, tuple(sorted(params.items()))
+
+
+class Job:
+    __slots__ = ("id", "kind", "params", "journal_version", "cached", "future", "result", "error")
+
+    def __init__(self, kind: str, params: dict, journal_version: int, cached: bool = False, result=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.journal_version = journal_version
+        self.cached = cached
+        self.future = None
+        self.result = result
+        self.error = None
+
+    @property
+    def status(self) -> str:
+        if self.cached or self.result is not None:
+            return "done"
+        if self.error is not None:
+            return "failed"
+        return "running" if self.future is not None and self.future.running() else "pending"
+
+    def to_schema(self) -> schemas.JobStatus:
+        return schemas.JobStatus(id=self.id, kind=self.kind, params=self.params, status=self.status,
+                                 journal_version=self.journal_version, cached=self.cached,
+                                 result=self.result, error=self.error)
+
+
+_lock = threading.Lock()
+_executor: Optional[ProcessPoolExecutor] = None
+_memo: "OrderedDict[tuple, object]" = OrderedDict()
+_running: Dict[tuple, Job] = {}  # submission key -> job in flight
+_jobs: "OrderedDict[str, Job]" = OrderedDict()
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.job_workers or os.cpu_count(),
+                                        mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def executor() -> ProcessPoolExecutor:
+    """The worker pool, for work that fans out over processes itself (``simulation``)."""
+    with _lock:
+        return _pool()
+
+
+def _register(job: Job):
+    _jobs[job.id] = job
+    while len(_jobs) > MAX_JOBS:
+        _jobs.popitem(last=False)
+
+
+def _remember(key, result):
+    _memo[key] = result
+    _memo.move_to_end(key)
+    while len(_memo) > MEMO_SIZE:
+        _memo.popitem(last=False)
+
+
+def _finish(job: Job, key, future):
+    try:
+        version, result = future.result()
+    except Exception as e:  # reported on the job; the worker's traceback is not kept
+        error, version, result = f"{type(e).__name__}: {e}", None, None
+    with _lock:
+        _running.pop(key, None)
+        if result is None:
+            job.error = error
+            return
+        job.journal_version, job.result = version, result
+        _remember(_key(job.kind, version, job.params), result)
+
+
+def submit(kind: str, params: dict, journal_version: int, url: str) -> Job:
+    """The memoized result for ``journal_version`` as a finished job, the job
+    already running for the same key, or a new job on the pool."""
+    key = _key(kind, journal_version, params)
+    with _lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            job = Job(kind, params, journal_version, cached=True, result=_memo[key])
+            _register(job)
+            return job
+        if key in _running:
+            return _running[key]
+        job = Job(kind, params, journal_version)
+        try:
+            job.future = _pool().submit(_run, url, kind, params)
+        except BrokenProcessPool:  # a worker died (e.g. OOM-killed): start a fresh pool
+            _shutdown_locked()
+            job.future = _pool().submit(_run, url, kind, params)
+        _running[key] = job
+        _register(job)
+    job.future.add_done_callback(lambda future: _finish(job, key, future))
+    return job
+
+
+def get(job_id: str) -> Optional[Job]:
+    with _lock:
+        return _jobs.get(job_id)
+
+
+def _shutdown_locked():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def shutdown():
+    """Stop the worker processes; queued jobs are cancelled."""
+    with _lock:
+        _shutdown_locked()
@@ -1,65 +1,355 @@
-from fastapi import FastAPI, Depends, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import BackgroundTasks, Body, FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from datetime import datetime, timezone
+from pydantic import ValidationError, confloat
+from email.utils import format_datetime, parsedate_to_datetime
 from sqlalchemy.orm import Session
-from typing import List
-import schemas, crud
-from database import SessionLocal, engine, Base
-from utils import compute_derived_fields
+from typing import List, Literal, Optional
+import models, schemas, crud, crud_async, database, exporter, importer, instrumentation, jobs, metrics, simulation
+from responses import rows_response
+from database import DB_ASYNC, AsyncSessionLocal, SessionLocal
+from settings import settings
+from derived import derived_rows
 
-# Create DB tables
-Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Trading Journal API")
+# Engines are created per worker at startup; the schema is managed by `python manage.py migrate`
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    database.init_engines()
+    yield
+    jobs.shutdown()
+    await database.dispose_engines()
 
-# Dependency: Get DB session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+
+app = FastAPI(title="Trading Journal API", lifespan=lifespan)
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Dependency: Get DB session (an AsyncSession when DB_ASYNC is set)
+if DB_ASYNC:
+    async def get_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+else:
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+
+# Dependency: conditional GET keyed on the journal write version
+async def journal_validators(request: Request, response: Response, db: Session = Depends(get_db)):
+    """Emit ETag/Last-Modified for a read route and short-circuit with 304 Not
+    Modified when the client's copy is current, before any entry is queried.
+
+    ``updated_at`` has whole-second resolution, so Last-Modified is only sent
+    (and If-Modified-Since only honored) once the last write's second is over:
+    a later write in that same second would otherwise leave it unchanged.
+    """
+    version, updated_at = await crud_async.get_journal_version(db)
+    headers = {"ETag": f'W/"{version}"', "Cache-Control": "no-cache"}
+    if updated_at is not None and updated_at < models.utcnow():
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(updated_at, usegmt=True)
+    else:
+        updated_at = None
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip() for tag in if_none_match.split(",")}
+        not_modified = "*" in tags or headers["ETag"] in tags or headers["ETag"][2:] in tags
+    else:
+        not_modified = False
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since and updated_at is not None:
+            try:
+                not_modified = updated_at <= parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                pass
+
+    if not_modified:
+        raise HTTPException(status_code=304, headers=headers)
+    response.headers.update(headers)
+
+
+# Dependency: bring the analytics snapshot up to date once a write's response is sent
+def refresh_snapshot_after_write(background_tasks: BackgroundTasks):
+    if settings.snapshot_dir:
+        import snapshot  # pandas/pyarrow; only loaded when a snapshot is configured
+
+        background_tasks.add_task(snapshot.request_refresh, SessionLocal, settings.snapshot_dir)
 
 
 # ========== Root ==========
 @app.get("/")
-def root():
+async def root():
     return {"message": "Welcome to the Trading Journal API"}
 
 
 # ========== Entry Routes ==========
 
-@app.post("/entries", response_model=schemas.TradeEntryResponse)
-def create_trade_entry(entry: schemas.TradeEntryCreate, db: Session = Depends(get_db)):
-    return crud.create_entry(db, entry)
+def entries_response(response: Response, entries, include_exits: bool = True, single: bool = False):
+    """Derived rows of ``entries`` encoded as JSON; CPU-bound, so routes run it on the threadpool."""
+    rows = derived_rows(entries, include_exits)
+    return rows_response(rows[0] if single else rows, response)
+
+@app.post("/entries", response_model=schemas.TradeEntryResponse,
+          dependencies=[Depends(refresh_snapshot_after_write)])
+async def create_trade_entry(entry: schemas.TradeEntryCreate, db: Session = Depends(get_db)):
+    return await crud_async.create_entry(db, entry)
+
+@app.post("/entries/bulk", response_model=schemas.BulkImportResult,
+          dependencies=[Depends(refresh_snapshot_after_write)])
+async def bulk_import_entries(
+    request: Request,
+    format: Optional[Literal["csv", "ndjson"]] = None,
+    chunk_size: int = Query(1000, ge=1, le=10000),
+    db: Session = Depends(get_db),
+):
+    """Import a CSV or NDJSON body of entries (with optional exits) in chunked transactions.
+
+    Columns/keys follow ``TradeEntryCreate`` plus optional ``exit_date``, ``exit_price``
+    and ``exit_qty``. Invalid rows are reported by line number and skipped.
+    """
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "ndjson" if "json" in content_type else "csv"
+
+    result = schemas.BulkImportResult()
+    records = importer.iter_records(request.stream(), format)
+    async for chunk in importer.iter_chunks(records, chunk_size):
+        chunk_result = await crud_async.import_chunk(db, chunk)
+        result.entries_created += chunk_result.entries_created
+        result.exits_created += chunk_result.exits_created
+        result.errors.extend(chunk_result.errors)
+    return result
 
-@app.get("/entries", response_model=List[schemas.TradeEntryResponse])
-def get_all_entries(db: Session = Depends(get_db)):
-    entries = crud.get_entries(db)
-    return [compute_derived_fields(e) for e in entries]
+@app.get("/entries", response_model=List[schemas.TradeEntryResponse],
+         dependencies=[Depends(journal_validators)])
+async def get_all_entries(
+    response: Response,
+    filters: schemas.EntryFilter = Depends(),
+    cursor: Optional[str] = None,
+    page_size: int = Query(100, ge=1, le=1000),
+    include_exits: bool = True,
+    sort_by: schemas.EntrySort = "entry_date",
+    order: Literal["asc", "desc"] = "desc",
+    db: Session = Depends(get_db),
+):
+    """Entries matching the filters, newest first unless ``sort_by``/``order`` say
+    otherwise. When more rows exist, the ``X-Next-Cursor`` response header holds
+    the ``cursor`` for the next page (valid for the same sort)."""
+    try:
+        after = crud.decode_cursor(cursor, sort_by) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    entries = await crud_async.get_entries(db, filters, after=after, limit=page_size + 1,
+                                            load_exits="selectin" if include_exits else "none",
+                                            sort_by=sort_by, descending=order == "desc")
+    if len(entries) > page_size:
+        entries = entries[:page_size]
+        response.headers["X-Next-Cursor"] = crud.encode_cursor(entries[-1], sort_by)
+    return await run_in_threadpool(entries_response, response, entries, include_exits)
 
-@app.get("/entries/closed", response_model=List[schemas.TradeEntryResponse])
-def get_closed_entries(db: Session = Depends(get_db)):
-    entries = crud.get_closed_entries(db)
-    return [compute_derived_fields(e) for e in entries]
+@app.get("/entries/closed", response_model=List[schemas.TradeEntryResponse],
+         dependencies=[Depends(journal_validators)])
+async def get_closed_entries(response: Response, include_exits: bool = True, db: Session = Depends(get_db)):
+    entries = await crud_async.get_closed_entries(db, load_exits="selectin" if include_exits else "none")
+    return await run_in_threadpool(entries_response, response, entries, include_exits)
 
-@app.get("/entries/{entry_id}", response_model=schemas.TradeEntryResponse)
-def get_single_entry(entry_id: int, db: Session = Depends(get_db)):
-    entry = crud.get_entry(db, entry_id)
+@app.get("/entries/{entry_id}", response_model=schemas.TradeEntryResponse,
+         dependencies=[Depends(journal_validators)])
+async def get_single_entry(entry_id: int, response: Response, db: Session = Depends(get_db)):
+    entry = await crud_async.get_entry_with_exits(db, entry_id, load_exits="joined")
     if not entry:
         raise HTTPException(status_code=404, detail="Entry not found")
-    return compute_derived_fields(entry)
+    return await run_in_threadpool(entries_response, response, [entry], single=True)
+
+# ========== Export Route ==========
+
+@app.get("/export")
+async def export_journal(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    filters: schemas.EntryFilter = Depends(),
+    since: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+):
+    """Stream every matching entry with its exits and derived fields, oldest change first.
+
+    ``since`` (UTC) keeps entries written at or after it. Pass the
+    ``X-Export-Watermark`` header of the previous export to sync incrementally:
+    it lags the export's start by ``models.COMMIT_LAG``, because ``updated_at``
+    is stamped before a write commits. Every write whose transaction commits
+    within that lag is in the next sync; entries changed in the lag window are
+    sent again, so apply the export as an upsert by ``id``.
+    """
+    if since is not None and since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    watermark = models.utcnow() - models.COMMIT_LAG
+
+    async def body():
+        if format == "csv":
+            yield exporter.csv_header()
+        async for batch in crud_async.iter_export_batches(db, filters, since):
+            yield await run_in_threadpool(exporter.format_batch, batch, format)
+
+    return StreamingResponse(body(), media_type=exporter.MEDIA_TYPES[format], headers={
+        "X-Export-Watermark": watermark.isoformat() + "Z",
+        "Content-Disposition": f'attachment; filename="journal.{format}"',
+    })
 
 # ========== Exit Routes ==========
 
-@app.post("/exits", response_model=schemas.TradeExitResponse)
-def create_exit(exit: schemas.TradeExitCreate, db: Session = Depends(get_db)):
+@app.post("/exits", response_model=schemas.TradeExitResponse,
+          dependencies=[Depends(refresh_snapshot_after_write)])
+async def create_exit(exit: schemas.TradeExitCreate, db: Session = Depends(get_db)):
     try:
-        return crud.create_exit(db, exit)
+        return await crud_async.create_exit(db, exit)
+    except crud.ExitConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/exits/batch", response_model=schemas.ExitBatchResult,
+          dependencies=[Depends(refresh_snapshot_after_write)])
+async def create_exits_batch(exits: List[schemas.TradeExitCreate] = Body(..., max_length=1000),
+                             db: Session = Depends(get_db)):
+    """Apply many exits, across any entries, in one transaction; invalid items are
+    reported in ``results`` and skipped without affecting the rest."""
+    return await crud_async.create_exits_batch(db, exits)
+
 @app.get("/exits/{exit_id}", response_model=schemas.TradeExitResponse)
-def get_exit_by_id(exit_id: int, db: Session = Depends(get_db)):
-    exit = crud.get_exit(db, exit_id)
+async def get_exit_by_id(exit_id: int, db: Session = Depends(get_db)):
+    exit = await crud_async.get_exit(db, exit_id)
     if not exit:
         raise HTTPException(status_code=404, detail="Exit not found")
     return exit
+
+# ========== Summary Routes ==========
+
+@app.get("/summary/monthly", response_model=List[schemas.MonthlySummary],
+         dependencies=[Depends(journal_validators)])
+async def get_monthly_summary(year: Optional[int] = None, market: Optional[str] = None, db: Session = Depends(get_db)):
+    return await crud_async.get_monthly_summary(db, year=year, market=market)
+
+# ========== Analytics Routes ==========
+
+@app.get("/analytics/equity-curve", response_model=schemas.EquityCurve,
+         dependencies=[Depends(journal_validators)])
+async def get_equity_curve(granularity: Literal["day", "week"] = "day", market: Optional[str] = None,
+                           db: Session = Depends(get_db)):
+    """Cumulative realized PnL with running peak and drawdown, per exit day or week."""
+    return await crud_async.get_equity_curve(db, granularity=granularity, market=market)
+
+@app.get("/analytics/by-symbol", response_model=List[schemas.PerformanceBreakdown],
+         dependencies=[Depends(journal_validators)])
+async def get_performance_by_symbol(
+    market: Optional[str] = None,
+    sort_by: schemas.BreakdownSort = "total_pnl",
+    order: Literal["asc", "desc"] = "desc",
+    limit: int = Query(20, ge=1, le=1000),
+    min_trades: int = Query(1, ge=1),
+    db: Session = Depends(get_db),
+):
+    """Closed-trade performance per stock: the top ``limit`` by ``sort_by`` among
+    stocks with at least ``min_trades`` closed trades."""
+    return await crud_async.get_performance_breakdown(db, by="symbol", market=market, sort_by=sort_by,
+                                                      descending=order == "desc", limit=limit, min_trades=min_trades)
+
+@app.get("/analytics/by-market", response_model=List[schemas.PerformanceBreakdown],
+         dependencies=[Depends(journal_validators)])
+async def get_performance_by_market(
+    sort_by: schemas.BreakdownSort = "total_pnl",
+    order: Literal["asc", "desc"] = "desc",
+    limit: int = Query(20, ge=1, le=1000),
+    min_trades: int = Query(1, ge=1),
+    db: Session = Depends(get_db),
+):
+    """Closed-trade performance per market, ranked like ``/analytics/by-symbol``."""
+    return await crud_async.get_performance_breakdown(db, by="market", sort_by=sort_by,
+                                                      descending=order == "desc", limit=limit, min_trades=min_trades)
+
+@app.get("/analytics/simulation", response_model=schemas.SimulationResult)
+async def simulate_outcomes(
+    basis: Literal["r_multiple", "return"] = "r_multiple",
+    market: Optional[str] = None,
+    position: Optional[Literal["Long", "Short"]] = None,
+    fractions: List[confloat(gt=0, le=1)] = Query([0.005, 0.01, 0.02], min_length=1, max_length=10),
+    paths: int = Query(10_000, ge=1, le=1_000_000),
+    trades: Optional[int] = Query(None, ge=1, le=100_000),
+    seed: Optional[int] = Query(None, ge=0),
+    ruin_level: float = Query(0.5, gt=0, le=1),
+    starting_capital: float = Query(100_000, gt=0),
+    db: Session = Depends(get_db),
+):
+    """Bootstrap closed trades' R-multiples (or returns on capital) into ``paths`` equity paths of
+    ``trades`` trades, compounded at each sizing fraction: distributions of final PnL and max
+    drawdown, and the risk of losing ``ruin_level`` of the starting capital."""
+    returns = await crud_async.get_trade_returns(db, basis=basis, market=market, position=position)
+    if not returns:
+        raise HTTPException(status_code=404, detail="No closed trades to resample")
+    trades = trades or len(returns)
+    if paths * trades * len(fractions) > simulation.MAX_ELEMENTS:
+        raise HTTPException(status_code=422, detail=f"paths x trades x fractions is limited to "
+                                                    f"{simulation.MAX_ELEMENTS:,}; lower paths or trades")
+    executor = jobs.executor() if paths * trades >= simulation.PARALLEL_MIN_ELEMENTS else None
+    result = await run_in_threadpool(
+        simulation.simulate, returns, fractions, paths=paths, trades=trades, seed=seed, ruin_level=ruin_level,
+        starting_capital=starting_capital, executor=executor, workers=settings.job_workers or None)
+    return {**result, "basis": basis, "market": market, "position": position}
+
+# ========== Job Routes ==========
+
+@app.post("/jobs", response_model=schemas.JobStatus, status_code=202,
+          responses={200: {"model": schemas.JobStatus, "description": "Result already computed for this journal version"}})
+async def submit_job(job: schemas.JobCreate, response: Response, db: Session = Depends(get_db)):
+    """Run an analytics query in the job process pool; poll ``GET /jobs/{id}`` for the result.
+
+    ``params`` are the query parameters of the matching route (``by_symbol`` /
+    ``by_market`` take ``descending`` instead of ``order``). When the result for
+    the current journal version is memoized it is returned at once with 200.
+    """
+    try:
+        params = jobs.validate_params(job.kind, job.params)
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, "loc": ("body", "params", *error["loc"])} for error in e.errors()])
+    version, _ = await crud_async.get_journal_version(db)
+    url = await crud_async.run(db, jobs.database_url)
+    submitted = jobs.submit(job.kind, params, version, url)
+    if submitted.status == "done":
+        response.status_code = 200
+    return submitted.to_schema()
+
+@app.get("/jobs/{job_id}", response_model=schemas.JobStatus)
+async def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_schema()
+
+# ========== Position Routes ==========
+
+@app.get("/positions/mtm", response_model=schemas.MarkToMarket)
+async def get_positions_mtm(market: Optional[str] = None, ids: Optional[List[int]] = Query(None, max_length=1000),
+                            db: Session = Depends(get_db)):
+    """Open positions (only entries in ``ids`` when given) marked to their latest close:
+    unrealized PnL, PnL % and distance to stop/target."""
+    return await crud_async.get_positions_mtm(db, market=market, ids=ids)
+
+# ========== Diagnostics ==========
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Request, SQL, span and pool metrics in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/stats/db")
+async def get_db_stats(top: int = Query(20, ge=1, le=500)):
+    """Connection pool metrics per engine and the slowest SQL statements by total time."""
+    return instrumentation.snapshot(top=top)
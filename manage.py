@@ -0,0 +1,127 @@
+"""Maintenance commands for the trading journal database.
+
+Usage:
+    python manage.py migrate [--sql]
+    python manage.py rebuild-aggregates
+    python manage.py refresh-snapshot [--dir DIR] [--rebuild]
+    python manage.py ingest-fx FILE [--reprice]
+    python manage.py ingest-prices FILE [FILE ...]
+"""
+import argparse
+
+import crud, database, fx, prices
+from database import SessionLocal
+from settings import settings
+
+
+def migrate(args):
+    import migrations
+
+    if args.sql:
+        for statement in migrations.plan(database.engine):
+            print(f"{statement};")
+        return
+    statements = migrations.upgrade(database.engine)
+    for statement in statements:
+        print(statement)
+    print(f"Schema up to date ({len(statements)} statements applied)")
+
+
+def rebuild_aggregates(args):
+    db = SessionLocal()
+    try:
+        count = crud.rebuild_position_aggregates(db)
+    finally:
+        db.close()
+    print(f"Rebuilt position aggregates for {count} entries")
+
+
+def refresh_snapshot(args):
+    import snapshot
+
+    directory = args.dir or settings.snapshot_dir
+    if not directory:
+        raise SystemExit("Set SNAPSHOT_DIR or pass --dir")
+    db = SessionLocal()
+    try:
+        manifest = snapshot.refresh(db, directory, rebuild=args.rebuild)
+    finally:
+        db.close()
+    print(f"Snapshot at {directory}: exits up to id {manifest['exit_id']}, "
+          f"{len(manifest['segments']['exits'])} exit / {len(manifest['segments']['entries'])} entry segments")
+
+
+def ingest_fx(args):
+    with open(args.file, newline="") as f:
+        try:
+            rows = fx.parse_csv(f.read())
+        except ValueError as e:
+            raise SystemExit(str(e))
+    db = SessionLocal()
+    try:
+        count = fx.ingest(db, rows)
+        print(f"Ingested {count} FX rates")
+        if args.reprice:
+            print(f"Repriced {crud.reprice_exits(db)} exits")
+            if settings.snapshot_dir:
+                import snapshot
+
+                # Snapshot exit segments are append-only: rewrite them with the new per-exit PnL
+                snapshot.refresh(db, settings.snapshot_dir, rebuild=True)
+                print(f"Rebuilt the snapshot at {settings.snapshot_dir}")
+    finally:
+        db.close()
+
+
+def ingest_prices(args):
+    db = SessionLocal()
+    try:
+        for path in args.files:
+            with open(path, newline="") as f:
+                try:
+                    count = prices.ingest(db, prices.parse_csv(f))
+                except ValueError as e:
+                    raise SystemExit(f"{path}: {e}")
+            print(f"{path}: ingested {count} prices")
+    finally:
+        db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Trading journal maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    upgrade = commands.add_parser(
+        "migrate", help="Create missing tables, columns and indexes (also bootstraps an empty database)")
+    upgrade.add_argument("--sql", action="store_true", help="print the statements instead of running them")
+    upgrade.set_defaults(func=migrate)
+
+    rebuild = commands.add_parser(
+        "rebuild-aggregates", help="Recompute per-entry exit aggregates from trade_exits")
+    rebuild.set_defaults(func=rebuild_aggregates)
+
+    refresh = commands.add_parser(
+        "refresh-snapshot", help="Append new rows to the Arrow analytics snapshot")
+    refresh.add_argument("--dir", help="snapshot directory (default: SNAPSHOT_DIR)")
+    refresh.add_argument("--rebuild", action="store_true", help="discard the snapshot and write it from scratch")
+    refresh.set_defaults(func=refresh_snapshot)
+
+    ingest = commands.add_parser(
+        "ingest-fx", help="Load FX rates from a CSV of base,quote,date,rate")
+    ingest.add_argument("file", help="CSV file with a base,quote,date,rate header")
+    ingest.add_argument("--reprice", action="store_true",
+                        help="re-resolve every exit's rate, then rebuild aggregates and the snapshot")
+    ingest.set_defaults(func=ingest_fx)
+
+    ingest_eod = commands.add_parser(
+        "ingest-prices", help="Load end-of-day closes from CSVs of stock,market,date,close")
+    ingest_eod.add_argument("files", nargs="+", help="CSV files with a stock,market,date,close header")
+    ingest_eod.set_defaults(func=ingest_prices)
+
+    args = parser.parse_args(argv)
+    database.init_engines()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
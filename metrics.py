@@ -0,0 +1,177 @@
+"""In-process request metrics rendered in the Prometheus text exposition format.
+
+``MetricsMiddleware`` records, per route template and method, the request count,
+the latency histogram, and how many SQL statements (and how much SQL time) each
+request used. SQL usage is collected by ``instrumentation``'s engine listeners
+into a per-request accumulator held in a context variable, so it also counts
+statements run on the threadpool or inside ``AsyncSession.run_sync``.
+``timed`` adds named spans around CPU-heavy helpers. ``render()`` produces the
+``GET /metrics`` body; no external service or client library is needed.
+"""
+import functools
+import math
+import threading
+import time
+
+import instrumentation
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(labelnames, values) -> str:
+    if not labelnames:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labelnames, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        names = self.labelnames + ("le",)
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    yield f"{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {cumulative}"
+                yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(series[-2])}"
+                yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {series[-1]}"
+
+
+REQUESTS = Counter("http_requests_total", "HTTP requests by route, method and status.",
+                   ("route", "method", "status"))
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency by route.",
+                            ("route", "method"))
+REQUEST_SQL_STATEMENTS = Histogram("http_request_sql_statements", "SQL statements executed per request.",
+                                   ("route", "method"), buckets=STATEMENT_BUCKETS)
+REQUEST_SQL_SECONDS = Histogram("http_request_sql_seconds", "Time spent in SQL per request.",
+                                ("route", "method"))
+SPAN_SECONDS = Histogram("span_duration_seconds", "Time spent in instrumented functions.", ("span",))
+
+REGISTRY = [REQUESTS, REQUEST_SECONDS, REQUEST_SQL_STATEMENTS, REQUEST_SQL_SECONDS, SPAN_SECONDS]
+
+
+# ========== Middleware ==========
+
+class MetricsMiddleware:
+    """ASGI middleware labelling each HTTP request with its route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        usage = instrumentation.SqlUsage()
+        token = instrumentation.current_sql_usage.set(usage)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            instrumentation.current_sql_usage.reset(token)
+            route = scope.get("route")
+            labels = (getattr(route, "path", "<unmatched>"), scope["method"])
+            REQUESTS.inc(labels + (str(status),))
+            REQUEST_SECONDS.observe(labels, elapsed)
+            REQUEST_SQL_STATEMENTS.observe(labels, usage.statements)
+            REQUEST_SQL_SECONDS.observe(labels, usage.seconds)
+
+
+# ========== Spans ==========
+
+def timed(span: str):
+    """Decorator recording the wrapped function's wall time under ``span``."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                SPAN_SECONDS.observe((span,), time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+# ========== Exposition ==========
+
+POOL_GAUGES = {
+    "checked_out": ("db_pool_checked_out", "gauge", "Connections currently checked out."),
+    "peak_checked_out": ("db_pool_peak_checked_out", "gauge", "Most connections checked out at once."),
+    "checkouts": ("db_pool_checkouts_total", "counter", "Connection checkouts."),
+    "overflow_checkouts": ("db_pool_overflow_checkouts_total", "counter", "Checkouts beyond pool_size."),
+    "timeouts": ("db_pool_timeouts_total", "counter", "Checkouts that timed out waiting for a connection."),
+    "wait_seconds_total": ("db_pool_wait_seconds_total", "counter", "Time spent waiting for a connection."),
+}
+
+
+def _render_pool(pools: dict):
+    for field, (name, kind, documentation) in POOL_GAUGES.items():
+        yield f"# HELP {name} {documentation}"
+        yield f"# TYPE {name} {kind}"
+        for engine, stats in sorted(pools.items()):
+            yield f"{name}{_format_labels(('engine',), (engine,))} {_format_value(stats[field])}"
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(_render_pool(instrumentation.snapshot(top=0)["pools"]))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,63 @@
+"""Additive schema migrations: bring a database up to the models in ``models.py``.
+
+``python manage.py migrate`` compares the live schema with the models and
+creates whatever is missing: tables (with their indexes), columns and indexes.
+Nothing is altered or dropped, so it is safe to run on every deploy and on an
+empty database (bootstrap). ``--sql`` prints the statements instead.
+
+A NOT NULL column without a server default (``updated_at``) cannot be added to a
+populated table portably; it is added as nullable and filled with its Python
+default, which the application then keeps writing.
+"""
+from typing import List
+
+from sqlalchemy import Column, inspect, text
+from sqlalchemy.schema import CreateColumn, CreateIndex, CreateTable
+
+import models  # noqa: F401  (registers the tables on Base.metadata)
+from database import Base
+
+
+def _add_column(table, column, dialect) -> List[str]:
+    if column.nullable or column.server_default is not None or column.default is None:
+        return [f"ALTER TABLE {table.name} ADD COLUMN {CreateColumn(column).compile(dialect=dialect)}"]
+    nullable = Column(column.name, column.type, nullable=True)
+    value = column.default.arg(None) if column.default.is_callable else column.default.arg
+    return [
+        f"ALTER TABLE {table.name} ADD COLUMN {CreateColumn(nullable).compile(dialect=dialect)}",
+        f"UPDATE {table.name} SET {column.name} = {column.type.literal_processor(dialect)(value)}",
+    ]
+
+
+def _indexes(table):
+    return sorted(table.indexes, key=lambda index: index.name)
+
+
+def plan(engine) -> List[str]:
+    """DDL that would bring ``engine``'s database up to the models, in order."""
+    inspector = inspect(engine)
+    dialect = engine.dialect
+    existing = set(inspector.get_table_names())
+    statements = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing:
+            statements.append(str(CreateTable(table).compile(dialect=dialect)).strip())
+            statements.extend(str(CreateIndex(index).compile(dialect=dialect)) for index in _indexes(table))
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                statements.extend(_add_column(table, column, dialect))
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        statements.extend(str(CreateIndex(index).compile(dialect=dialect))
+                          for index in _indexes(table) if index.name not in indexes)
+    return statements
+
+
+def upgrade(engine) -> List[str]:
+    """Apply ``plan`` in one transaction (MySQL commits each DDL statement regardless)."""
+    statements = plan(engine)
+    with engine.begin() as connection:
+        for statement in statements:
+            connection.execute(text(statement))
+    return statements
@@ -1,9 +1,35 @@
-from sqlalchemy import Column, Integer, String, Enum, Date, DECIMAL, Boolean, ForeignKey
+from sqlalchemy import (Column, Integer, BigInteger, String, Enum, Date, DateTime, DECIMAL, Boolean,
+                        ForeignKey, Index)
 from sqlalchemy.orm import relationship
+from datetime import datetime, timedelta, timezone
 from database import Base
 
+# Longest a write transaction is expected to stay open. ``updated_at`` and ids are
+# assigned before commit, so a row can become visible this long after its stamp.
+COMMIT_LAG = timedelta(minutes=5)
+
+
+def utcnow():
+    """Naive UTC now, to the second (MySQL DATETIME has no fractional part by default)."""
+    return datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+
 class TradeEntry(Base):
     __tablename__ = "trade_entries"
+    __table_args__ = (
+        # Back the GET /entries filters and its (entry_date, id) keyset order
+        Index("ix_trade_entries_open_date_id", "is_open", "entry_date", "id"),
+        Index("ix_trade_entries_date_id", "entry_date", "id"),
+        Index("ix_trade_entries_market_stock", "market", "stock"),
+        # Covers GET /analytics/by-symbol|by-market: closed trades grouped by (market, stock),
+        # read from the index alone
+        Index("ix_trade_entries_breakdown", "is_open", "market", "stock", "realized_pnl_hkd", "realized_pnl",
+              "entry_price", "stop_loss_price", "qty"),
+        # Backs the GET /entries?sort_by=realized_pnl_hkd keyset order
+        Index("ix_trade_entries_pnl_id", "realized_pnl_hkd", "id"),
+        # Back GET /export?since= incremental syncs, streamed in (updated_at, id) order
+        Index("ix_trade_entries_updated_id", "updated_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     stock = Column(String(10), nullable=False)
@@ -17,6 +43,19 @@ class TradeEntry(Base):
     target_price = Column(DECIMAL(10, 2))
     is_open = Column(Boolean, default=True)
 
+    # Position aggregates over `exits`, maintained by crud.create_exit in the same
+    # transaction as the exit insert (repair with `python manage.py rebuild-aggregates`)
+    exited_qty = Column(Integer, nullable=False, default=0, server_default="0")
+    realized_pnl = Column(DECIMAL(16, 2), nullable=False, default=0, server_default="0")
+    realized_pnl_hkd = Column(DECIMAL(18, 4), nullable=False, default=0, server_default="0")
+    avg_exit_price = Column(DECIMAL(14, 4))  # quantity-weighted average exit price
+    last_exit_date = Column(Date)
+
+    # Last write to the entry or its aggregates (UTC); the GET /export?since= watermark
+    updated_at = Column(DateTime, nullable=False, default=utcnow, onupdate=utcnow)
+    # Bumped by every aggregate update; exits compare-and-swap on it (crud.create_exit)
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+
     exits = relationship("TradeExit", back_populates="entry")
 
 
@@ -24,9 +63,44 @@ class TradeExit(Base):
     __tablename__ = "trade_exits"
 
     id = Column(Integer, primary_key=True, index=True)
-    entry_id = Column(Integer, ForeignKey("trade_entries.id"), nullable=False)
+    entry_id = Column(Integer, ForeignKey("trade_entries.id"), nullable=False, index=True)
     exit_date = Column(Date, nullable=False)
     exit_price = Column(DECIMAL(10, 2), nullable=False)
     exit_qty = Column(Integer, nullable=False)
+    # Market currency -> reporting currency on exit_date, fixed when the exit is written
+    fx_rate = Column(DECIMAL(18, 8))
 
     entry = relationship("TradeEntry", back_populates="exits")
+
+
+class FxRate(Base):
+    """Daily FX rate: 1 ``base_currency`` = ``rate`` ``quote_currency``."""
+    __tablename__ = "fx_rates"
+
+    base_currency = Column(String(3), primary_key=True)
+    quote_currency = Column(String(3), primary_key=True)
+    rate_date = Column(Date, primary_key=True)
+    rate = Column(DECIMAL(18, 8), nullable=False)
+
+
+class Price(Base):
+    """End-of-day close of a stock, loaded in bulk by ``manage.py ingest-prices``."""
+    __tablename__ = "prices"
+    __table_args__ = (
+        # Latest-price cache: MAX(price_date) and the rows on or after a date
+        Index("ix_prices_date", "price_date"),
+    )
+
+    stock = Column(String(10), primary_key=True)
+    market = Column(String(10), primary_key=True)
+    price_date = Column(Date, primary_key=True)
+    close = Column(DECIMAL(14, 4), nullable=False)
+
+
+class JournalState(Base):
+    """Single row holding the journal's write version, bumped by every write."""
+    __tablename__ = "journal_state"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False)  # UTC
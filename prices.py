@@ -0,0 +1,192 @@
+"""End-of-day prices: bulk CSV ingest, a latest-price cache and mark-to-market.
+
+``prices`` holds one close per (stock, market, date). The latest close of every
+stock is cached in-process as a frame indexed by (stock, market). Each read
+compares a cheap signature (the newest price date and how many rows it has,
+both answered from ``ix_prices_date``) with the cached one and, when new prices
+have arrived, reads only the rows from the cached newest date onwards. An
+ingest in this process drops the cache; corrections to older dates made by
+another process are picked up after ``CACHE_TTL``.
+
+``mark_to_market`` values every open position against the cache in one
+vectorized pass.
+"""
+import csv
+import threading
+import time
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from typing import Iterable, Iterator
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, delete, func, insert, select
+
+import fx, models
+
+CACHE_TTL = 3600  # seconds before the cache is fully reloaded regardless of the signature
+INGEST_CHUNK = 5000  # rows per DELETE/INSERT round trip
+
+
+# ========== Ingest ==========
+
+def parse_csv(lines: Iterable[str]) -> Iterator[dict]:
+    """Rows of ``stock,market,date,close`` (header required) as ``prices`` dicts, streamed."""
+    for line_number, record in enumerate(csv.DictReader(lines), start=2):
+        try:
+            yield {
+                "stock": record["stock"].strip().upper(),
+                "market": record["market"].strip().upper(),
+                "price_date": date.fromisoformat(record["date"].strip()),
+                "close": Decimal(record["close"].strip()),
+            }
+        except (KeyError, AttributeError, ValueError, InvalidOperation) as e:
+            raise ValueError(f"Line {line_number}: invalid price row {record!r} ({e})") from e
+
+
+def _write_chunk(db, chunk: list):
+    """Replace the chunk's (stock, market, date) keys: one DELETE per market and date, one executemany INSERT."""
+    price = models.Price
+    keys = {}
+    for row in chunk:
+        keys.setdefault((row["market"], row["price_date"]), set()).add(row["stock"])
+    for (market, price_date), stocks in keys.items():
+        db.execute(delete(price).where(
+            price.market == market, price.price_date == price_date, price.stock.in_(stocks)))
+    db.execute(insert(price), chunk)
+
+
+def ingest(db, rows: Iterable[dict]) -> int:
+    """Insert prices in chunks of ``INGEST_CHUNK``, replacing existing closes; one transaction."""
+    count, chunk = 0, []
+    try:
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == INGEST_CHUNK:
+                _write_chunk(db, chunk)
+                count, chunk = count + len(chunk), []
+        if chunk:
+            _write_chunk(db, chunk)
+            count += len(chunk)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    invalidate()
+    return count
+
+
+# ========== Latest-price cache ==========
+
+_LATEST_COLUMNS = ["stock", "market", "price_date", "close"]
+
+_lock = threading.Lock()
+_latest = None  # DataFrame indexed by (stock, market): price_date, close
+_signature = None
+_loaded_at = 0.0
+
+
+def _current_signature(db):
+    price = models.Price
+    newest = db.execute(select(func.max(price.price_date))).scalar()
+    if newest is None:
+        return None
+    return newest, db.execute(select(func.count()).where(price.price_date == newest)).scalar()
+
+
+def _latest_frame(rows) -> pd.DataFrame:
+    frame = pd.DataFrame.from_records(rows, columns=_LATEST_COLUMNS)
+    frame["close"] = frame["close"].astype(float)
+    frame = frame.sort_values("price_date").drop_duplicates(["stock", "market"], keep="last")
+    return frame.set_index(["stock", "market"])
+
+
+def _load_all(db) -> pd.DataFrame:
+    price = models.Price
+    newest = (
+        select(price.stock, price.market, func.max(price.price_date).label("price_date"))
+        .group_by(price.stock, price.market)
+        .subquery()
+    )
+    rows = db.execute(
+        select(price.stock, price.market, price.price_date, price.close).join(newest, and_(
+            newest.c.stock == price.stock, newest.c.market == price.market,
+            newest.c.price_date == price.price_date,
+        ))
+    ).all()
+    return _latest_frame(rows)
+
+
+def _load_since(db, since: date) -> pd.DataFrame:
+    price = models.Price
+    rows = db.execute(
+        select(price.stock, price.market, price.price_date, price.close).where(price.price_date >= since)
+    ).all()
+    return _latest_frame(rows)
+
+
+def get_latest(db) -> pd.DataFrame:
+    """Latest close per (stock, market), refreshed incrementally when new prices have arrived."""
+    global _latest, _signature, _loaded_at
+    signature = _current_signature(db)
+    with _lock:
+        latest, cached_signature, loaded_at = _latest, _signature, _loaded_at
+    if latest is not None and signature == cached_signature:
+        return latest
+
+    expired = time.monotonic() - loaded_at > CACHE_TTL
+    if latest is None or cached_signature is None or signature is None or expired or signature < cached_signature:
+        latest, loaded_at = _load_all(db), time.monotonic()
+    else:
+        # Everything before the cached newest date is unchanged; newer rows win per stock
+        latest = pd.concat([latest, _load_since(db, cached_signature[0])])
+        latest = latest[~latest.index.duplicated(keep="last")]
+    with _lock:
+        _latest, _signature, _loaded_at = latest, signature, loaded_at
+    return latest
+
+
+def invalidate():
+    global _latest, _signature
+    with _lock:
+        _latest, _signature = None, None
+
+
+# ========== Mark-to-market ==========
+
+MTM_COLUMNS = [
+    "last_price", "price_date", "market_value", "unrealized_pnl", "unrealized_pnl_hkd", "unrealized_pnl_pct",
+    "stop_distance_pct", "target_distance_pct",
+]
+
+
+def mark_to_market(positions: pd.DataFrame, latest: pd.DataFrame, rates: "fx.FxRates") -> pd.DataFrame:
+    """Value open positions (``stock, market, position, entry_price, remaining_qty,
+    stop_loss_price, target_price``) at their latest close, all rows at once.
+
+    Distances to the stop and target are fractions of the last price, positive
+    while the price has not reached them (for either side). Positions without a
+    price get NaN.
+    """
+    frame = positions.join(latest, on=["stock", "market"])
+    last = frame["close"].astype(float)
+    entry_price = frame["entry_price"].astype(float)
+    qty = frame["remaining_qty"].astype(float)
+    sign = np.where(frame["position"] == "Long", 1.0, -1.0)
+
+    priced = last.notna().to_numpy()
+    fx_rate = np.full(len(frame), np.nan)
+    if priced.any():
+        fx_rate[priced] = rates.for_markets(
+            frame["market"][priced].tolist(), frame["price_date"][priced].tolist())
+
+    unrealized = (last - entry_price) * sign * qty
+    return frame.assign(
+        last_price=last,
+        market_value=last * qty,
+        unrealized_pnl=unrealized,
+        unrealized_pnl_hkd=unrealized * fx_rate,
+        unrealized_pnl_pct=(last - entry_price) * sign / entry_price,
+        stop_distance_pct=(last - frame["stop_loss_price"].astype(float)) * sign / last,
+        target_distance_pct=(frame["target_price"].astype(float) - last) * sign / last,
+    )
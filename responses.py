@@ -0,0 +1,51 @@
+"""JSON encoding for routes that build their response rows themselves.
+
+The entry routes get their rows from ``derived.derived_rows`` already shaped like
+``TradeEntryResponse``; validating them through the route's ``response_model``
+again would only re-check what the server just computed. Those routes return a
+``FastJSONResponse`` instead and keep ``response_model`` for the OpenAPI
+schema. Decimals are written as strings and dates/datetimes in ISO format, as
+pydantic's JSON mode does; with orjson installed the bytes are identical to
+pydantic's, the stdlib fallback may write small floats in exponent form.
+"""
+import json
+from datetime import date
+from decimal import Decimal
+
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib encoder is slower
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, date):  # also datetime; orjson encodes both natively
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, default=_default, ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def rows_response(rows, response: Response) -> FastJSONResponse:
+    """``rows`` as JSON, keeping the headers dependencies set on the route's ``response``
+    (FastAPI only merges those into responses it builds itself)."""
+    fast = FastJSONResponse(rows)
+    fast.raw_headers.extend(
+        (name, value) for name, value in response.headers.raw if name != b"content-length")
+    return fast
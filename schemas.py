@@ -1,6 +1,7 @@
-from pydantic import BaseModel, condecimal
-from typing import Optional, List, Literal
-from datetime import date
+from pydantic import BaseModel, ConfigDict, Field, condecimal
+from typing import Any, Dict, Optional, List, Literal
+from datetime import date, datetime
+from decimal import Decimal
 
 
 # ========== Exit Schema ==========
@@ -15,11 +16,23 @@ class TradeExitCreate(TradeExitBase):
 class TradeExitResponse(TradeExitBase):
     id: int
     entry_id: int
+    fx_rate: Optional[Decimal] = None  # market currency -> reporting currency on exit_date
 
     class Config:
         orm_mode = True
 
 
+class ExitBatchItem(BaseModel):
+    index: int  # position in the request body
+    exit: Optional[TradeExitResponse] = None
+    error: Optional[str] = None
+
+
+class ExitBatchResult(BaseModel):
+    exits_created: int = 0
+    results: List[ExitBatchItem] = []
+
+
 # ========== Entry Schema ==========
 class TradeEntryBase(BaseModel):
     stock: str
@@ -38,6 +51,7 @@ class TradeEntryResponse(TradeEntryBase):
     id: int
     remaining_qty: int
     is_open: bool
+    updated_at: Optional[datetime] = None  # UTC; compare with GET /export?since=
     exits: List[TradeExitResponse] = []
 
     # ✅ Add these explicitly
@@ -53,4 +67,175 @@ class TradeEntryResponse(TradeEntryBase):
         orm_mode = True
 
 
+# ========== Summary Schema ==========
+class MonthlySummary(BaseModel):
+    month: str  # YYYY-MM of the exit date
+    winning_trades: int
+    losing_trades: int
+    win_rate: Optional[float] = None
+    avg_gain: Optional[float] = None  # HKD
+    avg_loss: Optional[float] = None  # HKD
+    avg_gain_pct: Optional[float] = None
+    avg_loss_pct: Optional[float] = None
+    actual_rr_ratio: Optional[float] = None
+    largest_gain: Optional[float] = None  # HKD
+    largest_loss: Optional[float] = None  # HKD
+    avg_holding_days_win: Optional[float] = None
+    avg_holding_days_loss: Optional[float] = None
+
+
+class EquityPoint(BaseModel):
+    date: date  # exit day, or the Sunday ending the week
+    pnl: float  # realized in the period (HKD)
+    equity: float  # cumulative realized PnL (HKD)
+    peak: float
+    drawdown: float  # equity - peak, <= 0
+
+
+class EquityCurve(BaseModel):
+    granularity: Literal["day", "week"]
+    total_pnl: float
+    max_drawdown: float
+    max_drawdown_duration_days: int
+    points: List[EquityPoint]
+
+
+class PerformanceBreakdown(BaseModel):
+    """Closed-trade performance of one market, or one stock within it."""
+    market: str
+    stock: Optional[str] = None  # None in GET /analytics/by-market
+    trades: int
+    winning_trades: int
+    losing_trades: int
+    win_rate: Optional[float] = None
+    total_pnl: float  # HKD
+    expectancy: float  # average PnL per trade (HKD)
+    profit_factor: Optional[float] = None  # gross gain / gross loss; None without losses
+    avg_r_multiple: Optional[float] = None  # over trades with a stop loss
+    best_trade: float  # HKD
+    worst_trade: float  # HKD
+
+
+class Distribution(BaseModel):
+    mean: float
+    p5: float
+    p25: float
+    p50: float
+    p75: float
+    p95: float
+
+
+class SimulationOutcome(BaseModel):
+    """Bootstrapped outcomes at one position-sizing fraction."""
+    fraction: float
+    final_pnl: Distribution  # on starting_capital after all trades
+    max_drawdown: Distribution  # fraction of peak equity, 0-1
+    probability_of_loss: float
+    risk_of_ruin: float  # share of paths that fell to (1 - ruin_level) x starting_capital
+
+
+class SimulationResult(BaseModel):
+    basis: Literal["r_multiple", "return"]
+    market: Optional[str] = None
+    position: Optional[Literal["Long", "Short"]] = None
+    sample_trades: int  # historical trades resampled
+    paths: int
+    trades: int  # per path
+    seed: int  # replays the run
+    starting_capital: float
+    ruin_level: float
+    outcomes: List[SimulationOutcome]
+
+
+class PositionMtm(BaseModel):
+    entry_id: int
+    stock: str
+    market: str
+    position: Literal["Long", "Short"]
+    entry_date: date
+    entry_price: Decimal
+    remaining_qty: int
+    stop_loss_price: Optional[Decimal] = None
+    target_price: Optional[Decimal] = None
+    # None until a close has been ingested for the stock
+    last_price: Optional[float] = None
+    price_date: Optional[date] = None
+    market_value: Optional[float] = None  # market currency
+    unrealized_pnl: Optional[float] = None  # market currency
+    unrealized_pnl_hkd: Optional[float] = None
+    unrealized_pnl_pct: Optional[float] = None
+    stop_distance_pct: Optional[float] = None  # > 0 while the stop has not been hit
+    target_distance_pct: Optional[float] = None  # > 0 while the target has not been reached
+
+
+class MarkToMarket(BaseModel):
+    as_of: Optional[date] = None  # newest price date used
+    unrealized_pnl_hkd: float  # over priced positions
+    unpriced: int  # open positions without a price
+    positions: List[PositionMtm]
+
+
+# ========== Query Schema ==========
+# Sort keys of GET /entries (crud.SORT_COLUMNS)
+EntrySort = Literal["entry_date", "stock", "market", "entry_price", "qty", "remaining_qty", "realized_pnl_hkd"]
+# Sort keys of GET /analytics/by-symbol and /by-market
+BreakdownSort = Literal["total_pnl", "trades", "win_rate", "expectancy", "profit_factor", "avg_r_multiple"]
+
+
+class EntryFilter(BaseModel):
+    stock: Optional[str] = None  # prefix match
+    market: Optional[str] = None
+    is_open: Optional[bool] = None
+    entry_date_from: Optional[date] = None
+    entry_date_to: Optional[date] = None
+
+
+# ========== Bulk Import Schema ==========
+class ImportRowError(BaseModel):
+    row: int  # line number in the uploaded file
+    detail: str
+
+class BulkImportResult(BaseModel):
+    entries_created: int = 0
+    exits_created: int = 0
+    errors: List[ImportRowError] = []
+
+
+# ========== Job Schema ==========
+# Analytics that run in the job process pool (jobs.JOB_KINDS), with their parameters
+JobKind = Literal["monthly_summary", "equity_curve", "by_symbol", "by_market"]
+
+class MonthlySummaryParams(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    year: Optional[int] = None
+    market: Optional[str] = None
+
+class EquityCurveParams(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    granularity: Literal["day", "week"] = "day"
+    market: Optional[str] = None
+
+class BreakdownParams(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    market: Optional[str] = None
+    sort_by: BreakdownSort = "total_pnl"
+    descending: bool = True
+    limit: int = Field(20, ge=1, le=1000)
+    min_trades: int = Field(1, ge=1)
+
+class JobCreate(BaseModel):
+    kind: JobKind
+    params: Dict[str, Any] = {}  # validated against the kind's *Params model
 
+class JobStatus(BaseModel):
+    id: str
+    kind: JobKind
+    params: Dict[str, Any]
+    status: Literal["pending", "running", "done", "failed"]
+    journal_version: int  # version the result reflects (at submission until the job has run)
+    cached: bool = False  # served from the memoized results without running
+    result: Optional[Any] = None  # the analytics route's response body
+    error: Optional[str] = None
@@ -0,0 +1,114 @@
+"""Application settings loaded from the environment / ``.env``."""
+import os
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from dotenv import load_dotenv
+
+load_dotenv()  # Load .env variables
+
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_mapping(name: str, default: dict, value_type=str) -> dict:
+    """``KEY:VALUE,KEY:VALUE`` from the environment, keys upper-cased."""
+    value = os.getenv(name)
+    if not value:
+        return dict(default)
+    pairs = (item.split(":", 1) for item in value.split(",") if item.strip())
+    return {k.strip().upper(): value_type(v.strip()) for k, v in pairs}
+
+
+@dataclass(frozen=True)
+class Settings:
+    # Connection
+    db_host: str = None
+    db_port: str = None
+    db_name: str = None
+    db_user: str = None
+    db_password: str = None
+    database_url: str = None  # overrides the DB_* settings
+    sqlite_url: str = "sqlite:///./trading_journal.db"  # local runs without MySQL
+    use_sqlite: bool = False
+    db_async: bool = False
+
+    # Engine / pool profile
+    echo: bool = False
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: int = 30  # seconds to wait for a connection before TimeoutError
+    pool_recycle: int = 1800  # seconds; below MySQL's wait_timeout so idle connections are replaced
+    pool_pre_ping: bool = True
+
+    # FX: PnL is reported in reporting_currency. Markets not in market_currencies
+    # trade in it; fx_fallback_rates apply when fx_rates has no rate on or before a date.
+    reporting_currency: str = "HKD"
+    market_currencies: dict = field(default_factory=lambda: {"HK": "HKD", "US": "USD"})
+    fx_fallback_rates: dict = field(default_factory=lambda: {"USD": Decimal("7.78")})
+
+    # Columnar analytics snapshot (snapshot.py); refreshed after writes when set
+    snapshot_dir: str = None
+
+    # Analytics job processes (jobs.py); 0 = one per CPU
+    job_workers: int = 0
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        defaults = cls()
+        return cls(
+            db_host=os.getenv("DB_HOST"),
+            db_port=os.getenv("DB_PORT"),
+            db_name=os.getenv("DB_NAME"),
+            db_user=os.getenv("DB_USER"),
+            db_password=os.getenv("DB_PASSWORD"),
+            database_url=os.getenv("DATABASE_URL") or None,
+            sqlite_url=os.getenv("SQLITE_URL") or defaults.sqlite_url,
+            use_sqlite=_env_bool("USE_SQLITE"),
+            db_async=_env_bool("DB_ASYNC"),
+            echo=_env_bool("DB_ECHO"),
+            pool_size=_env_int("DB_POOL_SIZE", defaults.pool_size),
+            max_overflow=_env_int("DB_MAX_OVERFLOW", defaults.max_overflow),
+            pool_timeout=_env_int("DB_POOL_TIMEOUT", defaults.pool_timeout),
+            pool_recycle=_env_int("DB_POOL_RECYCLE", defaults.pool_recycle),
+            pool_pre_ping=_env_bool("DB_POOL_PRE_PING", defaults.pool_pre_ping),
+            reporting_currency=(os.getenv("REPORTING_CURRENCY") or defaults.reporting_currency).upper(),
+            market_currencies=_env_mapping("MARKET_CURRENCIES", defaults.market_currencies, lambda v: v.upper()),
+            fx_fallback_rates=_env_mapping("FX_FALLBACK_RATES", defaults.fx_fallback_rates, Decimal),
+            snapshot_dir=os.getenv("SNAPSHOT_DIR") or None,
+            job_workers=_env_int("JOB_WORKERS", defaults.job_workers),
+        )
+
+    @property
+    def url(self) -> str:
+        """DATABASE_URL, else SQLITE_URL when USE_SQLITE is set, else MySQL from the DB_* settings."""
+        if self.database_url:
+            return self.database_url
+        if self.use_sqlite:
+            return self.sqlite_url
+        return f"mysql+pymysql://{self.db_user}:{self.db_password}@{self.db_host}:{self.db_port}/{self.db_name}"
+
+    def engine_kwargs(self) -> dict:
+        """Keyword arguments for ``create_engine`` / ``create_async_engine``."""
+        kwargs = {"echo": self.echo, "pool_pre_ping": self.pool_pre_ping}
+        if ":memory:" in self.url or self.url.rstrip("/").endswith(("sqlite:", "sqlite+aiosqlite:")):
+            return kwargs  # single-connection in-memory SQLite pool takes no sizing
+        kwargs.update(
+            pool_size=self.pool_size,
+            max_overflow=self.max_overflow,
+            pool_timeout=self.pool_timeout,
+            pool_recycle=self.pool_recycle,
+        )
+        return kwargs
+
+
+settings = Settings.from_env()
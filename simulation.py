@@ -0,0 +1,112 @@
+"""Monte Carlo bootstrap of strategy outcomes from historical per-trade returns.
+
+Each path draws ``trades`` returns with replacement from the closed trades'
+history (``crud.get_trade_returns``) and compounds them at a fixed sizing
+fraction: with the ``r_multiple`` basis a trade risks ``fraction`` of equity and
+returns ``fraction x R``; with the ``return`` basis ``fraction`` of equity is
+invested and earns the trade's return on capital. A trade can at most lose the
+whole account.
+
+Paths are simulated in chunks of ``CHUNK_PATHS``, drawing ``TRADE_BLOCK`` trades
+at a time as NumPy ``trades x paths`` matrices of log growth, so memory stays
+bounded however many paths and trades are requested; CPU time is not, so the
+API caps ``paths x trades x fractions`` at ``MAX_ELEMENTS``. Every chunk draws
+from its own child of ``SeedSequence(seed)``, so the result depends only on the
+seed and the parameters, not on how chunks are spread over processes. All sizing fractions reuse the same draws (common random
+numbers), which makes their outcomes directly comparable.
+"""
+import os
+from typing import List, Sequence
+
+import numpy as np
+
+CHUNK_PATHS = 5_000  # paths simulated together (the unit of work spread over processes)
+TRADE_BLOCK = 16  # trades drawn at once per chunk: a (fractions x block x paths) matrix
+PARALLEL_MIN_ELEMENTS = 20_000_000  # paths x trades from which the API spreads chunks over processes
+MAX_ELEMENTS = 1_500_000_000  # paths x trades x fractions the API runs (100k x 5k x 3: seconds on a core)
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def _growth(returns: np.ndarray, fractions: Sequence[float]) -> np.ndarray:
+    """``(fractions, trades)`` log growth of equity per historical trade (-inf: account wiped out)."""
+    with np.errstate(divide="ignore"):
+        return np.log1p(np.maximum(np.outer(fractions, returns), -1.0))
+
+
+def _simulate_chunk(growth: np.ndarray, trades: int, paths: int, seed: np.random.SeedSequence, ruin: float):
+    rng = np.random.default_rng(seed)
+    index_type = np.uint16 if growth.shape[1] <= 2**16 else np.intp  # fewer random bits per draw
+    shape = (len(growth), paths)
+    log_equity, peak, drawdown, low = np.zeros(shape), np.zeros(shape), np.zeros(shape), np.zeros(shape)
+    gap = np.empty(shape)
+    block = np.empty((len(growth), TRADE_BLOCK, paths))
+    for start in range(0, trades, TRADE_BLOCK):
+        size = min(TRADE_BLOCK, trades - start)
+        draws = rng.integers(0, growth.shape[1], size=(size, paths), dtype=index_type)
+        # (fractions, trades, paths): every fraction sees the same draws; "clip" skips a bounds-check buffer
+        np.take(growth, draws, axis=1, out=block[:, :size], mode="clip")
+        # Step through the block's trades, each one vectorized over all fractions and paths;
+        # cheaper than cumsum / maximum.accumulate along the trade axis
+        for step in range(size):
+            log_equity += block[:, step]
+            np.maximum(peak, log_equity, out=peak)
+            np.subtract(log_equity, peak, out=gap)
+            np.minimum(drawdown, gap, out=drawdown)
+            np.minimum(low, log_equity, out=low)
+    return log_equity, -np.expm1(drawdown), low <= ruin
+
+
+def simulate_chunks(returns: np.ndarray, fractions: Sequence[float], trades: int, sizes: Sequence[int],
+                    seeds: Sequence[np.random.SeedSequence], ruin_level: float):
+    """Simulate consecutive chunks of paths: per fraction, each path's final log
+    equity, max drawdown (fraction of peak equity) and whether it was ruined."""
+    growth = _growth(returns, fractions)
+    ruin = np.log1p(-ruin_level) if ruin_level < 1 else -np.inf
+    parts = [_simulate_chunk(growth, trades, size, seed, ruin) for size, seed in zip(sizes, seeds)]
+    return tuple(np.concatenate(arrays, axis=1) for arrays in zip(*parts))
+
+
+def _distribution(values: np.ndarray) -> dict:
+    return {"mean": float(values.mean()),
+            **{f"p{q}": float(v) for q, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}}
+
+
+def simulate(returns: Sequence[float], fractions: Sequence[float], paths: int = 10_000, trades: int = None,
+             seed: int = None, ruin_level: float = 0.5, starting_capital: float = 100_000.0,
+             executor=None, workers: int = None) -> dict:
+    """Bootstrap ``paths`` equity paths of ``trades`` trades (default: as many as the
+    history) per sizing fraction; ``schemas.SimulationResult`` fields except the filters.
+
+    With an ``executor`` the chunks are split over ``workers`` tasks (default
+    one per CPU); the result is the same as without one.
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    trades = trades or len(returns)
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy % 2**63)  # reported, so the run can be replayed
+
+    sizes = [min(CHUNK_PATHS, paths - start) for start in range(0, paths, CHUNK_PATHS)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    if executor is None:
+        final, drawdown, ruined = simulate_chunks(returns, fractions, trades, sizes, seeds, ruin_level)
+    else:
+        groups = np.array_split(np.arange(len(sizes)), min(len(sizes), workers or os.cpu_count() or 1))
+        futures = [executor.submit(simulate_chunks, returns, fractions, trades,
+                                   [sizes[i] for i in group], [seeds[i] for i in group], ruin_level)
+                   for group in groups]
+        parts = [future.result() for future in futures]
+        final, drawdown, ruined = (np.concatenate(arrays, axis=1) for arrays in zip(*parts))
+
+    outcomes: List[dict] = []
+    for i, fraction in enumerate(fractions):
+        pnl = starting_capital * np.expm1(final[i])
+        outcomes.append({
+            "fraction": fraction,
+            "final_pnl": _distribution(pnl),
+            "max_drawdown": _distribution(drawdown[i]),
+            "probability_of_loss": float((pnl < 0).mean()),
+            "risk_of_ruin": float(ruined[i].mean()),
+        })
+    return {"sample_trades": len(returns), "paths": paths, "trades": trades, "seed": seed,
+            "starting_capital": starting_capital, "ruin_level": ruin_level, "outcomes": outcomes}
@@ -0,0 +1,327 @@
+"""Columnar analytics snapshot of the journal as Arrow IPC segments.
+
+The snapshot directory holds append-only segment files plus ``manifest.json``:
+
+- ``exits-NNNNNN.arrow``: one row per exit with its entry's immutable columns
+  and the exit's realized PnL (``utils.REALIZED_COLUMNS``). Exits are never
+  updated, so each refresh appends the rows past the manifest's ``exit_id``
+  watermark. Ids skipped below the watermark (``exit_gaps``: transactions
+  that had not committed yet) are looked up again by the following refreshes
+  for ``WATERMARK_LAG``.
+- ``entries-NNNNNN.arrow``: entries with their current aggregates. Entries do
+  change (every exit updates them), so each refresh appends the rows whose
+  ``updated_at`` is at or past the previous refresh minus ``WATERMARK_LAG``,
+  and readers keep the last copy of each id.
+
+A write whose transaction stays open longer than ``WATERMARK_LAG`` can still
+be missed; ``refresh(rebuild=True)`` (``manage.py refresh-snapshot --rebuild``)
+rewrites everything.
+
+Segments are uncompressed Arrow IPC files, so reads memory-map them and
+materialize only the requested columns (zero-copy until pandas conversion).
+Once there are more than ``MAX_SEGMENTS`` segments of a kind, a refresh compacts
+them into one. Segment files and the manifest are written to a temporary name
+and renamed into place, so readers never see a partial write.
+
+pyarrow is an optional dependency, imported on first use.
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import Boolean, Date, DateTime, Integer, Numeric, String, func, or_, select
+
+import models
+from utils import EXIT_COLUMNS, exit_realized_pnl, summarize_exits_by_month
+
+try:
+    import fcntl
+except ImportError:  # Windows: refreshes are only serialized within the process
+    fcntl = None
+
+MANIFEST = "manifest.json"
+MAX_SEGMENTS = 16
+# Rows may commit below the watermarks for this long (see models.COMMIT_LAG)
+WATERMARK_LAG = models.COMMIT_LAG
+
+EXIT_SNAPSHOT_COLUMNS = ["exit_id", "entry_id", "stock", *EXIT_COLUMNS, "pnl", "pnl_pct", "holding_days"]
+ENTRY_SNAPSHOT_COLUMNS = [c.key for c in models.TradeEntry.__table__.columns]
+_FLOAT_COLUMNS = {
+    "entry_price", "exit_price", "stop_loss_price", "target_price",
+    "realized_pnl", "realized_pnl_hkd", "avg_exit_price", "fx_rate",
+}
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+    except ImportError as e:
+        raise RuntimeError("The analytics snapshot needs pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+
+# ========== Manifest ==========
+
+def _empty_manifest() -> dict:
+    return {"exit_id": 0, "exit_gaps": [], "entries_updated_at": None, "journal_version": 0, "next_segment": 1,
+            "segments": {"exits": [], "entries": []}}
+
+
+def read_manifest(directory: str) -> dict:
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return _empty_manifest()
+
+
+def _write_atomic(path: str, write):
+    tmp = f"{path}.tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def _write_manifest(directory: str, manifest: dict):
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2)
+    _write_atomic(os.path.join(directory, MANIFEST), write)
+
+
+# ========== Writing ==========
+
+def _frame(rows, columns) -> pd.DataFrame:
+    frame = pd.DataFrame.from_records(rows, columns=columns)
+    for column in _FLOAT_COLUMNS.intersection(columns):
+        frame[column] = frame[column].astype(float)
+    return frame
+
+
+def _arrow_type(column_type):
+    pa = _pyarrow()
+    if isinstance(column_type, Boolean):
+        return pa.bool_()
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, Numeric):
+        return pa.float64()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("s")
+    if isinstance(column_type, Date):
+        return pa.date32()
+    if isinstance(column_type, String):  # also Enum
+        return pa.string()
+    raise TypeError(f"No snapshot type for {column_type!r}")
+
+
+def _schema(kind: str):
+    """Fixed Arrow schema per kind, so segments concatenate even when a column is all-null in one.
+
+    Types are looked up by column name (entry columns from the model), never by position.
+    """
+    pa = _pyarrow()
+    if kind == "exits":
+        entry, exit = models.TradeEntry.__table__.columns, models.TradeExit.__table__.columns
+        types = {name: _arrow_type(entry[name].type) for name in EXIT_COLUMNS if name in entry}
+        types.update({name: _arrow_type(exit[name].type) for name in EXIT_COLUMNS if name in exit})
+        types.update(exit_id=pa.int64(), entry_id=pa.int64(), stock=pa.string(),
+                     pnl=pa.float64(), pnl_pct=pa.float64(), holding_days=pa.int64())
+        return pa.schema([(name, types[name]) for name in EXIT_SNAPSHOT_COLUMNS])
+    columns = models.TradeEntry.__table__.columns
+    return pa.schema([(name, _arrow_type(columns[name].type)) for name in ENTRY_SNAPSHOT_COLUMNS])
+
+
+def _write_segment(directory: str, manifest: dict, kind: str, frame: pd.DataFrame) -> str:
+    pa = _pyarrow()
+    name = f"{kind}-{manifest['next_segment']:06d}.arrow"
+    manifest["next_segment"] += 1
+    table = pa.Table.from_pandas(frame, schema=_schema(kind), preserve_index=False, safe=False)
+
+    def write(tmp):
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    _write_atomic(os.path.join(directory, name), write)
+    return name
+
+
+def _new_exits(db, after_id: int, gaps=()) -> pd.DataFrame:
+    """Exits past ``after_id``, plus any of the ``gaps`` ids below it that have committed since."""
+    exit, entry = models.TradeExit, models.TradeEntry
+    new = exit.id > after_id
+    rows = db.execute(
+        select(exit.id, exit.entry_id, entry.stock, entry.market, entry.position, entry.entry_date,
+               entry.entry_price, exit.exit_date, exit.exit_price, exit.exit_qty, exit.fx_rate)
+        .join(entry, entry.id == exit.entry_id)
+        .where(or_(new, exit.id.in_(gaps)) if gaps else new)
+        .order_by(exit.id)
+    ).all()
+    frame = _frame(rows, ["exit_id", "entry_id", "stock", *EXIT_COLUMNS, "fx_rate"])
+    return pd.concat([frame, exit_realized_pnl(frame)], axis=1)[EXIT_SNAPSHOT_COLUMNS]
+
+
+def _changed_entries(db, since) -> pd.DataFrame:
+    query = select(models.TradeEntry.__table__)
+    if since is not None:
+        # Re-read the lag window: a slow transaction commits rows stamped before the last refresh
+        query = query.where(models.TradeEntry.updated_at >= since - WATERMARK_LAG)
+    return _frame(db.execute(query.order_by(models.TradeEntry.id)).all(), ENTRY_SNAPSHOT_COLUMNS)
+
+
+_process_lock = threading.Lock()
+
+
+@contextmanager
+def _refresh_lock(directory: str):
+    """One refresh at a time per directory, across threads and (on POSIX) processes."""
+    with _process_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(directory, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def refresh(db, directory: str, rebuild: bool = False) -> dict:
+    """Append exits and entries written since the last refresh; returns the new manifest.
+
+    ``rebuild`` (or a database whose exits are behind the watermark, e.g. after
+    a restore) discards the existing segments and snapshots everything again.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with _refresh_lock(directory):
+        manifest = read_manifest(directory)
+        max_exit_id = db.execute(select(func.max(models.TradeExit.id))).scalar() or 0
+        if rebuild or max_exit_id < manifest["exit_id"]:
+            old_segments = manifest["segments"]["exits"] + manifest["segments"]["entries"]
+            manifest = {**_empty_manifest(), "next_segment": manifest["next_segment"]}
+        else:
+            old_segments = []
+
+        # Take the watermarks before reading the rows. Rows committed out of order (a lower
+        # exit id or an earlier updated_at than rows already read) are picked up by later
+        # refreshes as long as their transaction took less than WATERMARK_LAG
+        refreshed_at = models.utcnow()
+        version = db.execute(select(models.JournalState.version)).scalar() or 0
+        since = manifest["entries_updated_at"]
+        gaps = {int(exit_id): seen for exit_id, seen in manifest.get("exit_gaps", [])}
+        exits = _new_exits(db, manifest["exit_id"], sorted(gaps))
+        entries = _changed_entries(db, datetime.fromisoformat(since) if since else None)
+
+        if len(exits):
+            manifest["segments"]["exits"].append(_write_segment(directory, manifest, "exits", exits))
+            found = set(exits["exit_id"].tolist())
+            last_id = max(manifest["exit_id"], max(found))
+            # Ids skipped below the new watermark: uncommitted (or rolled back) for now
+            for exit_id in range(manifest["exit_id"] + 1, last_id + 1):
+                if exit_id not in found:
+                    gaps[exit_id] = refreshed_at.isoformat()
+            for exit_id in found:
+                gaps.pop(exit_id, None)
+            manifest["exit_id"] = last_id
+        if len(entries):
+            manifest["segments"]["entries"].append(_write_segment(directory, manifest, "entries", entries))
+        manifest["entries_updated_at"] = refreshed_at.isoformat()
+        manifest["journal_version"] = version
+        expired = (refreshed_at - WATERMARK_LAG).isoformat()
+        manifest["exit_gaps"] = [[exit_id, seen] for exit_id, seen in sorted(gaps.items()) if seen >= expired]
+
+        for kind in ("exits", "entries"):
+            if len(manifest["segments"][kind]) > MAX_SEGMENTS:
+                old_segments += _compact(directory, manifest, kind)
+        _write_manifest(directory, manifest)
+
+        for name in old_segments:
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+    return manifest
+
+
+def _compact(directory: str, manifest: dict, kind: str) -> list:
+    """Merge a kind's segments into one; returns the replaced segment names."""
+    frame = read_entries(directory, manifest=manifest) if kind == "entries" else read_exits(directory, manifest=manifest)
+    old = manifest["segments"][kind]
+    manifest["segments"][kind] = [_write_segment(directory, manifest, kind, frame)]
+    return old
+
+
+# ========== Background refresh ==========
+
+_pending = threading.Event()
+_running = threading.Lock()
+
+
+def request_refresh(session_factory, directory: str):
+    """Refresh after a write, coalescing requests that arrive while one is running.
+
+    Meant for ``BackgroundTasks``: a caller that finds a refresh in progress just
+    flags it, and the running refresh goes round again before returning.
+    """
+    _pending.set()
+    if not _running.acquire(blocking=False):
+        return
+    try:
+        while _pending.is_set():
+            _pending.clear()
+            db = session_factory()
+            try:
+                refresh(db, directory)
+            finally:
+                db.close()
+    finally:
+        _running.release()
+
+
+# ========== Reading ==========
+
+def _read_table(directory: str, kind: str, columns=None, manifest=None):
+    pa = _pyarrow()
+    manifest = manifest or read_manifest(directory)
+    tables = []
+    for name in manifest["segments"][kind]:
+        with pa.memory_map(os.path.join(directory, name)) as source:
+            table = pa.ipc.open_file(source).read_all()
+        tables.append(table.select(columns) if columns else table)
+    if not tables:
+        return None
+    return pa.concat_tables(tables)
+
+
+def read_exits(directory: str, columns=None, manifest=None) -> pd.DataFrame:
+    """Snapshot exits (only ``columns`` when given), memory-mapped and converted to pandas."""
+    table = _read_table(directory, "exits", columns, manifest)
+    if table is None:
+        return pd.DataFrame(columns=columns or EXIT_SNAPSHOT_COLUMNS)
+    return table.to_pandas(date_as_object=False)
+
+
+def read_entries(directory: str, columns=None, manifest=None) -> pd.DataFrame:
+    """Latest snapshot row per entry (only ``columns`` when given; ``id`` is always read)."""
+    if columns and "id" not in columns:
+        columns = ["id", *columns]
+    table = _read_table(directory, "entries", columns, manifest)
+    if table is None:
+        return pd.DataFrame(columns=columns or ENTRY_SNAPSHOT_COLUMNS)
+    frame = table.to_pandas(date_as_object=False)
+    return frame.drop_duplicates("id", keep="last").sort_values("id", ignore_index=True)
+
+
+def monthly_summary(directory: str, market: str = None) -> pd.DataFrame:
+    """``utils.summarize_exits_by_month`` over the snapshot: exits of closed trades only,
+    matching ``GET /summary/monthly``."""
+    exits = read_exits(directory, ["entry_id", "market", "exit_date", "pnl", "pnl_pct", "holding_days"])
+    closed = read_entries(directory, ["is_open"])
+    closed_ids = closed.loc[~closed["is_open"].astype(bool), "id"]
+    exits = exits[exits["entry_id"].isin(closed_ids)]
+    if market:
+        exits = exits[exits["market"] == market]
+    return summarize_exits_by_month(exits)
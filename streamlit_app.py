@@ -1,12 +1,68 @@
 import streamlit as st
 from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode
-import requests
 import pandas as pd
 from datetime import date
-from utils import generate_monthly_summary
+from utils import MONTHLY_SUMMARY_LABELS
 import matplotlib.pyplot as plt
+import api_client
+from api_client import ApiError
+from settings import settings
+
+PAGE_SIZE = 50
+
+# All Trades sort options -> GET /entries sort_by
+SORT_OPTIONS = {
+    "Entry Date": "entry_date",
+    "Stock": "stock",
+    "Market": "market",
+    "Entry Price": "entry_price",
+    "Quantity": "qty",
+    "Remaining Qty": "remaining_qty",
+    "Realized PnL (HKD)": "realized_pnl_hkd",
+}
+
+BREAKDOWN_SORTS = {
+    "Total PnL (HKD)": "total_pnl",
+    "Trades": "trades",
+    "Win Rate": "win_rate",
+    "Expectancy (HKD)": "expectancy",
+    "Profit Factor": "profit_factor",
+    "Avg R-Multiple": "avg_r_multiple",
+}
+
+
+@st.cache_data(show_spinner=False)
+def load_snapshot_summary(directory: str, market: str, journal_version: int) -> pd.DataFrame:
+    """Monthly summary from the local Arrow snapshot; ``journal_version`` keys the cache."""
+    import snapshot
+    return snapshot.monthly_summary(directory, market or None)
+
+
+def trades_grid_frame(trades: list, marks: dict) -> pd.DataFrame:
+    """Grid rows for one page of ``GET /entries`` items, with unrealized PnL from ``marks``."""
+    rows = []
+    for t in trades:
+        mark = marks.get(t["id"]) or {}
+        rows.append({
+            "id": t["id"],
+            "Entry Date": t["entry_date"],
+            "Stock": t["stock"],
+            "Market": t["market"],
+            "Position": t["position"],
+            "Qty": f"{t['remaining_qty']}/{t['qty']}",
+            "Entry": float(t["entry_price"]),
+            "Stop": float(t["stop_loss_price"]) if t["stop_loss_price"] is not None else None,
+            "Target": float(t["target_price"]) if t["target_price"] is not None else None,
+            "Status": "Open" if t["is_open"] else "Closed",
+            "Realized PnL": round(t["actual_gain_loss"], 2) if t["exits"] and t.get("actual_gain_loss") is not None else None,
+            "Last Close": mark.get("last_price"),
+            "Unrealized PnL": round(mark["unrealized_pnl"], 2) if mark else None,
+        })
+    return pd.DataFrame(rows, columns=[
+        "id", "Entry Date", "Stock", "Market", "Position", "Qty", "Entry", "Stop", "Target", "Status",
+        "Realized PnL", "Last Close", "Unrealized PnL",
+    ])
 
-API_URL = "http://127.0.0.1:8002"
 
 st.set_page_config(page_title="Trading Journal", layout="wide")
 st.title("📘 Trading Journal Dashboard")
@@ -21,89 +77,161 @@ filter_end_date = st.sidebar.date_input("End Entry Date", value=None)
 show_closed = st.sidebar.checkbox("Show Closed Positions", value=False)
 
 # ===== Tabs Section =====
-tab1, tab2, tab3 = st.tabs(["📄 All Trades", "📈 Monthly Performance Summary", "CSV Import"])
+# A radio instead of st.tabs: st.tabs runs every tab's code (and API calls) on
+# each rerun, while only the selected view is rendered here.
+VIEWS = ["📄 All Trades", "📈 Monthly Performance Summary", "CSV Import"]
+view = st.radio("View", VIEWS, horizontal=True, label_visibility="collapsed")
 
 # ===== Tab 1: All Trades =====
-with tab1:
+if view == VIEWS[0]:
     st.subheader("📄 All Trades")
-    response = requests.get(f"{API_URL}/entries")
-    if response.status_code == 200:
-        trades = response.json()
-
-        # Apply filters
-        if not show_closed:
-            trades = [t for t in trades if t["is_open"] is True]
-        if filter_stock:
-            trades = [t for t in trades if filter_stock.lower() in t["stock"].lower()]
-        if filter_market:
-            trades = [t for t in trades if t["market"] == filter_market]
-        if filter_start_date:
-            trades = [t for t in trades if t["entry_date"] >= str(filter_start_date)]
-        if filter_end_date:
-            trades = [t for t in trades if t["entry_date"] <= str(filter_end_date)]
-
-        for t in trades:
+    # Filters are applied server-side; pages are walked with the API's keyset cursor
+    params = {"page_size": PAGE_SIZE}
+    if not show_closed:
+        params["is_open"] = True
+    if filter_stock:
+        params["stock"] = filter_stock.strip()
+    if filter_market:
+        params["market"] = filter_market
+    if filter_start_date:
+        params["entry_date_from"] = str(filter_start_date)
+    if filter_end_date:
+        params["entry_date_to"] = str(filter_end_date)
+
+    # Sorting is server-side too, so every page is a slice of one ordering of the whole journal
+    sort_col, order_col = st.columns([3, 1])
+    sort_label = sort_col.selectbox("Sort by", list(SORT_OPTIONS))
+    order = order_col.radio("Order", ["desc", "asc"], horizontal=True)
+    params["sort_by"] = SORT_OPTIONS[sort_label]
+    params["order"] = order
+
+    # Restart from the first page whenever the filters or sort change
+    filter_key = tuple(sorted(params.items()))
+    if st.session_state.get("entries_filter_key") != filter_key:
+        st.session_state.entries_filter_key = filter_key
+        st.session_state.entries_cursors = [None]
+    cursors = st.session_state.entries_cursors
+    if cursors[-1]:
+        params["cursor"] = cursors[-1]
+
+    try:
+        page = api_client.fetch_entries(params)
+    except ApiError as e:
+        st.error(f"Failed to fetch trades: {e}")
+    else:
+        trades = page["items"]
+        next_cursor = page["next_cursor"]
+
+        prev_col, page_col, next_col = st.columns([1, 2, 1])
+        if prev_col.button("◀ Previous", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+        page_col.caption(f"Page {len(cursors)}")
+        if next_col.button("Next ▶", disabled=not next_cursor):
+            cursors.append(next_cursor)
+            st.rerun()
+
+        # Open positions of this page marked to their latest EOD close
+        marks = {}
+        open_ids = [t["id"] for t in trades if t["is_open"]]
+        if open_ids:
+            try:
+                mtm = api_client.fetch_positions_mtm(ids=tuple(open_ids))
+            except ApiError as e:
+                st.warning(f"Mark-to-market unavailable: {e}")
+            else:
+                marks = {p["entry_id"]: p for p in mtm["positions"] if p["last_price"] is not None}
+
+        # One grid row per trade of the page; details and the exit form only for the selected row
+        grid_df = trades_grid_frame(trades, marks)
+        builder = GridOptionsBuilder.from_dataframe(grid_df)
+        builder.configure_default_column(sortable=False, filter=False, resizable=True)
+        builder.configure_column("id", hide=True)
+        builder.configure_selection("single")
+        grid = AgGrid(
+            grid_df,
+            gridOptions=builder.build(),
+            update_mode=GridUpdateMode.SELECTION_CHANGED,
+            height=min(600, 40 + 32 * max(len(grid_df), 1)),
+            fit_columns_on_grid_load=True,
+            key=f"trades_grid_{hash(filter_key)}_{len(cursors)}",
+        )
+        selected = grid["selected_rows"]
+        if isinstance(selected, pd.DataFrame):
+            selected = selected.to_dict("records")
+        t = next((t for t in trades if selected and t["id"] == int(selected[0]["id"])), None)
+
+        if t is None:
+            st.caption("Select a trade to see its details and record an exit.")
+        else:
             currency = "HKD" if t["market"] == "HK" else "USD"
-            header = f"{t['entry_date']} - {t['stock']} ({t['position']}) {t['remaining_qty']}/{t['qty']} - {'Open' if t['is_open'] else 'Closed'}"
-            with st.expander(header, expanded=False):
-                col1, col2, col3 = st.columns(3)
-
-                if t["exits"]:
-                    gain_pct = f"{100 * (t.get('actual_gain_loss_pct') or 0):.2f}%"
-                    pnl = f"{t.get('actual_gain_loss') or 0.0:,.2f} {currency}"
-                    holding_days = t.get('holding_days', 'N.A.')
-                else:
-                    gain_pct = pnl = holding_days = "N.A."
-
-                with col1:
-                    st.markdown(f"**Market**: {t['market']}")
-                    st.markdown(f"**Entry**: {t['entry_price']} {currency}")
-                    st.markdown(f"**Stop**: {t['stop_loss_price']} {currency}")
-                    st.markdown(f"**Target**: {t['target_price']} {currency}")
-
-                with col2:
-                    st.markdown(f"**Total Cost**: {t.get('total_cost', 0.0):,.2f} {currency}")
-                    st.markdown(f"**Expected RR**: {t.get('rr_ratio', '-')}")
-                    st.markdown(f"**Gain %**: {gain_pct}")
-                    st.markdown(f"**PnL**: {pnl}")
-
-                with col3:
-                    st.markdown(f"**Holding Days**: {holding_days}")
-                    st.markdown(f"**Qty Remaining**: {t['remaining_qty']} / {t['qty']}")
-
-                # Inline close form
-                if t["is_open"]:
-                    with st.form(f"close_form_{t['id']}"):
-                        st.markdown("**📉 Close This Position**")
-                        exit_qty = st.number_input("Exit Qty", min_value=1, value=int(t['remaining_qty']),
-                                                   max_value=t["remaining_qty"], key=f"qty_{t['id']}")
-                        exit_price = st.number_input("Exit Price", min_value=0.0, value=float(t['entry_price']),
-                                                     format="%.2f", step=1.0,
-                                                     key=f"price_{t['id']}")
-                        exit_date = st.date_input("Exit Date", value=date.today(),
-                                                  key=f"date_{t['id']}")
-                        exit_submit = st.form_submit_button("Submit Exit")
-                        if exit_submit:
-                            if exit_date < date.fromisoformat(t["entry_date"]):
-                                st.error("Exit date cannot be before entry date.")
+            st.markdown(f"#### {t['stock']} ({t['position']}) - entered {t['entry_date']}")
+            col1, col2, col3 = st.columns(3)
+
+            if t["exits"]:
+                gain_pct = f"{100 * (t.get('actual_gain_loss_pct') or 0):.2f}%"
+                pnl = f"{t.get('actual_gain_loss') or 0.0:,.2f} {currency}"
+                holding_days = t.get('holding_days', 'N.A.')
+            else:
+                gain_pct = pnl = holding_days = "N.A."
+
+            with col1:
+                st.markdown(f"**Market**: {t['market']}")
+                st.markdown(f"**Entry**: {t['entry_price']} {currency}")
+                st.markdown(f"**Stop**: {t['stop_loss_price']} {currency}")
+                st.markdown(f"**Target**: {t['target_price']} {currency}")
+
+            with col2:
+                st.markdown(f"**Total Cost**: {t.get('total_cost', 0.0):,.2f} {currency}")
+                st.markdown(f"**Expected RR**: {t.get('rr_ratio', '-')}")
+                st.markdown(f"**Gain %**: {gain_pct}")
+                st.markdown(f"**PnL**: {pnl}")
+
+            with col3:
+                st.markdown(f"**Holding Days**: {holding_days}")
+                st.markdown(f"**Qty Remaining**: {t['remaining_qty']} / {t['qty']}")
+                mark = marks.get(t["id"])
+                if mark:
+                    st.markdown(f"**Last Close**: {mark['last_price']:,.2f} {currency} ({mark['price_date']})")
+                    st.markdown(f"**Unrealized**: {mark['unrealized_pnl']:,.2f} {currency} "
+                                f"({mark['unrealized_pnl_pct']:.2%})")
+                    if mark["stop_distance_pct"] is not None:
+                        st.markdown(f"**To Stop**: {mark['stop_distance_pct']:.2%}")
+
+            # Close form for the selected position
+            if t["is_open"]:
+                with st.form("close_form"):
+                    st.markdown("**📉 Close This Position**")
+                    exit_qty = st.number_input("Exit Qty", min_value=1, value=int(t['remaining_qty']),
+                                               max_value=t["remaining_qty"], key=f"qty_{t['id']}")
+                    exit_price = st.number_input("Exit Price", min_value=0.0, value=float(t['entry_price']),
+                                                 format="%.2f", step=1.0,
+                                                 key=f"price_{t['id']}")
+                    exit_date = st.date_input("Exit Date", value=date.today(),
+                                              key=f"date_{t['id']}")
+                    exit_submit = st.form_submit_button("Submit Exit")
+                    if exit_submit:
+                        if exit_date < date.fromisoformat(t["entry_date"]):
+                            st.error("Exit date cannot be before entry date.")
+                        else:
+                            exit_data = {
+                                "entry_id": t["id"],
+                                "exit_qty": exit_qty,
+                                "exit_price": exit_price,
+                                "exit_date": str(exit_date)
+                            }
+                            try:
+                                api_client.create_exit(exit_data)
+                            except ApiError as e:
+                                st.error(f"Failed to add exit: {e}")
                             else:
-                                exit_data = {
-                                    "entry_id": t["id"],
-                                    "exit_qty": exit_qty,
-                                    "exit_price": exit_price,
-                                    "exit_date": str(exit_date)
-                                }
-                                r = requests.post(f"{API_URL}/exits", json=exit_data)
-                                if r.status_code == 200:
-                                    st.success("Exit recorded!")
-                                    st.rerun()
-                                else:
-                                    st.error(r.json().get("detail", "Failed to add exit"))
-
-                if t["exits"]:
-                    st.markdown("### 📜 Exit History")
-                    for e in t["exits"]:
-                        st.markdown(f"- {e['exit_qty']} @ {e['exit_price']} on {e['exit_date']}")
+                                st.success("Exit recorded!")
+                                st.rerun()
+
+            if t["exits"]:
+                st.markdown("### 📜 Exit History")
+                for e in t["exits"]:
+                    st.markdown(f"- {e['exit_qty']} @ {e['exit_price']} on {e['exit_date']}")
 
     # ========== Add Trade Entry ==========
     st.subheader("➕ Add Trade Entry")
@@ -172,22 +300,46 @@ with tab1:
                     "stop_loss_price": stop_loss,
                     "target_price": target_price
                 }
-                resp = requests.post(f"{API_URL}/entries", json=new_trade)
-                if resp.status_code == 200:
+                try:
+                    api_client.create_entry(new_trade)
+                except ApiError as e:
+                    st.error(f"Failed to add trade: {e}")
+                else:
                     st.success("Trade entry added!")
                     st.rerun()
-                else:
-                    st.error(f"Failed to add trade: {resp.text}")
 
 # ===== Tab 2: Monthly Performance =====
-with tab2:
+elif view == VIEWS[1]:
     st.subheader("Monthly Performance Summary")
 
-    response_closed = requests.get(f"{API_URL}/entries/closed")
-    if response_closed.status_code == 200:
-        closed_trades = response_closed.json()
-        monthly_df = generate_monthly_summary(closed_trades)
+    monthly_df = None
+    snapshot_version = None
+    if settings.snapshot_dir:
+        import snapshot
+        snapshot_version = snapshot.read_manifest(settings.snapshot_dir)["journal_version"] or None
+
+    if snapshot_version:
+        # Same host as the API: memory-map the columnar snapshot instead of querying the database
+        monthly_df = (
+            load_snapshot_summary(settings.snapshot_dir, filter_market, snapshot_version)
+            .rename(columns=MONTHLY_SUMMARY_LABELS)
+            .astype(float)
+        )
+    else:
+        # Aggregated by the API in SQL: one row per month, not one per trade/exit
+        try:
+            summary_rows = api_client.fetch_monthly_summary(filter_market or None)
+        except ApiError as e:
+            st.error(f"Failed to fetch monthly summary: {e}")
+        else:
+            monthly_df = (
+                pd.DataFrame(summary_rows, columns=["month", *MONTHLY_SUMMARY_LABELS])
+                .set_index("month")
+                .rename(columns=MONTHLY_SUMMARY_LABELS)
+                .astype(float)
+            )
 
+    if monthly_df is not None:
         # Set Period index and get available years
         monthly_df.index = pd.PeriodIndex(monthly_df.index, freq="M")
         available_years = sorted(list(set([m.year for m in monthly_df.index])))
@@ -289,55 +441,112 @@ with tab2:
 
         else:
             st.info("No data for selected year.")
+
+    st.subheader("📉 Equity Curve & Drawdown")
+    granularity = st.radio("Granularity", ["day", "week"], horizontal=True, key="equity_granularity")
+    try:
+        curve = api_client.fetch_equity_curve(granularity, filter_market or None)
+    except ApiError as e:
+        st.error(f"Failed to fetch equity curve: {e}")
     else:
-        st.error("Failed to fetch closed trades for summary.")
+        if curve["points"]:
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Realized PnL (HKD)", f"{curve['total_pnl']:,.0f}")
+            col2.metric("Max Drawdown (HKD)", f"{curve['max_drawdown']:,.0f}")
+            col3.metric("Longest Drawdown", f"{curve['max_drawdown_duration_days']} days")
+
+            # Vega-Lite charts draw thousands of points client-side far faster than matplotlib figures
+            points = pd.DataFrame(curve["points"]).set_index("date")
+            points.index = pd.to_datetime(points.index)
+            st.line_chart(points[["equity", "peak"]], height=300)
+            st.area_chart(points[["drawdown"]], height=180, color="#d62728")
+        else:
+            st.info("No exits yet.")
+
+    st.subheader("🏆 Performance Breakdown")
+    col1, col2, col3 = st.columns(3)
+    breakdown_by = col1.radio("By", ["symbol", "market"], horizontal=True, key="breakdown_by")
+    breakdown_sort = col2.selectbox("Rank by", list(BREAKDOWN_SORTS), key="breakdown_sort")
+    breakdown_order = col3.radio("Order", ["desc", "asc"], format_func={"desc": "Top", "asc": "Bottom"}.get,
+                                 horizontal=True, key="breakdown_order")
+    try:
+        breakdown = api_client.fetch_performance_breakdown(breakdown_by, filter_market or None,
+                                                           BREAKDOWN_SORTS[breakdown_sort], breakdown_order)
+    except ApiError as e:
+        st.error(f"Failed to fetch performance breakdown: {e}")
+    else:
+        if breakdown:
+            table = pd.DataFrame(breakdown)
+            if breakdown_by == "market":
+                table = table.drop(columns="stock")
+            st.dataframe(table, hide_index=True, use_container_width=True, column_config={
+                "win_rate": st.column_config.NumberColumn("Win Rate", format="percent"),
+                "avg_r_multiple": st.column_config.NumberColumn("Avg R", format="%.2f"),
+                "profit_factor": st.column_config.NumberColumn("Profit Factor", format="%.2f"),
+            })
+        else:
+            st.info("No closed trades yet.")
+
+    st.subheader("🎲 Monte Carlo Simulation")
+    col1, col2, col3 = st.columns(3)
+    sim_paths = col1.select_slider("Paths", [1_000, 10_000, 100_000], value=10_000, key="sim_paths")
+    sim_trades = col2.number_input("Trades per path", 10, 10_000, 500, step=100, key="sim_trades")
+    sim_fractions = col3.multiselect("Risk per trade", [0.0025, 0.005, 0.01, 0.02, 0.05], [0.005, 0.01, 0.02],
+                                     format_func="{:.2%}".format, key="sim_fractions")
+    if sim_fractions and st.button("Run simulation"):
+        try:
+            result = api_client.fetch_simulation(filter_market or None, tuple(sim_fractions), sim_paths, sim_trades)
+        except ApiError as e:
+            st.error(f"Simulation failed: {e}")
+        else:
+            st.dataframe(pd.DataFrame([{
+                "risk per trade": o["fraction"],
+                "median final PnL": o["final_pnl"]["p50"],
+                "5th pct final PnL": o["final_pnl"]["p5"],
+                "median max drawdown": o["max_drawdown"]["p50"],
+                "95th pct max drawdown": o["max_drawdown"]["p95"],
+                "risk of ruin": o["risk_of_ruin"],
+            } for o in result["outcomes"]]), hide_index=True, use_container_width=True, column_config={
+                name: st.column_config.NumberColumn(name, format="percent")
+                for name in ("risk per trade", "median max drawdown", "95th pct max drawdown", "risk of ruin")
+            })
+            st.caption(f"{result['sample_trades']} closed trades with a stop resampled; seed {result['seed']}; "
+                       f"ruin = losing {result['ruin_level']:.0%} of {result['starting_capital']:,.0f}.")
 
 # ===== Tab 3: CSV Import =====
-with tab3:
+else:
     st.subheader("📥 Import Trades from CSV")
     uploaded_file = st.file_uploader("Upload a CSV file with trade entries and exits", type="csv")
     if uploaded_file is not None:
-        df = pd.read_csv(uploaded_file)
+        df = pd.read_csv(uploaded_file, dtype={"Stock": str})
         st.write("Preview:", df.head())
 
         if st.button("Import to Database"):
-            success, failed = 0, 0
-            for i, row in df.iterrows():
-                try:
-                    # Parse entry data
-                    entry = {
-                        "stock": row["Stock"],
-                        "market": row["Market"],
-                        "position": row["Position"],
-                        "entry_date": pd.to_datetime(row["Entry Date"], dayfirst=True).date().isoformat(),
-                        "entry_price": float(row["Entry Price"]),
-                        "qty": int(row["Qty"]),
-                        "stop_loss_price": float(row["Stop Loss Price"]) if pd.notna(row["Stop Loss Price"]) else None,
-                        "target_price": float(row["Target Price"]) if pd.notna(row["Target Price"]) else None
-                    }
-                    r = requests.post(f"{API_URL}/entries", json=entry)
-                    if r.status_code == 200:
-                        success += 1
-                        entry_id = r.json().get("id")
-
-                        # Handle exit if present
-                        if pd.notna(row.get("Exit Price")) and pd.notna(row.get("Exit Date")):
-                            exit_data = {
-                                "entry_id": entry_id,
-                                "exit_price": float(row["Exit Price"]),
-                                "exit_qty": int(row["Qty"]),
-                                "exit_date": pd.to_datetime(row["Exit Date"], dayfirst=True).date(
-
-                                ).isoformat()
-                            }
-                            rex = requests.post(f"{API_URL}/exits", json=exit_data)
-                            if rex.status_code != 200:
-                                st.warning(f"❌ Exit failed for row {i+2}: {rex.json().get('detail', 'Unknown error')}")
-                    else:
-                        failed += 1
-                        st.warning(f"❌ Row {i+2} failed: {r.json().get('detail', 'Unknown error')}")
-                except Exception as e:
-                    failed += 1
-                    st.warning(f"❌ Row {i+2} failed: {e}")
-
-            st.success(f"Imported {success} entries, Failed: {failed}")
\ No newline at end of file
+            # Map the broker export onto the API's import columns in one vectorized pass
+            payload = pd.DataFrame({
+                "stock": df["Stock"],
+                "market": df["Market"],
+                "position": df["Position"],
+                "entry_date": pd.to_datetime(df["Entry Date"], dayfirst=True, errors="coerce").dt.strftime("%Y-%m-%d"),
+                "entry_price": df["Entry Price"],
+                "qty": df["Qty"],
+                "stop_loss_price": df["Stop Loss Price"],
+                "target_price": df["Target Price"],
+            })
+            if {"Exit Price", "Exit Date"} <= set(df.columns):
+                has_exit = df["Exit Price"].notna() & df["Exit Date"].notna()
+                payload["exit_date"] = pd.to_datetime(df["Exit Date"], dayfirst=True,
+                                                      errors="coerce").dt.strftime("%Y-%m-%d").where(has_exit)
+                payload["exit_price"] = df["Exit Price"].where(has_exit)
+                payload["exit_qty"] = df["Qty"].where(has_exit).astype("Int64")
+
+            try:
+                result = api_client.import_trades_csv(payload.to_csv(index=False).encode("utf-8"))
+            except ApiError as e:
+                st.error(f"Import failed: {e}")
+            else:
+                st.success(f"Imported {result['entries_created']} entries and {result['exits_created']} exits, "
+                           f"Failed: {len(result['errors'])}")
+                if result["errors"]:
+                    st.warning("Some rows were not imported:")
+                    st.dataframe(pd.DataFrame(result["errors"]), use_container_width=True)
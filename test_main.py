@@ -1,10 +1,18 @@
 # test_main.py
+from contextlib import contextmanager
+from datetime import date, timezone
+from decimal import Decimal
+
+import pandas as pd
+import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker
 
-from database import Base
+import crud, instrumentation
+from database import DB_ASYNC, Base, to_async_url
 from main import app, get_db
+from utils import MONTHLY_SUMMARY_LABELS, generate_monthly_summary
 
 # Use a test database (SQLite in-memory)
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -12,20 +20,47 @@ SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# Create test DB schema
+# Create a fresh test DB schema
+Base.metadata.drop_all(bind=engine)
 Base.metadata.create_all(bind=engine)
 
-# Override DB dependency
-def override_get_db():
-    db = TestingSessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Override DB dependency; DB_ASYNC=1 runs the same tests against the async engine
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(to_async_url(SQLALCHEMY_DATABASE_URL))
+    TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+else:
+    def override_get_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
 
 app.dependency_overrides[get_db] = override_get_db
+instrumentation.instrument_engine(async_engine.sync_engine if DB_ASYNC else engine, "test")
 client = TestClient(app)
 
+@contextmanager
+def count_queries():
+    """Collect every SQL statement sent to the test engine inside the block."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    target = async_engine.sync_engine if DB_ASYNC else engine
+    event.listen(target, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(target, "before_cursor_execute", before_cursor_execute)
+
 def test_create_entry():
     response = client.post("/entries", json={
         "stock": "9988",
@@ -76,3 +111,915 @@ def test_final_exit_closes_entry():
     assert entry["is_open"] is False
     assert len(entry["exits"]) == 2
 
+
+def test_bulk_import_csv():
+    body = (
+        "stock,market,position,entry_date,entry_price,qty,stop_loss_price,target_price,exit_date,exit_price,exit_qty\n"
+        "0700,HK,Long,2024-02-01,300.00,100,280.00,340.00,2024-02-20,320.00,100\n"
+        "AAPL,US,Short,2024-02-05,190.00,10,,,,,\n"
+        "TSLA,US,Sideways,2024-02-06,200.00,5,,,,,\n"
+        "NVDA,US,Long,2024-02-07,500.00,5,,,2024-02-08,550.00,10\n"
+        "AMD,US,Long,2024-02-07,100.00,5,,,2024-02-08,110.00,0\n"
+    )
+    response = client.post("/entries/bulk", content=body, headers={"Content-Type": "text/csv"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["entries_created"] == 2
+    assert data["exits_created"] == 1
+    assert [e["row"] for e in data["errors"]] == [4, 5, 6]
+    assert data["errors"][1]["detail"] == "Exit quantity exceeds remaining position"
+    assert data["errors"][2]["detail"] == "Exit quantity must be positive"
+
+    stocks = {e["stock"]: e for e in client.get("/entries").json()}
+    assert stocks["0700"]["is_open"] is False
+    assert stocks["0700"]["remaining_qty"] == 0
+    assert stocks["AAPL"]["is_open"] is True
+    assert "TSLA" not in stocks
+
+def test_bulk_import_csv_quoted_fields_span_lines():
+    body = (
+        "stock,market,position,entry_date,entry_price,qty\r\n"
+        '"QF,1",US,Long,2024-02-01,"100.00",10\r\n'
+        'QF2,US,Long,2024-02-02,"100\r\n'
+        '.00",10\r\n'
+        "QF3,US,Sideways,2024-02-03,1.00,1\r\n"
+        "QF4,US,Long,2024-02-04,1.00,1"
+    )
+    # Small chunks split records (and the quoted field) across reads
+    chunks = [body.encode()[i:i + 7] for i in range(0, len(body), 7)]
+    response = client.post("/entries/bulk", content=iter(chunks), headers={"Content-Type": "text/csv"})
+    data = response.json()
+    assert data["entries_created"] == 2
+    assert [e["row"] for e in data["errors"]] == [3, 5]  # a record is numbered by its first line
+    stocks = {e["stock"] for e in client.get("/entries").json()}
+    assert {"QF,1", "QF4"} <= stocks
+
+def test_bulk_import_ndjson_partial_exit():
+    body = "\n".join([
+        '{"stock": "3690", "market": "HK", "position": "Long", "entry_date": "2024-03-01", '
+        '"entry_price": 80.0, "qty": 200, "exit_date": "2024-03-05", "exit_price": 90.0, "exit_qty": 50}',
+        'not json',
+    ])
+    response = client.post("/entries/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["entries_created"] == 1
+    assert data["exits_created"] == 1
+    assert data["errors"][0]["row"] == 2
+
+    entry = next(e for e in client.get("/entries").json() if e["stock"] == "3690")
+    assert entry["remaining_qty"] == 150
+    assert entry["is_open"] is True
+
+# Max SQL statements per read route, independent of how many entries/exits exist
+# (each includes the journal version lookup behind the conditional-GET headers)
+QUERY_BUDGET = {
+    "/entries": 3,
+    "/entries/closed": 3,
+    "/entries/1": 2,
+}
+
+def test_listing_routes_stay_within_query_budget():
+    body = "\n".join(
+        f'{{"stock": "B{i}", "market": "US", "position": "Long", "entry_date": "2024-04-0{i}", '
+        f'"entry_price": 10.0, "qty": 10, "exit_date": "2024-04-20", "exit_price": 12.0}}'
+        for i in range(1, 8)
+    )
+    client.post("/entries/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+
+    for path, budget in QUERY_BUDGET.items():
+        with count_queries() as statements:
+            response = client.get(path)
+        assert response.status_code == 200
+        assert len(statements) <= budget, f"{path} issued {len(statements)} queries: {statements}"
+
+def test_entry_rows_are_derived_and_encoded_off_the_event_loop(monkeypatch):
+    import asyncio
+    import main
+
+    on_loop, derived_rows = [], main.derived_rows
+
+    def recording(*args, **kwargs):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        return derived_rows(*args, **kwargs)
+
+    monkeypatch.setattr(main, "derived_rows", recording)
+    for path in ("/entries", "/entries/closed", "/entries/1"):
+        assert client.get(path).status_code == 200
+    assert on_loop == [False, False, False]
+
+def test_entries_without_exits_use_persisted_aggregates():
+    with_exits = {e["id"]: e for e in client.get("/entries/closed").json()}
+    with count_queries() as statements:
+        response = client.get("/entries/closed", params={"include_exits": False})
+    assert len(statements) == 2  # journal version + entries
+
+    for entry in response.json():
+        expected = with_exits[entry["id"]]
+        assert entry["exits"] == []
+        assert entry["actual_gain_loss"] == expected["actual_gain_loss"]
+        assert entry["holding_days"] == expected["holding_days"]
+
+def test_rebuild_position_aggregates():
+    db = TestingSessionLocal()
+    try:
+        entry = crud.get_entry(db, 1)
+        entry.realized_pnl = 0
+        entry.exited_qty = 0
+        entry.last_exit_date = None
+        db.commit()
+
+        crud.rebuild_position_aggregates(db)
+        entry = crud.get_entry(db, 1)
+        assert entry.exited_qty == 1000
+        assert entry.realized_pnl == Decimal("15000.00")
+        assert entry.realized_pnl_hkd == Decimal("15000.00")
+        assert entry.avg_exit_price == Decimal("115.0000")
+        assert entry.last_exit_date == date(2024, 1, 15)
+        assert entry.remaining_qty == 0
+    finally:
+        db.close()
+
+def test_entries_filters_and_keyset_pagination():
+    body = "\n".join(
+        f'{{"stock": "PG{i}", "market": "{"US" if i % 2 else "HK"}", "position": "Long", '
+        f'"entry_date": "2023-05-{1 + i // 2:02d}", "entry_price": 10.0, "qty": 10}}'
+        for i in range(7)
+    )
+    client.post("/entries/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+
+    seen, cursor = [], None
+    while True:
+        params = {"stock": "PG", "page_size": 3}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/entries", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) <= 3
+        seen.extend(page)
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert sorted(e["stock"] for e in seen) == [f"PG{i}" for i in range(7)]
+    keys = [(e["entry_date"], e["id"]) for e in seen]
+    assert keys == sorted(keys, reverse=True)
+
+    us = client.get("/entries", params={"stock": "PG", "market": "US"}).json()
+    assert {e["stock"] for e in us} == {"PG1", "PG3", "PG5"}
+    in_range = client.get("/entries", params={
+        "stock": "PG", "entry_date_from": "2023-05-02", "entry_date_to": "2023-05-03"}).json()
+    assert {e["stock"] for e in in_range} == {"PG2", "PG3", "PG4", "PG5"}
+    assert client.get("/entries", params={"stock": "PG", "is_open": False}).json() == []
+    assert client.get("/entries", params={"cursor": "garbage"}).status_code == 400
+
+def test_entries_sorted_pages_walk_the_whole_ordering():
+    for sort_by, order in [("entry_price", "asc"), ("stock", "desc"), ("remaining_qty", "asc")]:
+        seen, cursor = [], None
+        while True:
+            params = {"page_size": 4, "sort_by": sort_by, "order": order, "include_exits": False}
+            if cursor:
+                params["cursor"] = cursor
+            response = client.get("/entries", params=params)
+            assert response.status_code == 200
+            seen.extend(response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+
+        cast = float if sort_by == "entry_price" else (lambda v: v)
+        keys = [(cast(e[sort_by]), e["id"]) for e in seen]
+        assert keys == sorted(keys, reverse=order == "desc")
+        assert len(seen) == len({e["id"] for e in seen}) == len(client.get(
+            "/entries", params={"page_size": 1000, "include_exits": False}).json())
+
+    assert client.get("/entries", params={"sort_by": "entry_price", "cursor": "abc_1"}).status_code == 400
+    assert client.get("/entries", params={"sort_by": "exits"}).status_code == 422
+
+def test_entries_cursor_is_header_safe_for_non_latin_stocks():
+    for i in range(3):
+        client.post("/entries", json={"stock": f"騰訊{i}", "market": "HK", "position": "Long",
+                                      "entry_date": "2030-08-01", "entry_price": 10.0, "qty": 10})
+    first = client.get("/entries", params={"stock": "騰訊", "sort_by": "stock", "order": "asc", "page_size": 2})
+    assert first.status_code == 200
+    cursor = first.headers["X-Next-Cursor"]
+    assert cursor.isascii()
+    rest = client.get("/entries", params={"stock": "騰訊", "sort_by": "stock", "order": "asc", "cursor": cursor})
+    assert [e["stock"] for e in first.json() + rest.json()] == ["騰訊0", "騰訊1", "騰訊2"]
+
+def test_monthly_summary_from_sql():
+    body = "\n".join([
+        '{"stock": "M1", "market": "TS", "position": "Long", "entry_date": "2022-01-03", "entry_price": 100.0, '
+        '"qty": 10, "exit_date": "2022-01-10", "exit_price": 110.0, "exit_qty": 4}',
+        '{"stock": "M2", "market": "TS", "position": "Short", "entry_date": "2022-01-05", "entry_price": 50.0, '
+        '"qty": 20, "exit_date": "2022-01-20", "exit_price": 45.0}',
+        '{"stock": "M3", "market": "TS", "position": "Long", "entry_date": "2022-02-01", "entry_price": 10.0, '
+        '"qty": 100, "exit_date": "2022-02-11", "exit_price": 12.0}',
+    ])
+    client.post("/entries/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+    m1 = next(e for e in client.get("/entries", params={"stock": "M1"}).json())
+    client.post("/exits", json={"entry_id": m1["id"], "exit_date": "2022-02-07", "exit_price": 95.0, "exit_qty": 6})
+
+    jan, feb = client.get("/summary/monthly", params={"market": "TS"}).json()
+
+    # Jan: M1 partial exit +40 (10%, 7 days), M2 +100 (10%, 15 days)
+    assert jan["month"] == "2022-01"
+    assert (jan["winning_trades"], jan["losing_trades"]) == (2, 0)
+    assert jan["win_rate"] == 1.0
+    assert jan["avg_gain"] == pytest.approx(70.0)
+    assert jan["avg_gain_pct"] == pytest.approx(0.10)
+    assert jan["avg_loss"] is None
+    assert jan["actual_rr_ratio"] is None
+    assert (jan["largest_gain"], jan["largest_loss"]) == (pytest.approx(100.0), pytest.approx(40.0))
+    assert jan["avg_holding_days_win"] == pytest.approx(11.0)
+
+    # Feb: M1 final exit -30 (-5%, 35 days), M3 +200 (20%, 10 days)
+    assert feb["month"] == "2022-02"
+    assert (feb["winning_trades"], feb["losing_trades"]) == (1, 1)
+    assert feb["win_rate"] == 0.5
+    assert feb["avg_loss"] == pytest.approx(-30.0)
+    assert feb["avg_loss_pct"] == pytest.approx(-0.05)
+    assert feb["actual_rr_ratio"] == pytest.approx(200 / 30)
+    assert feb["largest_loss"] == pytest.approx(-30.0)
+    assert feb["avg_holding_days_loss"] == pytest.approx(35.0)
+
+    assert client.get("/summary/monthly", params={"market": "TS", "year": 2021}).json() == []
+
+def test_monthly_summary_sql_matches_pandas_engine():
+    closed = client.get("/entries/closed").json()
+    expected = generate_monthly_summary([t for t in closed if t["market"] == "TS"])
+    rows = client.get("/summary/monthly", params={"market": "TS"}).json()
+
+    assert [pd.Period(r["month"]).strftime("%b %Y") for r in rows] == list(expected.index)
+    for row, (_, labelled) in zip(rows, expected.iterrows()):
+        for field, label in MONTHLY_SUMMARY_LABELS.items():
+            if row[field] is None:
+                assert pd.isna(labelled[label]), field
+            else:
+                assert row[field] == pytest.approx(labelled[label]), field
+
+def _assert_summary_matches_sql(summary, rows):
+    assert [str(period) for period in summary.index] == [r["month"] for r in rows]
+    for row, (_, month) in zip(rows, summary.iterrows()):
+        for field in MONTHLY_SUMMARY_LABELS:
+            if row[field] is None:
+                assert pd.isna(month[field]), field
+            else:
+                assert row[field] == pytest.approx(month[field]), field
+
+def test_snapshot_refreshes_incrementally_and_matches_sql_summary(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    import snapshot
+
+    db = TestingSessionLocal()
+    try:
+        first = snapshot.refresh(db, str(tmp_path))
+        assert len(first["segments"]["exits"]) == 1
+        _assert_summary_matches_sql(snapshot.monthly_summary(str(tmp_path), market="TS"),
+                                    client.get("/summary/monthly", params={"market": "TS"}).json())
+
+        # Close a new trade: only the new exit and the touched entry are appended
+        entry_id = client.post("/entries", json={
+            "stock": "SNAP", "market": "TS", "position": "Short", "entry_date": "2024-03-01",
+            "entry_price": 20.0, "qty": 5,
+        }).json()["id"]
+        client.post("/exits", json={"entry_id": entry_id, "exit_date": "2024-03-20", "exit_price": 18.0, "exit_qty": 5})
+        second = snapshot.refresh(db, str(tmp_path))
+        assert len(second["segments"]["exits"]) == 2
+        new_exits = snapshot.read_exits(str(tmp_path), ["exit_id", "entry_id", "pnl"])
+        assert new_exits["exit_id"].is_unique
+        assert new_exits.loc[new_exits["entry_id"] == entry_id, "pnl"].tolist() == [10.0]
+
+        entries = snapshot.read_entries(str(tmp_path), ["is_open", "realized_pnl"])
+        assert entries["id"].is_unique
+        assert entries.set_index("id").loc[entry_id, "is_open"] == False  # noqa: E712
+        _assert_summary_matches_sql(snapshot.monthly_summary(str(tmp_path), market="TS"),
+                                    client.get("/summary/monthly", params={"market": "TS"}).json())
+
+        # Compaction and rebuild keep the same content
+        monkeypatch.setattr(snapshot, "MAX_SEGMENTS", 1)
+        compacted = snapshot.refresh(db, str(tmp_path))
+        assert len(compacted["segments"]["exits"]) == 1
+        assert snapshot.read_exits(str(tmp_path))["exit_id"].tolist() == new_exits["exit_id"].tolist()
+        rebuilt = snapshot.refresh(db, str(tmp_path), rebuild=True)
+        assert sorted(p.name for p in tmp_path.glob("*.arrow")) == sorted(
+            rebuilt["segments"]["exits"] + rebuilt["segments"]["entries"])
+    finally:
+        db.close()
+
+def test_snapshot_picks_up_rows_committed_below_its_watermarks(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    from datetime import datetime, timedelta
+    import models, snapshot
+
+    db = TestingSessionLocal()
+    try:
+        entry_id = client.post("/entries", json={
+            "stock": "LATE", "market": "LT", "position": "Long", "entry_date": "2024-04-01",
+            "entry_price": 10.0, "qty": 10,
+        }).json()["id"]
+        last_id = snapshot.refresh(db, str(tmp_path))["exit_id"]
+
+        # Exit ids last_id + 1 and + 2 are taken; + 2 commits first
+        def add_exit(exit_id, qty):
+            db.add(models.TradeExit(id=exit_id, entry_id=entry_id, exit_date=date(2024, 4, 2),
+                                    exit_price=Decimal("11.00"), exit_qty=qty))
+            db.commit()
+
+        add_exit(last_id + 2, 4)
+        manifest = snapshot.refresh(db, str(tmp_path))
+        assert manifest["exit_id"] == last_id + 2 and [g[0] for g in manifest["exit_gaps"]] == [last_id + 1]
+        add_exit(last_id + 1, 6)
+        manifest = snapshot.refresh(db, str(tmp_path))
+        assert manifest["exit_gaps"] == []
+        exits = snapshot.read_exits(str(tmp_path), ["exit_id"])["exit_id"]
+        assert {last_id + 1, last_id + 2} <= set(exits) and exits.is_unique
+
+        # An entry update stamped before the last refresh (a slow transaction) is still read
+        stamped = datetime.fromisoformat(manifest["entries_updated_at"]) - timedelta(seconds=30)
+        db.query(models.TradeEntry).filter(models.TradeEntry.id == entry_id).update(
+            {"remaining_qty": 0, "is_open": False, "updated_at": stamped})
+        db.commit()
+        snapshot.refresh(db, str(tmp_path))
+        assert snapshot.read_entries(str(tmp_path), ["is_open"]).set_index("id").loc[entry_id, "is_open"] == False  # noqa: E712
+
+        # Arrow types follow the column names, not their position in the model
+        schema = snapshot._schema("entries")
+        assert schema.field("updated_at").type == pa.timestamp("s") and schema.field("is_open").type == pa.bool_()
+    finally:
+        db.close()
+
+def test_conditional_get_uses_journal_version(monkeypatch):
+    import models
+    from datetime import timedelta
+
+    utcnow = models.utcnow
+    monkeypatch.setattr(models, "utcnow", lambda: utcnow() + timedelta(seconds=2))  # the last write's second is over
+    first = client.get("/entries")
+    etag = first.headers["ETag"]
+    assert "Last-Modified" in first.headers
+
+    with count_queries() as statements:
+        cached = client.get("/entries", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert len(statements) == 1  # only the journal version lookup
+
+    since = client.get("/summary/monthly", headers={"If-Modified-Since": first.headers["Last-Modified"]})
+    assert since.status_code == 304
+
+    client.post("/entries", json={
+        "stock": "ETAG", "market": "HK", "position": "Long", "entry_date": "2024-06-01",
+        "entry_price": 10.0, "qty": 10,
+    })
+    refreshed = client.get("/entries", headers={"If-None-Match": etag})
+    assert refreshed.status_code == 200
+    assert refreshed.headers["ETag"] != etag
+
+def test_last_modified_is_withheld_while_its_second_can_still_change(monkeypatch):
+    import models
+    from datetime import datetime, timedelta
+    from email.utils import format_datetime
+
+    clock = [datetime(2031, 1, 1, 12, 0, 0)]
+    monkeypatch.setattr(models, "utcnow", lambda: clock[0])
+    second = format_datetime(clock[0].replace(tzinfo=timezone.utc), usegmt=True)
+
+    def write(stock):
+        client.post("/entries", json={"stock": stock, "market": "HK", "position": "Long",
+                                      "entry_date": "2031-01-01", "entry_price": 10.0, "qty": 10})
+
+    # Two writes in the same second: a copy fetched between them must not revalidate
+    write("LM1")
+    assert "Last-Modified" not in client.get("/entries").headers
+    write("LM2")
+    stale = client.get("/entries", params={"stock": "LM"}, headers={"If-Modified-Since": second})
+    assert stale.status_code == 200 and len(stale.json()) == 2
+
+    clock[0] += timedelta(seconds=1)
+    current = client.get("/entries")
+    assert current.headers["Last-Modified"] == second
+    assert client.get("/entries", headers={"If-Modified-Since": second}).status_code == 304
+    write("LM3")
+    assert client.get("/entries", headers={"If-Modified-Since": second}).status_code == 200
+
+def test_db_stats_report_pool_and_statement_metrics():
+    client.get("/entries")
+    stats = client.get("/stats/db", params={"top": 5}).json()
+
+    pool = stats["pools"]["test"]
+    assert pool["checkouts"] >= 1
+    assert pool["checked_out"] == 0  # every request returned its connection
+    assert pool["peak_checked_out"] >= 1
+
+    statements = stats["statements"]["test"]
+    assert 1 <= len(statements) <= 5
+    assert all(s["count"] >= 1 and s["total_seconds"] >= s["max_seconds"] for s in statements)
+    assert any("trade_entries" in s["statement"] for s in statements)
+
+def test_failed_statements_leave_no_timing_state_on_the_connection(tmp_path):
+    from sqlalchemy.exc import OperationalError
+
+    failing = create_engine(f"sqlite:///{tmp_path}/failing.db")
+    instrumentation.instrument_engine(failing, "failing")
+    with failing.connect() as connection:
+        info = dict(connection.info)
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                connection.execute(text("SELECT * FROM missing_table"))
+        connection.execute(text("SELECT 1"))
+        assert connection.info == info  # nothing accumulates on the pooled connection
+
+    (statement,) = instrumentation.snapshot()["statements"]["failing"]
+    assert statement["statement"] == "SELECT 1" and statement["count"] == 1
+
+def test_metrics_exposes_route_histograms_and_sql_breakdown():
+    client.get("/entries", params={"page_size": 5})
+    client.get("/entries/999999")
+    generate_monthly_summary([])
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+
+    def sample(prefix):
+        return next(float(line.rsplit(" ", 1)[1]) for line in lines if line.startswith(prefix))
+
+    assert sample('http_requests_total{route="/entries/{entry_id}",method="GET",status="404"}') >= 1
+    assert sample('http_request_duration_seconds_count{route="/entries",method="GET"}') >= 1
+    assert sample('http_request_duration_seconds_bucket{route="/entries",method="GET",le="+Inf"}') >= 1
+    # version lookup + page query + selectin exits for at least one request
+    assert sample('http_request_sql_statements_sum{route="/entries",method="GET"}') >= 3
+    assert sample('http_request_sql_seconds_sum{route="/entries",method="GET"}') > 0
+    assert sample('span_duration_seconds_count{span="compute_derived_fields"}') >= 1
+    assert sample('span_duration_seconds_count{span="generate_monthly_summary"}') >= 1
+    assert sample('db_pool_checkouts_total{engine="test"}') >= 1
+
+def _export_lines(response):
+    return [line for line in response.text.splitlines() if line]
+
+def test_export_streams_entries_with_exits_and_watermark():
+    import csv, io, json
+
+    for stock in ("EXA", "EXB"):
+        entry_id = client.post("/entries", json={
+            "stock": stock, "market": "US", "position": "Long", "entry_date": "2024-07-01",
+            "entry_price": 10.0, "qty": 10,
+        }).json()["id"]
+    client.post("/exits", json={"entry_id": entry_id, "exit_date": "2024-07-05", "exit_price": 12.0, "exit_qty": 4})
+
+    response = client.get("/export", params={"stock": "EX"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in _export_lines(response)]
+    assert [r["stock"] for r in rows] == ["EXA", "EXB"]
+    assert rows[1]["exits"][0]["exit_qty"] == 4
+    assert rows[1]["actual_gain_loss"] == pytest.approx(8 * 7.78)
+    assert rows[1]["remaining_qty"] == 6
+
+    # Everything in the journal, one record per entry however many exits it has
+    full = _export_lines(client.get("/export"))
+    assert len(full) == len({json.loads(line)["id"] for line in full})
+
+    as_csv = client.get("/export", params={"stock": "EX", "format": "csv"})
+    assert as_csv.headers["content-type"].startswith("text/csv")
+    records = list(csv.DictReader(io.StringIO(as_csv.text)))
+    assert [r["stock"] for r in records] == ["EXA", "EXB"]
+    assert json.loads(records[1]["exits"])[0]["exit_price"] == "12.00"
+
+    # The watermark lags the export's start, so it never runs ahead of the rows exported
+    assert response.headers["X-Export-Watermark"][:19] <= rows[-1]["updated_at"][:19]
+
+def test_export_groups_exits_across_cursor_partitions(monkeypatch):
+    expected = client.get("/export").text
+    monkeypatch.setattr(crud, "EXPORT_BATCH_SIZE", 1)  # every joined row is its own partition
+    assert client.get("/export").text == expected
+
+def test_export_since_filters_on_updated_at():
+    import json
+
+    since = "2999-01-01T00:00:00Z"
+    assert _export_lines(client.get("/export", params={"since": since})) == []
+    everything = _export_lines(client.get("/export", params={"since": "2000-01-01T00:00:00"}))
+    assert len(everything) == len(_export_lines(client.get("/export")))
+    stamps = [json.loads(line)["updated_at"] for line in everything]
+    assert stamps == sorted(stamps)
+
+def test_export_watermark_covers_writes_committed_after_their_stamp():
+    import json
+    from datetime import timedelta
+    import models
+
+    watermark = client.get("/export").headers["X-Export-Watermark"]
+    # A write stamped before that export started but only committed after it
+    db = TestingSessionLocal()
+    try:
+        db.add(models.TradeEntry(stock="LATE", market="US", position="Long", entry_date=date(2024, 7, 1),
+                                 entry_price=10, qty=10, remaining_qty=10,
+                                 updated_at=models.utcnow() - timedelta(seconds=30)))
+        db.commit()
+    finally:
+        db.close()
+    stocks = [json.loads(line)["stock"] for line in _export_lines(client.get("/export", params={"since": watermark}))]
+    assert "LATE" in stocks
+
+def test_exits_use_fx_rate_on_exit_date():
+    import fx, models
+
+    db = TestingSessionLocal()
+    try:
+        fx.ingest(db, fx.parse_csv("base,quote,date,rate\nUSD,HKD,2024-03-01,7.80\nUSD,HKD,2024-03-04,7.70\n"))
+        entry_id = client.post("/entries", json={
+            "stock": "FXU", "market": "US", "position": "Long", "entry_date": "2024-02-20",
+            "entry_price": 10.0, "qty": 20,
+        }).json()["id"]
+        first = client.post("/exits", json={"entry_id": entry_id, "exit_date": "2024-03-03",
+                                            "exit_price": 11.0, "exit_qty": 10}).json()
+        second = client.post("/exits", json={"entry_id": entry_id, "exit_date": "2024-03-04",
+                                             "exit_price": 12.0, "exit_qty": 10}).json()
+        assert Decimal(first["fx_rate"]) == Decimal("7.80")  # weekend exit: the previous rate
+        assert Decimal(second["fx_rate"]) == Decimal("7.70")
+
+        expected = Decimal("10") * Decimal("7.80") + Decimal("20") * Decimal("7.70")
+        assert crud.get_entry(db, entry_id).realized_pnl_hkd == expected
+        crud.rebuild_position_aggregates(db)
+        db.expire_all()
+        assert crud.get_entry(db, entry_id).realized_pnl_hkd == expected
+
+        # Corrected rates re-resolve stored exits
+        fx.ingest(db, fx.parse_csv("base,quote,date,rate\nUSD,HKD,2024-03-04,7.75\n"))
+        crud.reprice_exits(db)
+        db.expire_all()
+        assert crud.get_entry(db, entry_id).realized_pnl_hkd == Decimal("10") * Decimal("7.80") + Decimal("20") * Decimal("7.75")
+    finally:
+        db.query(models.FxRate).delete()
+        db.commit()
+        fx.invalidate()
+        db.close()
+
+def test_equity_curve_extends_cache_on_later_exit_and_rebuilds_on_backdated():
+    import equity
+
+    def curve(**params):
+        response = client.get("/analytics/equity-curve", params=params)
+        assert response.status_code == 200
+        return response.json()
+
+    def rebuilt(**params):
+        equity.invalidate()
+        return curve(**params)
+
+    entry_id = client.post("/entries", json={
+        "stock": "EQC", "market": "HK", "position": "Long", "entry_date": "2030-01-02",
+        "entry_price": 10.0, "qty": 30,
+    }).json()["id"]
+    before = rebuilt()
+    assert before == curve()
+
+    # A later-dated exit extends the cached series without re-reading trade_exits
+    client.post("/exits", json={"entry_id": entry_id, "exit_date": "2030-02-01", "exit_price": 8.0, "exit_qty": 10})
+    with count_queries() as statements:
+        extended = curve()
+    assert not any("trade_exits" in s for s in statements)
+    assert extended["points"][-1]["pnl"] == -20.0
+    assert extended["points"][-1]["equity"] == pytest.approx(before["total_pnl"] - 20)
+    assert extended == rebuilt()
+
+    # A back-dated exit drops the cache
+    curve()
+    client.post("/exits", json={"entry_id": entry_id, "exit_date": "2029-12-31", "exit_price": 12.0, "exit_qty": 10})
+    with count_queries() as statements:
+        backdated = curve()
+    assert any("trade_exits" in s for s in statements)
+    assert backdated == rebuilt()
+    assert backdated["total_pnl"] == pytest.approx(extended["total_pnl"] + 20)
+
+    weekly = curve(granularity="week")
+    assert weekly["points"][-1]["equity"] == backdated["points"][-1]["equity"]
+    assert all(date.fromisoformat(p["date"]).weekday() == 6 for p in weekly["points"])
+    assert client.get("/analytics/equity-curve", params={"granularity": "month"}).status_code == 422
+
+def test_equity_cache_is_not_double_counted_by_interleaved_writes(monkeypatch):
+    import equity, schemas
+
+    entry_ids = [client.post("/entries", json={
+        "stock": f"EQI{i}", "market": "HK", "position": "Long", "entry_date": "2030-06-01",
+        "entry_price": 10.0, "qty": 10,
+    }).json()["id"] for i in range(2)]
+    client.get("/analytics/equity-curve")  # cache the series
+
+    # Right after exit A commits (before its cache update), a reader caches the series
+    # with A and a batch write (which does not update the cache) commits the next version
+    active = equity.active
+
+    def interleave():
+        monkeypatch.setattr(equity, "active", active)
+        db = TestingSessionLocal()
+        try:
+            crud.get_equity_curve(db)
+            crud.create_exits_batch(db, [schemas.TradeExitCreate(
+                entry_id=entry_ids[1], exit_date=date(2030, 6, 3), exit_price=Decimal("13.00"), exit_qty=10)])
+        finally:
+            db.close()
+        return active()
+
+    monkeypatch.setattr(equity, "active", interleave)
+    db = TestingSessionLocal()
+    try:
+        crud.create_exit(db, schemas.TradeExitCreate(
+            entry_id=entry_ids[0], exit_date=date(2030, 6, 2), exit_price=Decimal("12.00"), exit_qty=10))
+    finally:
+        db.close()
+
+    cached = client.get("/analytics/equity-curve").json()
+    equity.invalidate()
+    assert cached == client.get("/analytics/equity-curve").json()
+
+def test_performance_breakdown_by_symbol_and_market():
+    def trade(stock, position, entry_price, qty, exit_price=None, stop=None):
+        entry_id = client.post("/entries", json={
+            "stock": stock, "market": "BDX", "position": position, "entry_date": "2030-04-01",
+            "entry_price": entry_price, "qty": qty, "stop_loss_price": stop,
+        }).json()["id"]
+        if exit_price is not None:
+            client.post("/exits", json={"entry_id": entry_id, "exit_date": "2030-04-10",
+                                        "exit_price": exit_price, "exit_qty": qty})
+
+    trade("BDA", "Long", 10.0, 100, 12.0, stop=9.0)   # +200, 2R
+    trade("BDA", "Long", 10.0, 100, 9.0, stop=8.0)    # -100, -0.5R
+    trade("BDA", "Long", 10.0, 10, 11.0)              # +10, no stop
+    trade("BDB", "Short", 20.0, 10, 18.0, stop=22.0)  # +20, 1R
+    trade("BDB", "Long", 20.0, 10)                    # still open
+
+    def by_symbol(**params):
+        response = client.get("/analytics/by-symbol", params={"market": "BDX", **params})
+        assert response.status_code == 200
+        return response.json()
+
+    bda, bdb = by_symbol()
+    assert (bda["stock"], bdb["stock"]) == ("BDA", "BDB")
+    assert bda["trades"] == 3 and bda["winning_trades"] == 2 and bda["losing_trades"] == 1
+    assert bda["win_rate"] == pytest.approx(2 / 3)
+    assert bda["total_pnl"] == pytest.approx(110)
+    assert bda["expectancy"] == pytest.approx(110 / 3)
+    assert bda["profit_factor"] == pytest.approx(2.1)
+    assert bda["avg_r_multiple"] == pytest.approx(0.75)
+    assert (bda["best_trade"], bda["worst_trade"]) == (200, -100)
+    assert bdb["trades"] == 1 and bdb["profit_factor"] is None and bdb["avg_r_multiple"] == pytest.approx(1)
+
+    assert [r["stock"] for r in by_symbol(sort_by="avg_r_multiple")] == ["BDB", "BDA"]
+    assert [r["stock"] for r in by_symbol(sort_by="profit_factor", order="asc")] == ["BDA", "BDB"]
+    assert [r["stock"] for r in by_symbol(min_trades=2)] == ["BDA"]
+    assert [r["stock"] for r in by_symbol(sort_by="total_pnl", order="asc", limit=1)] == ["BDB"]
+    assert client.get("/analytics/by-symbol", params={"sort_by": "stock"}).status_code == 422
+
+    response = client.get("/analytics/by-market", params={"limit": 1000})
+    assert response.status_code == 200
+    market = next(r for r in response.json() if r["market"] == "BDX")
+    assert market["stock"] is None
+    assert market["trades"] == 4 and market["total_pnl"] == pytest.approx(130)
+
+def test_simulation_resamples_closed_trades():
+    entry_id = client.post("/entries", json={
+        "stock": "MC1", "market": "MCX", "position": "Long", "entry_date": "2030-04-01",
+        "entry_price": 10.0, "qty": 100, "stop_loss_price": 9.0,
+    }).json()["id"]
+    client.post("/exits", json={"entry_id": entry_id, "exit_date": "2030-04-10", "exit_price": 12.0, "exit_qty": 100})
+
+    def simulate(**params):
+        return client.get("/analytics/simulation", params={"market": "MCX", "paths": 50, "trades": 5, **params})
+
+    # One +2R (+20%) trade: every path compounds it five times
+    result = simulate(fractions=[0.1, 0.2], seed=1).json()
+    assert (result["sample_trades"], result["paths"], result["trades"], result["seed"]) == (1, 50, 5, 1)
+    assert [o["fraction"] for o in result["outcomes"]] == [0.1, 0.2]
+    assert result["outcomes"][0]["final_pnl"]["p50"] == pytest.approx(100_000 * (1.2 ** 5 - 1))
+    assert result["outcomes"][1]["max_drawdown"]["p95"] == 0 and result["outcomes"][1]["risk_of_ruin"] == 0
+    by_return = simulate(basis="return", fractions=[0.5]).json()
+    assert by_return["outcomes"][0]["final_pnl"]["p5"] == pytest.approx(100_000 * (1.1 ** 5 - 1))
+    assert simulate(seed=5).json() == simulate(seed=5).json()
+
+    assert simulate(position="Short").status_code == 404
+    assert simulate(fractions=[0]).status_code == 422
+    too_big = client.get("/analytics/simulation", params={"market": "MCX", "paths": 1_000_000, "trades": 100_000})
+    assert too_big.status_code == 422 and "limited" in too_big.json()["detail"]
+
+def test_migrate_bootstraps_then_adds_only_whats_missing(tmp_path):
+    import migrations
+
+    engine = create_engine(f"sqlite:///{tmp_path}/migrate.db")
+    created = migrations.upgrade(engine)
+    assert any(statement.startswith("CREATE TABLE trade_entries") for statement in created)
+    assert migrations.plan(engine) == []
+
+    # An older database: no updated_at, an entry already written
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX ix_trade_entries_updated_id"))
+        connection.execute(text("ALTER TABLE trade_entries DROP COLUMN updated_at"))
+        connection.execute(text(
+            "INSERT INTO trade_entries (stock, market, position, entry_date, entry_price, qty, remaining_qty) "
+            "VALUES ('MIG', 'HK', 'Long', '2030-01-01', 10, 100, 100)"))
+    applied = migrations.upgrade(engine)
+    assert applied[0] == "ALTER TABLE trade_entries ADD COLUMN updated_at DATETIME"
+    assert applied[1].startswith("UPDATE trade_entries SET updated_at = ")
+    assert applied[2:] == ["CREATE INDEX ix_trade_entries_updated_id ON trade_entries (updated_at, id)"]
+    assert migrations.plan(engine) == []
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT updated_at FROM trade_entries")).scalar() is not None
+    engine.dispose()
+
+def test_positions_mark_to_market_uses_latest_price():
+    import models, prices
+
+    long_id = client.post("/entries", json={
+        "stock": "MTML", "market": "HK", "position": "Long", "entry_date": "2030-03-02",
+        "entry_price": 10.0, "qty": 100, "stop_loss_price": 9.0, "target_price": 14.0,
+    }).json()["id"]
+    short_id = client.post("/entries", json={
+        "stock": "MTMS", "market": "US", "position": "Short", "entry_date": "2030-03-02",
+        "entry_price": 50.0, "qty": 10,
+    }).json()["id"]
+
+    db = TestingSessionLocal()
+    try:
+        csv_lines = ["stock,market,date,close\n", "MTML,HK,2030-03-05,11.0\n", "MTML,HK,2030-03-06,12.0\n"]
+        assert prices.ingest(db, prices.parse_csv(csv_lines)) == 2
+        marks = {p["entry_id"]: p for p in client.get("/positions/mtm").json()["positions"]}
+        assert marks[long_id]["last_price"] == 12.0
+        assert marks[long_id]["unrealized_pnl"] == pytest.approx(200.0)
+        assert marks[long_id]["unrealized_pnl_pct"] == pytest.approx(0.2)
+        assert marks[long_id]["stop_distance_pct"] == pytest.approx(0.25)
+        assert marks[long_id]["target_distance_pct"] == pytest.approx(2 / 12)
+        assert marks[short_id]["last_price"] is None
+        only = client.get("/positions/mtm", params={"ids": [long_id]}).json()["positions"]
+        assert [p["entry_id"] for p in only] == [long_id]
+
+        # A later close for another stock is read incrementally into the cache (same as a second process)
+        db.execute(models.Price.__table__.insert(), [
+            {"stock": "MTMS", "market": "US", "price_date": date(2030, 3, 6), "close": Decimal("45")}])
+        db.commit()
+        mtm = client.get("/positions/mtm", params={"market": "US"}).json()
+        assert [p["entry_id"] for p in mtm["positions"] if p["stock"] == "MTMS"] == [short_id]
+        short = next(p for p in mtm["positions"] if p["entry_id"] == short_id)
+        assert short["unrealized_pnl"] == pytest.approx(50.0)
+        assert short["unrealized_pnl_hkd"] == pytest.approx(50.0 * 7.78)
+
+        # Re-ingesting a date replaces its close
+        prices.ingest(db, prices.parse_csv(["stock,market,date,close\n", "MTML,HK,2030-03-06,9.5\n"]))
+        long = next(p for p in client.get("/positions/mtm").json()["positions"] if p["entry_id"] == long_id)
+        assert long["unrealized_pnl"] == pytest.approx(-50.0)
+        with pytest.raises(ValueError, match="Line 2"):
+            list(prices.parse_csv(["stock,market,date,close\n", "MTML,HK,not-a-date,1\n"]))
+    finally:
+        db.query(models.Price).delete()
+        db.commit()
+        prices.invalidate()
+        db.close()
+
+def test_exit_batch_applies_valid_items_and_reports_the_rest():
+    first = client.post("/entries", json={"stock": "BAT1", "market": "HK", "position": "Long",
+                                          "entry_date": "2030-04-01", "entry_price": 10.0, "qty": 10}).json()["id"]
+    second = client.post("/entries", json={"stock": "BAT2", "market": "HK", "position": "Short",
+                                           "entry_date": "2030-04-01", "entry_price": 20.0, "qty": 5}).json()["id"]
+    exit = {"exit_date": "2030-04-10", "exit_price": 12.0}
+    response = client.post("/exits/batch", json=[
+        {**exit, "entry_id": first, "exit_qty": 6},
+        {**exit, "entry_id": first, "exit_qty": 6},  # only 4 left
+        {**exit, "entry_id": second, "exit_qty": 5},
+        {**exit, "entry_id": 999999, "exit_qty": 1},
+        {**exit, "entry_id": first, "exit_qty": 4},
+    ])
+    assert response.status_code == 200
+    result = response.json()
+    assert result["exits_created"] == 3
+    assert [r["error"] is None for r in result["results"]] == [True, False, True, False, True]
+    assert "exceeds" in result["results"][1]["error"]
+    assert result["results"][0]["exit"]["entry_id"] == first
+
+    closed_first = client.get(f"/entries/{first}").json()
+    assert closed_first["remaining_qty"] == 0 and closed_first["is_open"] is False
+    assert [e["exit_qty"] for e in closed_first["exits"]] == [6, 4]
+    assert client.get(f"/entries/{second}").json()["actual_gain_loss"] == pytest.approx(40.0)
+
+def test_concurrent_exits_never_lose_updates():
+    import threading
+    import models, schemas
+
+    qty, threads, exits_per_thread = 60, 8, 10  # 80 exits of 1 against 60 shares per entry
+    entry_ids = [client.post("/entries", json={
+        "stock": f"CAS{i}", "market": "HK", "position": "Long", "entry_date": "2030-05-01",
+        "entry_price": 10.0, "qty": qty,
+    }).json()["id"] for i in range(2)]
+
+    outcomes, barrier = [], threading.Barrier(threads)
+
+    def worker(n):
+        db = TestingSessionLocal()
+        try:
+            barrier.wait()
+            for i in range(exits_per_thread):
+                exit = schemas.TradeExitCreate(entry_id=entry_ids[(n + i) % 2], exit_date=date(2030, 5, 2),
+                                               exit_price=Decimal("11.00") + n, exit_qty=1)
+                try:
+                    crud.create_exit(db, exit)
+                    outcomes.append("ok")
+                except crud.ExitConflict:
+                    outcomes.append("conflict")
+                except ValueError:
+                    outcomes.append("rejected")
+        finally:
+            db.close()
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+
+    assert len(outcomes) == threads * exits_per_thread
+    db = TestingSessionLocal()
+    try:
+        for entry_id in entry_ids:
+            entry = crud.get_entry(db, entry_id)
+            exits = crud.get_exits_for_entry(db, entry_id)
+            # Every committed exit is reflected in the aggregates exactly once, and none over-closed
+            assert entry.exited_qty == sum(e.exit_qty for e in exits) <= qty
+            assert entry.remaining_qty == qty - entry.exited_qty
+            assert entry.realized_pnl == sum((e.exit_price - entry.entry_price) * e.exit_qty for e in exits)
+            assert entry.version == len(exits)
+        assert outcomes.count("ok") == db.query(models.TradeExit).filter(
+            models.TradeExit.entry_id.in_(entry_ids)).count()
+        assert outcomes.count("rejected") == 0 or all(not crud.get_entry(db, i).is_open for i in entry_ids)
+    finally:
+        db.close()
+
+def test_exit_route_retries_lost_compare_and_swaps_without_blocking(monkeypatch):
+    entry_id = client.post("/entries", json={
+        "stock": "CASR", "market": "HK", "position": "Long", "entry_date": "2030-05-01",
+        "entry_price": 10.0, "qty": 10,
+    }).json()["id"]
+
+    attempts, try_create_exit = [], crud.try_create_exit
+
+    def lose_twice(db, exit):
+        attempts.append(exit.entry_id)
+        return None if len(attempts) <= 2 else try_create_exit(db, exit)
+
+    def blocking_sleep(seconds):
+        raise AssertionError("the backoff blocked the request's thread")
+
+    monkeypatch.setattr(crud, "try_create_exit", lose_twice)
+    monkeypatch.setattr(crud.time, "sleep", blocking_sleep)
+    response = client.post("/exits", json={"entry_id": entry_id, "exit_date": "2030-05-02",
+                                           "exit_price": 11.0, "exit_qty": 4})
+    assert response.status_code == 200 and len(attempts) == 3
+    assert client.get(f"/entries/{entry_id}").json()["remaining_qty"] == 6
+
+    monkeypatch.setattr(crud, "try_create_exit", lambda db, exit: None)
+    response = client.post("/exits", json={"entry_id": entry_id, "exit_date": "2030-05-02",
+                                           "exit_price": 11.0, "exit_qty": 1})
+    assert response.status_code == 409
+
+def test_jobs_run_in_the_pool_and_are_memoized_per_journal_version():
+    import time
+    import jobs
+
+    def wait(job):
+        deadline = time.monotonic() + 60
+        while job["status"] in ("pending", "running") and time.monotonic() < deadline:
+            time.sleep(0.05)
+            job = client.get(f"/jobs/{job['id']}").json()
+        assert job["status"] == "done", job
+        return job
+
+    params = {"year": 2024, "market": "HK"}
+    response = client.post("/jobs", json={"kind": "monthly_summary", "params": params})
+    assert response.status_code in (200, 202)
+    job = wait(response.json())
+    assert job["result"] == client.get("/summary/monthly", params=params).json()
+
+    response = client.post("/jobs", json={"kind": "monthly_summary", "params": params})
+    assert response.status_code == 200
+    assert response.json()["cached"] is True and response.json()["result"] == job["result"]
+
+    # A write moves the journal version on: the memoized result is not served again
+    client.post("/entries", json={"stock": "JOB", "market": "HK", "position": "Long",
+                                  "entry_date": "2024-01-02", "entry_price": 1.0, "qty": 1})
+    response = client.post("/jobs", json={"kind": "monthly_summary", "params": params})
+    assert response.json()["cached"] is False
+    assert wait(response.json())["journal_version"] > job["journal_version"]
+
+    breakdown = wait(client.post("/jobs", json={"kind": "by_symbol", "params": {"market": "HK", "limit": 5}}).json())
+    assert breakdown["result"] == client.get("/analytics/by-symbol", params={"market": "HK", "limit": 5}).json()
+
+    assert client.post("/jobs", json={"kind": "prices"}).status_code == 422
+    response = client.post("/jobs", json={"kind": "by_market", "params": {"order": "asc"}})
+    assert response.status_code == 422 and response.json()["detail"][0]["loc"] == ["body", "params", "order"]
+    assert client.get("/jobs/missing").status_code == 404
+    jobs.shutdown()
@@ -0,0 +1,203 @@
+# test_utils.py
+import json
+from datetime import date
+from decimal import Decimal
+from typing import List
+
+import numpy as np
+import pandas as pd
+import pytest
+from pydantic import TypeAdapter
+
+import crud, models, responses, schemas, simulation
+from derived import compute_derived_fields, compute_derived_fields_batch, derived_rows
+from utils import MONTHLY_SUMMARY_LABELS, flatten_exits, generate_monthly_summary, summarize_exits_by_month
+
+
+def make_entry(id, market, position, entry_date, entry_price, qty, stop=None, target=None, exits=()):
+    entry = models.TradeEntry(
+        id=id, stock=f"S{id}", market=market, position=position,
+        entry_date=entry_date, entry_price=Decimal(entry_price), qty=qty,
+        remaining_qty=qty, is_open=True,
+        stop_loss_price=Decimal(stop) if stop else None,
+        target_price=Decimal(target) if target else None,
+        exited_qty=0, realized_pnl=Decimal(0), realized_pnl_hkd=Decimal(0),
+    )
+    for i, (exit_date, exit_price, exit_qty) in enumerate(exits):
+        entry.exits.append(models.TradeExit(
+            id=id * 10 + i, entry_id=id, exit_date=exit_date,
+            exit_price=Decimal(exit_price), exit_qty=exit_qty,
+        ))
+        crud.apply_exit(entry, Decimal(exit_price), exit_qty, exit_date)
+    return entry
+
+
+@pytest.fixture
+def entries():
+    return [
+        make_entry(1, "HK", "Long", date(2024, 1, 1), "100.00", 1000, stop="90.00", target="120.00", exits=[
+            (date(2024, 1, 10), "110.00", 500),
+            (date(2024, 1, 15), "120.00", 500),
+        ]),
+        make_entry(2, "US", "Short", date(2024, 2, 1), "50.00", 10, stop="55.00", exits=[
+            (date(2024, 2, 11), "45.00", 10),
+        ]),
+        make_entry(3, "HK", "Long", date(2024, 3, 1), "20.00", 100),
+    ]
+
+
+def test_batch_derived_fields_match_hand_computed(entries):
+    long_hk, short_us, still_open = compute_derived_fields_batch(entries)
+
+    assert long_hk.expected_loss_pct == pytest.approx(0.1)
+    assert long_hk.expected_gain_pct == pytest.approx(0.2)
+    assert long_hk.rr_ratio == pytest.approx(2.0)
+    assert long_hk.actual_gain_loss == 15000.0  # 10 * 500 + 20 * 500
+    assert long_hk.actual_gain_loss_pct == 0.15
+    assert long_hk.holding_days == 14
+    assert long_hk.total_cost == 100000.0
+    assert long_hk.is_open is False
+
+    assert short_us.expected_loss_pct == pytest.approx(0.1)
+    assert short_us.expected_gain_pct is None
+    assert short_us.rr_ratio is None
+    assert short_us.actual_gain_loss == 389.0  # 5 * 10 * 7.78
+    assert short_us.actual_gain_loss_pct == 0.1
+    assert short_us.holding_days == 10
+
+    assert still_open.actual_gain_loss == 0.0
+    assert still_open.holding_days == 0
+    assert still_open.exits == []
+
+
+def test_single_entry_matches_batch(entries):
+    batch = compute_derived_fields_batch(entries)
+    assert [compute_derived_fields(e) for e in entries] == batch
+    assert compute_derived_fields_batch([]) == []
+
+
+def test_derived_rows_encode_like_the_response_model(entries):
+    entries[1].exits[0].fx_rate = Decimal("7.80000000")
+    expected = TypeAdapter(List[schemas.TradeEntryResponse]).dump_json(compute_derived_fields_batch(entries))
+    assert json.loads(responses.dumps(derived_rows(entries))) == json.loads(expected)
+    if responses.orjson is not None:
+        assert responses.dumps(derived_rows(entries)) == expected
+
+
+def test_apply_exit_maintains_position_aggregates(entries):
+    long_hk, short_us, _ = entries
+    assert long_hk.exited_qty == 1000
+    assert long_hk.realized_pnl == Decimal("15000.00")
+    assert long_hk.avg_exit_price == Decimal("115.0000")
+    assert long_hk.last_exit_date == date(2024, 1, 15)
+
+    assert short_us.realized_pnl == Decimal("50.00")
+    assert short_us.realized_pnl_hkd == Decimal("389.0000")
+    assert short_us.avg_exit_price == Decimal("45.0000")
+
+
+def test_fx_rates_binary_search_and_batch_lookup():
+    from fx import FxRates
+
+    rates = FxRates([("USD", date(2024, 1, 2), "7.81"), ("USD", date(2024, 1, 5), "7.79")])
+    assert rates.rate("USD", date(2024, 1, 4)) == Decimal("7.81")
+    assert rates.rate("USD", date(2024, 1, 5)) == Decimal("7.79")
+    assert rates.rate("USD", date(2023, 12, 29)) == Decimal("7.78")  # before the series: configured fallback
+    assert rates.rate("HKD", date(2024, 1, 4)) == Decimal(1)
+    with pytest.raises(ValueError):
+        rates.rate("JPY", date(2024, 1, 4))
+
+    batch = rates.for_markets(["US", "HK", "US"], [date(2024, 1, 3), date(2024, 1, 3), date(2024, 2, 1)])
+    assert batch.tolist() == [7.81, 1.0, 7.79]
+
+
+def test_equity_curve_peak_drawdown_and_duration():
+    from equity import equity_curve
+
+    days = [date(2024, 1, 1), date(2024, 1, 3), date(2024, 1, 8), date(2024, 1, 10), date(2024, 1, 20)]
+    curve = equity_curve(days, [100, -50, -80, 60, 100])
+    assert [p["equity"] for p in curve["points"]] == [100, 50, -30, 30, 130]
+    assert [p["drawdown"] for p in curve["points"]] == [0, -50, -130, -70, 0]
+    assert curve["max_drawdown"] == -130
+    assert curve["max_drawdown_duration_days"] == 19  # Jan 1 peak, recovered Jan 20
+
+    weekly = equity_curve(days, [100, -50, -80, 60, 100], granularity="week")
+    assert [p["date"] for p in weekly["points"]] == [date(2024, 1, 7), date(2024, 1, 14), date(2024, 1, 21)]
+    assert [p["equity"] for p in weekly["points"]] == [50, 30, 130]
+    assert equity_curve([], [])["points"] == []
+
+
+def test_simulation_compounds_fractions_and_is_seed_deterministic(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    # A single +1R trade: every path compounds it, no drawdown
+    (outcome,) = simulation.simulate([1.0], [0.1], paths=5, trades=10, seed=1, starting_capital=1000)["outcomes"]
+    assert outcome["final_pnl"]["p5"] == outcome["final_pnl"]["p95"] == pytest.approx(1000 * (1.1 ** 10 - 1))
+    assert outcome["max_drawdown"]["mean"] == 0 and outcome["risk_of_ruin"] == outcome["probability_of_loss"] == 0
+
+    # Losing trades: ruin once equity reaches half the start; a loss beyond the account wipes it out
+    half, wiped = simulation.simulate([-1.0, -4.0], [0.5, 0.25], paths=200, trades=3, seed=2, ruin_level=0.5)["outcomes"]
+    assert half["risk_of_ruin"] == 1.0 and half["max_drawdown"]["p5"] == pytest.approx(0.875)
+    assert wiped["final_pnl"]["p5"] == -100_000 and wiped["max_drawdown"]["p95"] == 1.0
+
+    # Same seed, same result, whether chunks run inline or spread over an executor
+    monkeypatch.setattr(simulation, "CHUNK_PATHS", 7)
+    returns = np.random.default_rng(0).normal(0.1, 1.0, 50)
+    inline = simulation.simulate(returns, [0.01, 0.05], paths=60, trades=40, seed=7)
+    with ThreadPoolExecutor(3) as executor:
+        spread = simulation.simulate(returns, [0.01, 0.05], paths=60, trades=40, seed=7, executor=executor, workers=3)
+    assert inline == spread
+    assert simulation.simulate(returns, [0.01, 0.05], paths=60, trades=40, seed=8) != inline
+
+
+# ---- Monthly summary parity fixtures (hand-computed) ----
+
+def trade(market, position, entry_date, entry_price, exits):
+    return {
+        "market": market, "position": position, "entry_date": entry_date, "entry_price": entry_price,
+        "exits": [{"exit_date": d, "exit_price": p, "exit_qty": q} for d, p, q in exits],
+    }
+
+
+@pytest.fixture
+def closed_trades():
+    return [
+        # Closed in two partial exits across two months: +40 in Jan, -30 in Feb
+        trade("HK", "Long", "2022-01-03", "100.00", [("2022-01-10", "110.00", 4), ("2022-02-07", "95.00", 6)]),
+        # Short in USD: (50 - 45) * 20 * 7.78 = +778
+        trade("US", "Short", "2022-01-05", "50.00", [("2022-01-20", "45.00", 20)]),
+        trade("HK", "Long", "2022-02-01", "10.00", [("2022-02-11", "12.00", 100)]),
+    ]
+
+
+def test_monthly_summary_attributes_pnl_per_exit(closed_trades):
+    summary = summarize_exits_by_month(flatten_exits(closed_trades))
+    jan, feb = summary.loc[pd.Period("2022-01")], summary.loc[pd.Period("2022-02")]
+
+    assert (jan.winning_trades, jan.losing_trades) == (2, 0)
+    assert jan.avg_gain == pytest.approx((40 + 778) / 2)
+    assert jan.avg_gain_pct == pytest.approx(0.10)
+    assert jan.largest_gain == pytest.approx(778.0)
+    assert jan.avg_holding_days_win == pytest.approx((7 + 15) / 2)
+    assert jan.win_rate == 1.0
+    assert np.isnan(jan.actual_rr_ratio)
+
+    assert (feb.winning_trades, feb.losing_trades) == (1, 1)
+    assert feb.avg_loss == pytest.approx(-30.0)
+    assert feb.avg_loss_pct == pytest.approx(-0.05)
+    assert feb.avg_gain == pytest.approx(200.0)
+    assert feb.actual_rr_ratio == pytest.approx(200 / 30)
+    assert feb.win_rate == 0.5
+    assert feb.avg_holding_days_loss == pytest.approx(35.0)
+
+    # Realized PnL is counted once per exit, not once per exit per trade
+    realized = summary.avg_gain.fillna(0) * summary.winning_trades + summary.avg_loss.fillna(0) * summary.losing_trades
+    assert realized.sum() == pytest.approx(40 - 30 + 778 + 200)
+
+
+def test_generate_monthly_summary_labels(closed_trades):
+    summary = generate_monthly_summary(closed_trades)
+    assert list(summary.index) == ["Jan 2022", "Feb 2022"]
+    assert list(summary.columns) == list(MONTHLY_SUMMARY_LABELS.values())
+    assert summary.loc["Feb 2022", "Win Rate %"] == 0.5
+    assert generate_monthly_summary([]).empty
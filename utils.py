@@ -1,123 +1,121 @@
-from decimal import Decimal
-
+"""Pandas analytics over exits: realized PnL per exit and the monthly summary."""
+import numpy as np
 import pandas as pd
-from calendar import month_name
-import models, schemas
-
-def compute_derived_fields(entry: models.TradeEntry) -> schemas.TradeEntryResponse:
-    data = schemas.TradeEntryResponse.model_validate(entry, from_attributes=True).model_dump()
-
-    try:
-        entry_price = entry.entry_price
-        stop = entry.stop_loss_price
-        target = entry.target_price
-        qty = entry.qty
-        fx = Decimal('7.78') if entry.market.upper() == 'US' else Decimal('1')
-
-        # Expected P&L %
-        if entry_price and stop:
-            data["expected_loss_pct"] = float(abs((entry_price - stop) / entry_price))
-        if entry_price and target:
-            data["expected_gain_pct"] = float(abs((target - entry_price) / entry_price))
-
-        if data.get("expected_loss_pct") and data.get("expected_gain_pct"):
-            loss = Decimal(str(data["expected_loss_pct"]))
-            gain = Decimal(str(data["expected_gain_pct"]))
-            if loss != 0:
-                data["rr_ratio"] = float(gain / loss)
-
-        # Total realized gain/loss
-        total_realized = Decimal(0)
-        for exit in entry.exits:
-            if entry.position == "Long":
-                delta = exit.exit_price - entry_price
-            else:
-                delta = entry_price - exit.exit_price
-
-            total_realized += delta * exit.exit_qty * fx
-
-        data["actual_gain_loss"] = float(total_realized)
-        data["actual_gain_loss_pct"] = float(
-            total_realized / (qty * entry_price * fx)) if qty > 0 else 0
-
-        # Holding days: latest exit date - entry date
-        if entry.exits:
-            last_exit_date = max(e.exit_date for e in entry.exits)
-            data["holding_days"] = (last_exit_date - entry.entry_date).days
-        else:
-            data["holding_days"] = 0
-
-        data["total_cost"] = float(entry_price * qty)
-
-    except Exception as e:
-        print(f"Error computing derived fields for entry {entry.id}: {e}")
-
-    print(data)
-    return schemas.TradeEntryResponse(**data)
-
+import fx, metrics
+
+# MonthlySummary field -> dashboard label, in display order
+MONTHLY_SUMMARY_LABELS = {
+    "avg_loss": "Average Loss (HKD)",
+    "avg_gain": "Average Gain (HKD)",
+    "avg_loss_pct": "Average Loss %",
+    "avg_gain_pct": "Average Gain %",
+    "winning_trades": "Winning Trades",
+    "losing_trades": "Losing Trades",
+    "win_rate": "Win Rate %",
+    "actual_rr_ratio": "Actual RR Ratio",
+    "largest_gain": "Largest Gain (HKD)",
+    "largest_loss": "Largest Loss (HKD)",
+    "avg_holding_days_win": "Avg Holding Days (Win)",
+    "avg_holding_days_loss": "Avg Holding Days (Loss)",
+}
+
+
+EXIT_COLUMNS = ["market", "position", "entry_date", "entry_price", "exit_date", "exit_price", "exit_qty"]
+
+
+def flatten_exits(trades) -> pd.DataFrame:
+    """One row per exit of the given trade dicts (API JSON), with its entry's columns and ``fx_rate``."""
+    return pd.DataFrame.from_records(
+        [
+            (t["market"], t["position"], t["entry_date"], t["entry_price"],
+             e["exit_date"], e["exit_price"], e["exit_qty"], e.get("fx_rate"))
+            for t in trades
+            for e in t["exits"]
+        ],
+        columns=[*EXIT_COLUMNS, "fx_rate"],
+    )
+
+
+def exit_fx_rates(exits: pd.DataFrame) -> np.ndarray:
+    """Each exit's stored ``fx_rate``, else its market's fallback rate (``fx.fallback_rate``)."""
+    markets = exits["market"].astype(str)
+    fallback = markets.map({m: float(fx.fallback_rate(m)) for m in markets.unique()}).astype(float)
+    if "fx_rate" not in exits:
+        return fallback.to_numpy()
+    return pd.to_numeric(exits["fx_rate"], errors="coerce").astype(float).fillna(fallback).to_numpy()
+
+
+# Per-exit realized figures added by exit_realized_pnl (and stored in the analytics snapshot)
+REALIZED_COLUMNS = ["pnl", "pnl_pct", "holding_days"]
+
+
+def exit_realized_pnl(exits: pd.DataFrame) -> pd.DataFrame:
+    """Realized PnL (reporting currency), return on exited capital and holding days of each exit
+    (``EXIT_COLUMNS``, plus ``fx_rate`` when known)."""
+    entry_price = exits["entry_price"].astype(float)
+    sign = np.where(exits["position"] == "Long", 1.0, -1.0)
+
+    delta = (exits["exit_price"].astype(float) - entry_price) * sign
+    return pd.DataFrame({
+        "pnl": delta * exits["exit_qty"].astype(float) * exit_fx_rates(exits),
+        "pnl_pct": delta / entry_price,
+        "holding_days": (pd.to_datetime(exits["exit_date"]) - pd.to_datetime(exits["entry_date"])).dt.days,
+    }, index=exits.index)
+
+
+def summarize_exits_by_month(exits: pd.DataFrame) -> pd.DataFrame:
+    """Monthly performance from a frame of exits (``EXIT_COLUMNS``).
+
+    Every exit is attributed its own realized PnL (``exit_qty x price delta x fx``),
+    return on exited capital and holding days; all monthly metrics then come
+    from a single ``groupby().agg()`` pass. Columns are ``MonthlySummary`` fields,
+    indexed by monthly Period. Frames that already carry ``REALIZED_COLUMNS``
+    (e.g. read from the analytics snapshot) only need ``exit_date`` besides them.
+    """
+    realized = exits if set(REALIZED_COLUMNS) <= set(exits.columns) else exit_realized_pnl(exits)
+    exit_date = pd.to_datetime(exits["exit_date"])
+    pnl, pnl_pct, days = realized["pnl"], realized["pnl_pct"], realized["holding_days"]
+    win, loss = pnl > 0, pnl < 0
+
+    frame = pd.DataFrame({
+        "month": exit_date.dt.to_period("M"),
+        "pnl": pnl,
+        "win": win,
+        "loss": loss,
+        "gain_pnl": pnl.where(win),
+        "loss_pnl": pnl.where(loss),
+        "gain_pct": pnl_pct.where(win),
+        "loss_pct": pnl_pct.where(loss),
+        "win_days": days.where(win),
+        "loss_days": days.where(loss),
+    }).dropna(subset=["month"])
+
+    summary = frame.groupby("month").agg(
+        winning_trades=("win", "sum"),
+        losing_trades=("loss", "sum"),
+        total_gain=("gain_pnl", "sum"),
+        total_loss=("loss_pnl", "sum"),
+        avg_gain=("gain_pnl", "mean"),
+        avg_loss=("loss_pnl", "mean"),
+        avg_gain_pct=("gain_pct", "mean"),
+        avg_loss_pct=("loss_pct", "mean"),
+        largest_gain=("pnl", "max"),
+        largest_loss=("pnl", "min"),
+        avg_holding_days_win=("win_days", "mean"),
+        avg_holding_days_loss=("loss_days", "mean"),
+    )
+
+    decided = summary["winning_trades"] + summary["losing_trades"]
+    summary["win_rate"] = (summary["winning_trades"] / decided).where(decided > 0)
+    summary["actual_rr_ratio"] = (summary["total_gain"] / summary["total_loss"]).abs().where(
+        (summary["winning_trades"] > 0) & (summary["losing_trades"] > 0))
+    return summary[list(MONTHLY_SUMMARY_LABELS)]
+
+
+@metrics.timed("generate_monthly_summary")
 def generate_monthly_summary(trades):
-    flat_records = []
-
-    for trade in trades:
-        for exit in trade["exits"]:
-            flat_records.append({
-                "stock": trade["stock"],
-                "market": trade["market"],
-                "position": trade["position"],
-                "entry_date": trade["entry_date"],
-                "exit_date": exit["exit_date"],
-                "entry_price": float(trade["entry_price"]),
-                "exit_price": float(exit["exit_price"]),
-                "exit_qty": exit["exit_qty"],
-                "actual_gain_loss_pct": trade.get("actual_gain_loss_pct"),
-                "actual_gain_loss": trade.get("actual_gain_loss"),
-                "holding_days": trade.get("holding_days"),
-                "total_cost": trade.get("total_cost"),
-            })
-
-    df = pd.DataFrame(flat_records)
-    df["exit_date"] = pd.to_datetime(df["exit_date"])
-    df = df.dropna(subset=["exit_date"])
-    df["month"] = df["exit_date"].dt.to_period("M")
-
-    monthly_data = []
-
-    for month, group in df.groupby("month"):
-        wins = group[group["actual_gain_loss"] > 0]
-        losses = group[group["actual_gain_loss"] < 0]
-
-        avg_loss = losses["actual_gain_loss"].mean()
-        avg_gain = wins["actual_gain_loss"].mean()
-        avg_loss_pct = losses["actual_gain_loss_pct"].mean()
-        avg_gain_pct = wins["actual_gain_loss_pct"].mean()
-        freq_wins = len(wins)
-        freq_losses = len(losses)
-
-        win_rate = freq_wins / (freq_wins + freq_losses) if (freq_wins + freq_losses) > 0 else None
-        rr_ratio = abs((avg_gain * freq_wins) / (avg_loss * freq_losses)) if (avg_loss and freq_losses) else None
-
-        largest_gain = group["actual_gain_loss"].max()
-        largest_loss = group["actual_gain_loss"].min()
-
-        avg_days_gains = wins["holding_days"].mean()
-        avg_days_losses = losses["holding_days"].mean()
-
-        monthly_data.append({
-            "Month": month.to_timestamp().strftime("%b %Y"),
-            "Average Loss (HKD)": avg_loss,
-            "Average Gain (HKD)": avg_gain,
-            "Average Loss %": avg_loss_pct,
-            "Average Gain %": avg_gain_pct,
-            "Winning Trades": freq_wins,
-            "Losing Trades": freq_losses,
-            "Win Rate %": win_rate,
-            "Actual RR Ratio": rr_ratio,
-            "Largest Gain (HKD)": largest_gain,
-            "Largest Loss (HKD)": largest_loss,
-            "Avg Holding Days (Win)": avg_days_gains,
-            "Avg Holding Days (Loss)": avg_days_losses
-        })
-
-    summary_df = pd.DataFrame(monthly_data)
-    summary_df.set_index("Month", inplace=True)
-    return summary_df
+    """Dashboard-labelled monthly summary of the exits of the given trade dicts."""
+    summary = summarize_exits_by_month(flatten_exits(trades))
+    summary.index = summary.index.strftime("%b %Y")
+    summary.index.name = "Month"
+    return summary.rename(columns=MONTHLY_SUMMARY_LABELS)